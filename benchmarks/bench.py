@@ -0,0 +1,366 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(REPO_ROOT, 'test_tool'))
+sys.path.append(os.path.join(REPO_ROOT, 'test_tool', 'prompt_gazees'))
+sys.path.append(os.path.join(REPO_ROOT, 'generate_tool'))
+
+
+DEFAULT_RESULTS_DIR = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+SIZES = ['small', 'medium', 'large']
+GROUP_SIZE = 9
+
+
+# ---------------------------------------------------------------- fixtures
+
+def write_frames(folder, count, height, width, seed=0):
+    """count random-noise JPEG frames named <index>.jpg."""
+    import cv2
+    import numpy as np
+
+    os.makedirs(folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    names = []
+    for i in range(count):
+        name = f"{i * 30}.jpg"
+        cv2.imwrite(os.path.join(folder, name), np.roll(base, i * 7, axis=1))
+        names.append(name)
+    return names
+
+
+def write_narration_json(path, num_videos, narrations_per_video, seed=0):
+    """Narration JSON in the qa_pairs/narrations format with normalized gaze."""
+    rng = random.Random(seed)
+    data = {}
+    for v in range(num_videos):
+        data[f"video_{v}"] = {"narrations": [
+            {"timestamp_sec": i, "timestamp_frame": i * 30, "narration_text": f"step {i}",
+             "gaze_info": {"gaze_x": round(rng.random(), 3), "gaze_y": round(rng.random(), 3)}}
+            for i in range(narrations_per_video)
+        ]}
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    return data
+
+
+def write_gazees_csv(path, num_rows, seed=0):
+    """Estimated-gaze CSV (frame, "(x, y)") as read by get_gaze_info_from_csv."""
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        f.write("frame,gaze\n")
+        for i in range(num_rows):
+            f.write(f'{i * 30}.jpg,"({rng.random():.4f}, {rng.random():.4f})"\n')
+
+
+def write_eye_gaze_csv(path, num_rows, seed=0):
+    """general_eye_gaze_2d.csv with 10 fps pixel gaze coordinates."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    with open(path, 'w') as f:
+        f.write("timestamp,x,y\n")
+        xy = rng.random((num_rows, 2)) * [1408, 1408]
+        for i, (x, y) in enumerate(xy):
+            f.write(f"{i * 100},{x:.3f},{y:.3f}\n")
+
+
+def write_video(path, num_frames, height=240, width=320, fps=30):
+    import cv2
+    import numpy as np
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for i in range(num_frames):
+        frame = np.full((height, width, 3), i % 256, dtype=np.uint8)
+        writer.write(frame)
+    writer.release()
+
+
+COMPLETION = (
+    "### Question:\nWhat is the object I looked at before picking up the knife?\n"
+    "### Answer Options:\nA: The cutting board.\nB: The sink.\nC: The fridge.\nD: The pan.\nE: The bowl.\n"
+    "### Correct Answer:\nA\n"
+)
+
+
+# ---------------------------------------------------------------- cases
+# Each case maps a size to a setup(workdir) that builds its fixture and
+# returns the zero-argument callable to time.
+
+def case_plot_gaze_trajectory(size):
+    height, width = {'small': (360, 480), 'medium': (720, 1280), 'large': (1080, 1920)}[size]
+
+    def setup(workdir):
+        from gaze_trajectory import plot_gaze_trajectory
+        image_path = os.path.join(workdir, write_frames(workdir, 1, height, width)[0])
+        rng = random.Random(0)
+        gaze_info_list = [{'gaze_x': rng.random(), 'gaze_y': rng.random()} for _ in range(GROUP_SIZE)]
+        return lambda: plot_gaze_trajectory(image_path, gaze_info_list)
+    return setup
+
+
+def case_encode_images_from_folder(size):
+    count = {'small': 9, 'medium': 36, 'large': 144}[size]
+
+    def setup(workdir):
+        from spatial import encode_images_from_folder
+        names = write_frames(workdir, count, 720, 1280)
+        return lambda: encode_images_from_folder(workdir, names)
+    return setup
+
+
+def case_get_gaze_info_from_json(size, cached=False):
+    narrations = {'small': 100, 'medium': 1000, 'large': 10000}[size]
+
+    def setup(workdir):
+        from gaze_index import gaze_info_for_group, load_gaze_index
+        json_file = os.path.join(workdir, 'ego4d.json')
+        write_narration_json(json_file, 10, narrations)
+        step = max(1, narrations // GROUP_SIZE)
+        group_id = [f"{i * step * 30}.jpg" for i in range(GROUP_SIZE)]
+        load_gaze_index.cache_clear()
+        if cached:
+            return lambda: gaze_info_for_group(json_file, 'video_5', group_id)
+
+        def lookup():
+            # Parse the JSON on every call, as the per-row helpers it replaced did.
+            load_gaze_index.cache_clear()
+            return gaze_info_for_group(json_file, 'video_5', group_id)
+        return lookup
+    return setup
+
+
+def case_get_gaze_info_from_json_cached(size):
+    return case_get_gaze_info_from_json(size, cached=True)
+
+
+def case_get_gaze_info_from_csv(size):
+    rows = {'small': 100, 'medium': 1000, 'large': 10000}[size]
+
+    def setup(workdir):
+        from es_gd_mse import get_gaze_info_from_csv
+        write_gazees_csv(os.path.join(workdir, 'video_0.csv'), rows)
+        step = max(1, rows // GROUP_SIZE)
+        group_id = [f"{i * step * 30}.jpg" for i in range(GROUP_SIZE)]
+        return lambda: get_gaze_info_from_csv(workdir, 'video_0', group_id)
+    return setup
+
+
+def case_load_gaze_data(size):
+    rows = {'small': 1000, 'medium': 10000, 'large': 100000}[size]
+
+    def setup(workdir):
+        from create_datasets import load_gaze_data
+        csv_file = os.path.join(workdir, 'general_eye_gaze_2d.csv')
+        write_eye_gaze_csv(csv_file, rows)
+        return lambda: load_gaze_data(csv_file, use_cache=False)
+    return setup
+
+
+def case_load_gaze_data_cached(size):
+    rows = {'small': 1000, 'medium': 10000, 'large': 100000}[size]
+
+    def setup(workdir):
+        from create_datasets import load_gaze_data
+        csv_file = os.path.join(workdir, 'general_eye_gaze_2d.csv')
+        write_eye_gaze_csv(csv_file, rows)
+        load_gaze_data(csv_file)
+        return lambda: load_gaze_data(csv_file)
+    return setup
+
+
+def case_save_completion_to_csv(size):
+    rows = {'small': 10, 'medium': 100, 'large': 1000}[size]
+
+    def setup(workdir):
+        from spatial import save_completion_to_csv
+        output_csv = os.path.join(workdir, 'qa.csv')
+        group_id = [f"{i * 30}.jpg" for i in range(GROUP_SIZE)]
+
+        def run():
+            if os.path.exists(output_csv):
+                os.remove(output_csv)
+            for _ in range(rows):
+                save_completion_to_csv('video_0', group_id, COMPLETION, output_csv)
+        return run
+    return setup
+
+
+def case_process_video(size):
+    segments = {'small': 5, 'medium': 20, 'large': 80}[size]
+
+    def setup(workdir):
+        from create_datasets import process_video, load_gaze_data
+        num_frames = segments * 15 + 30
+        video_path = os.path.join(workdir, 'take.mp4')
+        write_video(video_path, num_frames)
+        gaze_csv = os.path.join(workdir, 'general_eye_gaze_2d.csv')
+        write_eye_gaze_csv(gaze_csv, num_frames // 3 + 1)
+        gaze_data = load_gaze_data(gaze_csv)
+        take_info = {'take_name': 'take', 'scenario': 'cooking', 'segments': [
+            {'end_time': (i * 15 + 10) / 30, 'step_description': f"step {i}"} for i in range(segments)
+        ]}
+        output_folder = os.path.join(workdir, 'frames')
+        os.makedirs(output_folder, exist_ok=True)
+        return lambda: process_video('take_uid', take_info, video_path, gaze_data, 30, output_folder)
+    return setup
+
+
+CASES = {
+    'plot_gaze_trajectory': case_plot_gaze_trajectory,
+    'encode_images_from_folder': case_encode_images_from_folder,
+    'get_gaze_info_from_json': case_get_gaze_info_from_json,
+    'get_gaze_info_from_json_cached': case_get_gaze_info_from_json_cached,
+    'get_gaze_info_from_csv': case_get_gaze_info_from_csv,
+    'load_gaze_data': case_load_gaze_data,
+    'load_gaze_data_cached': case_load_gaze_data_cached,
+    'save_completion_to_csv': case_save_completion_to_csv,
+    'process_video': case_process_video,
+}
+
+
+# ---------------------------------------------------------------- runner
+
+def time_callable(fn, repeat=5, warmup=1):
+    """Wall-clock seconds of repeat calls of fn after warmup calls, with stdout muted."""
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(warmup):
+            fn()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(cases=None, sizes=SIZES, repeat=5, warmup=1):
+    """
+    Run every (case, size) pair on fresh synthetic fixtures.
+
+    Returns:
+        Dictionary with run metadata and {"<case>[<size>]": timing statistics}
+    """
+    results = {}
+    for name in cases or CASES:
+        for size in sizes:
+            workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+            try:
+                fn = CASES[name](size)(workdir)
+                timings = time_callable(fn, repeat, warmup)
+            except ImportError as e:
+                print(f"{name}[{size}]: skipped ({e})")
+                continue
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            results[f"{name}[{size}]"] = {
+                'median': statistics.median(timings),
+                'min': min(timings),
+                'mean': statistics.mean(timings),
+                'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+                'repeat': len(timings),
+            }
+            print(f"{name}[{size}]: median {results[f'{name}[{size}]']['median'] * 1e3:.2f} ms "
+                  f"(min {min(timings) * 1e3:.2f} ms, {len(timings)} runs)")
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def compare_results(baseline, current, threshold=0.10):
+    """
+    Median-time ratio current / baseline for every benchmark present in both runs.
+
+    Returns:
+        List of (benchmark, baseline median, current median, ratio, status) with
+        status "regression" above 1 + threshold, "improvement" below 1 - threshold
+    """
+    rows = []
+    for name, stats in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            rows.append((name, None, stats['median'], None, 'new'))
+            continue
+        ratio = stats['median'] / base['median'] if base['median'] > 0 else float('inf')
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 - threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, base['median'], stats['median'], ratio, status))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the data-preparation and evaluation hot paths")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Run the benchmarks and write the timings to JSON")
+    run_parser.add_argument('--cases', nargs='+', choices=list(CASES), default=None)
+    run_parser.add_argument('--sizes', nargs='+', choices=SIZES, default=SIZES)
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--warmup', type=int, default=1)
+    run_parser.add_argument('--output', type=str, default=None,
+                            help="Result JSON (default: benchmarks/results/<commit>.json)")
+
+    compare_parser = subparsers.add_parser('compare', help="Flag regressions against a baseline run")
+    compare_parser.add_argument('baseline', type=str)
+    compare_parser.add_argument('current', type=str)
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help="Relative slowdown of the median reported as a regression")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        report = run_benchmarks(args.cases, args.sizes, args.repeat, args.warmup)
+        output = args.output or os.path.join(DEFAULT_RESULTS_DIR, f"{report['meta']['commit'] or 'local'}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {output}")
+        return
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r') as f:
+        current = json.load(f)
+    regressions = 0
+    for name, base, cur, ratio, status in compare_results(baseline, current, args.threshold):
+        base_text = f"{base * 1e3:10.2f}" if base is not None else f"{'-':>10}"
+        ratio_text = f"{ratio:6.2f}x" if ratio is not None else f"{'-':>7}"
+        print(f"{name:40s} {base_text} ms -> {cur * 1e3:10.2f} ms {ratio_text}  {status}")
+        regressions += status == 'regression'
+    if regressions:
+        print(f"{regressions} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
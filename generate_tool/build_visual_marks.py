@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import time
+import argparse
+import cv2
+from concurrent.futures import ProcessPoolExecutor, as_completed
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_tool'))
+from gaze_index import load_gaze_index, frame_number
+from mark_renderer import draw_gaze_mark, gaze_mark_position
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+STYLE_FILE = 'mark_style.json'
+
+
+def write_image_atomic(path, image):
+    """Encode to a temporary file next to path and rename it into place."""
+    ext = os.path.splitext(path)[1]
+    ok, buffer = cv2.imencode(ext, image)
+    if not ok:
+        raise ValueError(f"Failed to encode {path}")
+    tmp_path = f"{path}.tmp{os.getpid()}{ext}"
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.tobytes())
+    os.replace(tmp_path, path)
+
+
+def is_up_to_date(output_path, source_mtime):
+    try:
+        return os.stat(output_path).st_mtime >= source_mtime
+    except FileNotFoundError:
+        return False
+
+
+def mark_video(src_dir, dst_dir, frames, style, narration_mtime, force=False):
+    """
+    Draw the gaze mark on every frame of one video.
+
+    Args:
+        src_dir: Folder with the original frames of the video
+        dst_dir: Output folder for the marked frames
+        frames: List of (image name, gaze_info or None)
+        style: Dictionary with radius, color and thickness
+        narration_mtime: Modification time of the narration JSON; outputs older than it are redrawn
+        force: Redraw every frame
+
+    Returns:
+        (frames written, frames skipped)
+    """
+    os.makedirs(dst_dir, exist_ok=True)
+    written = skipped = 0
+    for image_name, gaze_info in frames:
+        src_path = os.path.join(src_dir, image_name)
+        dst_path = os.path.join(dst_dir, image_name)
+        source_mtime = max(os.stat(src_path).st_mtime, narration_mtime)
+        if not force and is_up_to_date(dst_path, source_mtime):
+            skipped += 1
+            continue
+        image = cv2.imread(src_path)
+        if image is None:
+            print(f"Failed to load image {src_path}, skipping.")
+            continue
+        gaze = gaze_mark_position(gaze_info)
+        if gaze is not None:
+            draw_gaze_mark(image, gaze[0], gaze[1], style['radius'], tuple(style['color']), style['thickness'])
+        write_image_atomic(dst_path, image)
+        written += 1
+    return written, skipped
+
+
+def plan_dataset(dataset, image_root, narration_json):
+    """
+    Frames of every video of a dataset paired with their gaze.
+
+    Frames without a narration entry are copied unmarked, so the output tree
+    holds every frame a QA group can reference.
+
+    Returns:
+        {video_id: [(image name, gaze_info or None), ...]}
+    """
+    gaze_index = load_gaze_index(narration_json)
+    dataset_dir = os.path.join(image_root, dataset)
+    plan = {}
+    for video_id, frames in gaze_index.items():
+        video_dir = os.path.join(dataset_dir, video_id)
+        if not os.path.isdir(video_dir):
+            print(f"Frames of {video_id} not found in {dataset_dir}, skipping.")
+            continue
+        image_names = sorted(name for name in os.listdir(video_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+        plan[video_id] = [(name, frames.get(frame_number(name, dataset))) for name in image_names]
+    return plan
+
+
+def style_changed(output_dir, style):
+    """True if output_dir was built with a different marker style (or not built at all)."""
+    try:
+        with open(os.path.join(output_dir, STYLE_FILE), 'r') as f:
+            return json.load(f) != style
+    except (FileNotFoundError, json.JSONDecodeError):
+        return True
+
+
+def build_visual_marks(dataset, image_root, narration_json, output_root, style, workers=None, force=False):
+    """Build <output_root>/<dataset>/<video_id>/<frame> with one process per video at a time."""
+    output_dir = os.path.join(output_root, dataset)
+    os.makedirs(output_dir, exist_ok=True)
+    # Outputs drawn with another style are stale even if they are newer than their sources.
+    force = force or style_changed(output_dir, style)
+    plan = plan_dataset(dataset, image_root, narration_json)
+    narration_mtime = os.stat(narration_json).st_mtime
+    total = sum(len(frames) for frames in plan.values())
+    print(f"----Building visual marks for {dataset}: {len(plan)} videos, {total} frames----")
+
+    start = time.time()
+    written = skipped = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(mark_video, os.path.join(image_root, dataset, video_id),
+                            os.path.join(output_dir, video_id), frames, style, narration_mtime, force): video_id
+            for video_id, frames in plan.items()
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            video_written, video_skipped = future.result()
+            written += video_written
+            skipped += video_skipped
+            elapsed = time.time() - start
+            print(f"[{done}/{len(futures)}] {futures[future]}: {video_written} written, {video_skipped} up to date "
+                  f"({(written + skipped) / max(elapsed, 1e-9):.1f} frames/s)")
+
+    with open(os.path.join(output_dir, STYLE_FILE), 'w') as f:
+        json.dump(style, f)
+    elapsed = time.time() - start
+    print(f"{dataset}: {written} frames written, {skipped} up to date in {elapsed:.1f}s "
+          f"({written / max(elapsed, 1e-9):.1f} frames/s drawn)")
+    return written, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the visual_mark frame datasets in parallel")
+    parser.add_argument('--datasets', nargs='+', default=['ego4d', 'egoexo', 'egtea'])
+    parser.add_argument('--image_root', type=str, default="/home/pty_ssd/EgoEye/datasets",
+                        help="Folder with <dataset>/<video_id>/<frame> original frames")
+    parser.add_argument('--narration_dir', type=str, default="/home/pty_ssd/EgoEye/narrations")
+    parser.add_argument('--output_root', type=str, default="/home/pty_ssd/EgoEye/datasets/visual_mark")
+    parser.add_argument('--radius', type=int, default=20)
+    parser.add_argument('--color', type=int, nargs=3, default=[0, 0, 255], help="BGR color of the mark")
+    parser.add_argument('--thickness', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="Redraw frames that are up to date")
+    args = parser.parse_args()
+
+    style = {'radius': args.radius, 'color': args.color, 'thickness': args.thickness}
+    for dataset in args.datasets:
+        narration_json = os.path.join(args.narration_dir, f"{dataset}.json")
+        build_visual_marks(dataset, args.image_root, narration_json, args.output_root, style, args.workers, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 import os
 import json
+import argparse
 import cv2
 import glob
+import numpy as np
 import pandas as pd
 from math import ceil
+from tracing_hooks import span, traced
 
 
 def read_annotations(annotations_file):
@@ -38,12 +41,67 @@ def get_video_and_gaze_paths(take_name, takes_root):
     return video_path, gaze_data_path
 
 
-def load_gaze_data(gaze_data_path):
+# Aria gaze is recorded at 10 fps; every sample covers 3 frames of the 30 fps video.
+GAZE_FRAME_REPEAT = 3
+GAZE_CHUNK_ROWS = 1_000_000
+
+
+def gaze_cache_path(gaze_data_path):
+    """Columnar cache of the x/y columns next to the gaze CSV, e.g. general_eye_gaze_2d.xy.npy."""
+    return f"{os.path.splitext(gaze_data_path)[0]}.xy.npy"
+
+
+@traced("io.parse_gaze_csv")
+def read_gaze_xy(gaze_data_path, chunk_rows=GAZE_CHUNK_ROWS):
+    """
+    Parse only the x and y columns of a gaze CSV, chunk_rows rows at a time.
+
+    Returns:
+        (N, 2) float32 array of x, y
+    """
+    with pd.read_csv(gaze_data_path, usecols=['x', 'y'], dtype={'x': np.float32, 'y': np.float32},
+                     chunksize=chunk_rows) as reader:
+        chunks = [chunk[['x', 'y']].to_numpy() for chunk in reader]
+    if not chunks:
+        return np.empty((0, 2), dtype=np.float32)
+    return np.concatenate(chunks)
+
+
+def load_gaze_xy(gaze_data_path, use_cache=True):
+    """
+    x and y of a gaze CSV at its recorded 10 fps, through the .npy cache.
+
+    The cache is used when it is at least as recent as the CSV; otherwise the
+    CSV is parsed and the cache rewritten, so later runs skip CSV parsing.
+
+    Returns:
+        (N, 2) float32 array of x, y
+    """
+    cache_path = gaze_cache_path(gaze_data_path)
+    if use_cache and os.path.exists(cache_path) and os.stat(cache_path).st_mtime >= os.stat(gaze_data_path).st_mtime:
+        with span("io.load_gaze_cache"):
+            return np.load(cache_path)
+
+    xy = read_gaze_xy(gaze_data_path)
+    if use_cache:
+        tmp_path = f"{cache_path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, xy)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Warning: could not write gaze cache {cache_path}: {e}")
+    return xy
+
+
+@traced("io.load_gaze_data")
+def load_gaze_data(gaze_data_path, use_cache=True):
     """
     Load gaze data and align frame rate from 10fps to 30fps.
     
     Args:
         gaze_data_path: Path to the gaze data CSV file
+        use_cache: Read and write the x/y cache next to the CSV (gaze_cache_path)
     
     Returns:
         DataFrame with aligned gaze data (x, y coordinates)
@@ -52,15 +110,9 @@ def load_gaze_data(gaze_data_path):
         print(f"Warning: {gaze_data_path} does not exist, skipping.")
         return None
     
-    gaze_data = pd.read_csv(gaze_data_path)
-
-    x_values = gaze_data['x'].tolist()
-    y_values = gaze_data['y'].tolist()
-
-    x_values = [num for num in x_values for _ in range(3)]
-    y_values = [num for num in y_values for _ in range(3)]
+    xy = np.repeat(load_gaze_xy(gaze_data_path, use_cache), GAZE_FRAME_REPEAT, axis=0)
 
-    gaze_data_aligned = pd.DataFrame({'x': x_values, 'y': y_values})
+    gaze_data_aligned = pd.DataFrame({'x': xy[:, 0], 'y': xy[:, 1]})
 
     return gaze_data_aligned
 
@@ -78,11 +130,12 @@ def normalize_gaze_coordinates(gaze_x, gaze_y, frame_width, frame_height):
     Returns:
         normalized_x, normalized_y: Normalized coordinates
     """
-    normalized_x = round(gaze_x / frame_width, 3)
-    normalized_y = round(gaze_y / frame_height, 3)
+    normalized_x = round(float(gaze_x) / frame_width, 3)
+    normalized_y = round(float(gaze_y) / frame_height, 3)
     return normalized_x, normalized_y
 
 
+@traced("video.process_video")
 def process_video(take_uid, take_info, video_path, gaze_data, fps, output_folder):
     """
     Process video frames and save gaze information.
@@ -113,8 +166,9 @@ def process_video(take_uid, take_info, video_path, gaze_data, fps, output_folder
         if frame_num < len(gaze_data):
             gaze_x, gaze_y = gaze_data.loc[frame_num, ['x', 'y']]
 
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-            ret, frame = cap.read()
+            with span("video.seek_read"):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+                ret, frame = cap.read()
             if ret:
                 frame_height, frame_width = frame.shape[:2]
 
@@ -123,7 +177,8 @@ def process_video(take_uid, take_info, video_path, gaze_data, fps, output_folder
                 )
 
                 image_path = os.path.join(output_folder, f'{frame_num}.jpg')
-                cv2.imwrite(image_path, frame)
+                with span("io.write_frame"):
+                    cv2.imwrite(image_path, frame)
                 relative_image_path = os.path.join(take_uid, f'{frame_num}.jpg')
 
                 gaze_info = {
@@ -150,6 +205,7 @@ def process_video(take_uid, take_info, video_path, gaze_data, fps, output_folder
     return take_annotations
 
 
+@traced("io.save_annotations")
 def save_annotations_to_json(all_annotations, output_folder):
     """
     Save all annotation data to a single JSON file.
@@ -165,9 +221,16 @@ def save_annotations_to_json(all_annotations, output_folder):
 
 
 def main():
-    annotations_file = '/home/pty_ssd/ego4d_exo_gaze/ego4d_exo_gaze_annotations/annotations/keystep_train.json'
-    takes_root = '/home/pty_ssd/ego4d_exo_gaze/takes'
-    output_root = '/home/pty_ssd/ego4d_exo_gaze/output_0214_keystep'
+    parser = argparse.ArgumentParser(description="Extract keystep frames with normalized gaze from Ego-Exo4D takes")
+    parser.add_argument('--annotations_file', type=str,
+                        default='/home/pty_ssd/ego4d_exo_gaze/ego4d_exo_gaze_annotations/annotations/keystep_train.json')
+    parser.add_argument('--takes_root', type=str, default='/home/pty_ssd/ego4d_exo_gaze/takes')
+    parser.add_argument('--output_root', type=str, default='/home/pty_ssd/ego4d_exo_gaze/output_0214_keystep')
+    args = parser.parse_args()
+
+    annotations_file = args.annotations_file
+    takes_root = args.takes_root
+    output_root = args.output_root
 
     if not os.path.exists(output_root):
         os.mkdir(output_root)
@@ -5,8 +5,10 @@ import base64
 import argparse
 import cv2
 from openai import OpenAI
+from tracing_hooks import traced
 
 
+@traced("io.group_frames")
 def group_frames_and_generate_text(image_folder, json_file, target_group_index, group_size=9):
     """
     Groups images from a folder and retrieves narration and gaze information from JSON.
@@ -69,6 +71,7 @@ def group_frames_and_generate_text(image_folder, json_file, target_group_index,
         return [], []
 
 
+@traced("io.encode_images")
 def encode_images_from_folder(folder_path, group_id):
     """
     Encode image files to Base64 format.
@@ -91,6 +94,7 @@ def encode_images_from_folder(folder_path, group_id):
     return image_data_list
 
 
+@traced("io.append_json")
 def append_to_json(target_group_index, group_id, caption, completion_content, output_path):
     """
     Append generated QA data to JSON file.
@@ -123,6 +127,7 @@ def append_to_json(target_group_index, group_id, caption, completion_content, ou
     print(f"New entry appended to {output_path}")
 
 
+@traced("io.save_csv")
 def save_completion_to_csv(video_id, group_id, completion_content, output_csv):
     """
     Parse completion content and save to CSV file.
@@ -179,7 +184,8 @@ def save_completion_to_csv(video_id, group_id, completion_content, output_csv):
     print(f"Data appended to {output_csv}")
 
 
-def visualize_gaze_for_group(json_file, video_id, group_ids, output_dir, radius=20, color=(0, 0, 255), thickness=2):
+def visualize_gaze_for_group(json_file, video_id, group_ids, output_dir, radius=20, color=(0, 0, 255), thickness=2,
+                             image_root="/home/pty_ssd/Output1211"):
     """
     Visualize gaze points on video frames and save the results.
     
@@ -191,6 +197,7 @@ def visualize_gaze_for_group(json_file, video_id, group_ids, output_dir, radius=
         radius: Radius of the gaze circle
         color: Color of the gaze circle (default: red)
         thickness: Thickness of the circle
+        image_root: Directory the narration image paths are relative to
     """
     os.makedirs(output_dir, exist_ok=True)
     
@@ -224,7 +231,7 @@ def visualize_gaze_for_group(json_file, video_id, group_ids, output_dir, radius=
         if gaze_x < 0 or gaze_y < 0 or confidence < 1.0:
             continue
         
-        full_image_path = os.path.join("/home/pty_ssd/Output1211", image_path)
+        full_image_path = os.path.join(image_root, image_path)
         if not os.path.exists(full_image_path):
             print(f"Image {full_image_path} not found, skipping.")
             continue
@@ -267,7 +274,8 @@ def main():
             base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
         )
 
-        completion = client.chat.completions.create(
+        api_request = traced("api.request")(client.chat.completions.create)
+        completion = api_request(
             model="qwen-vl-max-latest",
             messages=[
                 {
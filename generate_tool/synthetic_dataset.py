@@ -0,0 +1,237 @@
+import os
+import csv
+import json
+import uuid
+import random
+import argparse
+import cv2
+import numpy as np
+
+
+DATASETS = ['ego4d', 'egoexo', 'egtea']
+CATEGORIES = ['spatial', 'temporal', 'causal']
+OBJECTS = ['knife', 'cutting board', 'pan', 'bowl', 'sink', 'fridge', 'plate', 'cup', 'spoon', 'towel']
+STRATEGIES = {'wo': 0.4, 'gaze': 0.55, 'mark': 0.5, 'saliencemap': 0.6}
+GROUP_SIZE = 9
+FRAME_STRIDE = 30
+
+
+def gaze_walk(num_frames, rng):
+    """Smooth normalized gaze trajectory: a clipped random walk with occasional saccades."""
+    steps = rng.normal(0, 0.004, size=(num_frames, 2))
+    saccades = rng.random(num_frames) < 0.01
+    steps[saccades] += rng.normal(0, 0.2, size=(int(saccades.sum()), 2))
+    gaze = 0.5 + np.cumsum(steps, axis=0)
+    return np.clip(gaze, 0.02, 0.98)
+
+
+def render_frame(index, gaze_xy, height, width):
+    """Synthetic frame: a drifting color gradient with a bright blob at the gaze point."""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[..., 0] = ((x + index * 2) % 256).astype(np.uint8)
+    frame[..., 1] = ((y + index) % 256).astype(np.uint8)
+    frame[..., 2] = (index * 3) % 256
+    center = (int(gaze_xy[0] * width), int(gaze_xy[1] * height))
+    cv2.circle(frame, center, max(4, width // 40), (255, 255, 255), -1)
+    return frame
+
+
+def write_video(video_path, gaze, height, width, fps, keep_frames=()):
+    """
+    Write an mp4 with one rendered frame per gaze sample.
+
+    Returns:
+        {frame index: frame} for the frames listed in keep_frames
+    """
+    os.makedirs(os.path.dirname(video_path), exist_ok=True)
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    keep_frames = set(keep_frames)
+    kept = {}
+    for index, gaze_xy in enumerate(gaze):
+        frame = render_frame(index, gaze_xy, height, width)
+        writer.write(frame)
+        if index in keep_frames:
+            kept[index] = frame
+    writer.release()
+    return kept
+
+
+def frame_name(dataset, video_id, frame):
+    """
+    Frame path below the video folder, as written in group_id (see gaze_index.frame_number).
+
+    EGTEA frames are flat <video_id>_<frame>.jpg files; ego4d and egoexo
+    frames sit in a <uid> sub-folder, <uid>/<frame>.jpg.
+    """
+    if dataset == 'egtea':
+        return f"{video_id}_{frame}.jpg"
+    return f"{video_id}/{frame}.jpg"
+
+
+def make_video_id(dataset, index, rng):
+    # EGTEA frame names are <video_id>_<frame>.jpg, so its ids must not contain '_'.
+    if dataset == 'egtea':
+        return f"P{index:02d}-R01-Synthetic"
+    return str(uuid.UUID(int=rng.getrandbits(128)))
+
+
+def make_qa(dataset, category, video_id, frames, rng):
+    """One QA row in the qa_pairs CSV format."""
+    start = rng.randrange(0, max(1, len(frames) - GROUP_SIZE + 1))
+    group = [frame_name(dataset, video_id, frame) for frame in frames[start:start + GROUP_SIZE]]
+    target, *distractors = rng.sample(OBJECTS, 5)
+    options = [target] + distractors
+    rng.shuffle(options)
+    letters = 'ABCDE'
+    question = {
+        'spatial': f"Where is the {target} relative to the object I am looking at?",
+        'temporal': f"What did I look at right after the {target}?",
+        'causal': f"Why did I look at the {target}?",
+    }[category]
+    return {
+        'video_id': video_id,
+        'group_id': "\n".join(group),
+        'Question': question,
+        'Answer Options': "\n".join(f"{letter}: The {option}." for letter, option in zip(letters, options)),
+        'Correct Answer': letters[options.index(target)],
+    }
+
+
+def write_csv(path, fieldnames, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def generate(root, num_videos=3, narrations=20, qa_per_category=10, height=240, width=320, fps=30,
+             datasets=DATASETS, categories=CATEGORIES, with_results=True, seed=0):
+    """
+    Write a scaled-down mirror of the real data layout below root.
+
+    root/ego4d_exo_gaze/ego4d_exo_gaze_annotations/annotations/keystep_train.json
+    root/ego4d_exo_gaze/takes/<take_name>/frame_aligned_videos/aria01_214-1.mp4
+    root/ego4d_exo_gaze/takes/<take_name>/eye_gaze/general_eye_gaze_2d.csv
+    root/EgoEye/long_videos/<dataset>/<video_id>.mp4          (ego4d, egtea)
+    root/EgoEye/datasets/<dataset>/<video_id>/<uid>/<frame>.jpg   (ego4d, egoexo)
+    root/EgoEye/datasets/egtea/<video_id>/<video_id>_<frame>.jpg
+    root/EgoEye/narrations/<dataset>.json
+    root/EgoEye/qa_pairs/<category>_<dataset>.csv
+    root/EgoEye/ablation/gazees_vllm/<dataset>/<video_id>.csv
+    root/EgoEye/results/synthetic/<model>-<category>_<dataset>-<strategy>.csv   (with_results)
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    exo_root = os.path.join(root, 'ego4d_exo_gaze')
+    ego_root = os.path.join(root, 'EgoEye')
+    num_frames = narrations * FRAME_STRIDE + FRAME_STRIDE
+    keystep = {'annotations': {}}
+    qa_rows = {}
+
+    for dataset in datasets:
+        narration_data = {}
+        for v in range(num_videos):
+            video_id = make_video_id(dataset, v, rng)
+            gaze = gaze_walk(num_frames, np_rng)
+            frames = [(i + 1) * FRAME_STRIDE for i in range(narrations)]
+
+            if dataset == 'egoexo':
+                take_name = f"synthetic_take_{v}"
+                take_dir = os.path.join(exo_root, 'takes', take_name)
+                video_path = os.path.join(take_dir, 'frame_aligned_videos', 'aria01_214-1.mp4')
+                # Aria gaze is recorded at 10 fps in pixels; load_gaze_data repeats it to 30 fps.
+                gaze_10fps = gaze[::3] * [width, height]
+                gaze_csv = os.path.join(take_dir, 'eye_gaze', 'general_eye_gaze_2d.csv')
+                write_csv(gaze_csv, ['timestamp_us', 'x', 'y'],
+                          [{'timestamp_us': i * 100000, 'x': round(x, 3), 'y': round(y, 3)}
+                           for i, (x, y) in enumerate(gaze_10fps)])
+                keystep['annotations'][video_id] = {
+                    'take_uid': video_id,
+                    'take_name': take_name,
+                    'scenario': 'Cooking',
+                    'segments': [{'start_time': (frame - FRAME_STRIDE) / fps, 'end_time': frame / fps,
+                                  'step_description': f"Step {i}: handle the {rng.choice(OBJECTS)}"}
+                                 for i, frame in enumerate(frames)],
+                }
+            else:
+                video_path = os.path.join(ego_root, 'long_videos', dataset, f"{video_id}.mp4")
+
+            kept = write_video(video_path, gaze, height, width, fps, keep_frames=frames)
+            frame_dir = os.path.join(ego_root, 'datasets', dataset, video_id)
+            for frame, image in kept.items():
+                frame_path = os.path.join(frame_dir, frame_name(dataset, video_id, frame))
+                os.makedirs(os.path.dirname(frame_path), exist_ok=True)
+                cv2.imwrite(frame_path, image)
+
+            narration_data[video_id] = {'narrations': [
+                {'timestamp_sec': round(frame / fps, 3), 'timestamp_frame': frame,
+                 'narration_text': f"I handle the {rng.choice(OBJECTS)}.",
+                 'gaze_info': {'gaze_x': round(float(gaze[frame][0]), 3), 'gaze_y': round(float(gaze[frame][1]), 3)}}
+                for frame in frames
+            ]}
+
+            noisy = np.clip(gaze[frames] + np_rng.normal(0, 0.03, size=(len(frames), 2)), 0, 1)
+            write_csv(os.path.join(ego_root, 'ablation', 'gazees_vllm', dataset, f"{video_id}.csv"), ['frame', 'gaze'],
+                      [{'frame': frame_name(dataset, video_id, frame), 'gaze': f"({x:.4f}, {y:.4f})"}
+                       for frame, (x, y) in zip(frames, noisy)])
+
+            for category in categories:
+                qa_rows.setdefault((category, dataset), []).extend(
+                    make_qa(dataset, category, video_id, frames, rng) for _ in range(qa_per_category))
+
+        os.makedirs(os.path.join(ego_root, 'narrations'), exist_ok=True)
+        with open(os.path.join(ego_root, 'narrations', f"{dataset}.json"), 'w') as f:
+            json.dump(narration_data, f)
+
+    annotations_dir = os.path.join(exo_root, 'ego4d_exo_gaze_annotations', 'annotations')
+    os.makedirs(annotations_dir, exist_ok=True)
+    with open(os.path.join(annotations_dir, 'keystep_train.json'), 'w') as f:
+        json.dump(keystep, f)
+
+    for (category, dataset), rows in qa_rows.items():
+        write_csv(os.path.join(ego_root, 'qa_pairs', f"{category}_{dataset}.csv"),
+                  ['video_id', 'group_id', 'Question', 'Answer Options', 'Correct Answer'], rows)
+        if with_results:
+            write_results(os.path.join(ego_root, 'results', 'synthetic'), category, dataset, rows, rng)
+
+    print(f"Synthetic data written to {root}: {len(datasets)} datasets x {num_videos} videos, "
+          f"{narrations} narrated frames per video, {sum(len(r) for r in qa_rows.values())} QA pairs")
+
+
+def write_results(result_dir, category, dataset, rows, rng, model='Synthetic-VL'):
+    """Simulated result CSVs, one per prompting strategy, for caculate.py and significance.py."""
+    for strategy, accuracy in STRATEGIES.items():
+        results = []
+        for row in rows:
+            answer = row['Correct Answer'] if rng.random() < accuracy else rng.choice('ABCDE')
+            results.append({'video_id': row['video_id'], 'Question': row['Question'],
+                            'Answer Options': row['Answer Options'], 'Model_Answer': answer,
+                            'Reference_Answer': row['Correct Answer']})
+        write_csv(os.path.join(result_dir, f"{model}-{category}_{dataset}-{strategy}.csv"),
+                  ['video_id', 'Question', 'Answer Options', 'Model_Answer', 'Reference_Answer'], results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a scaled-down synthetic mirror of the EgoGazeVQA data layout")
+    parser.add_argument('--output_root', type=str, required=True)
+    parser.add_argument('--videos', type=int, default=3, help="Videos per dataset")
+    parser.add_argument('--narrations', type=int, default=20, help="Narrated frames per video")
+    parser.add_argument('--qa_per_category', type=int, default=10, help="QA pairs per video and category")
+    parser.add_argument('--height', type=int, default=240)
+    parser.add_argument('--width', type=int, default=320)
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--datasets', nargs='+', default=DATASETS)
+    parser.add_argument('--categories', nargs='+', default=CATEGORIES)
+    parser.add_argument('--no_results', action='store_true', help="Do not write simulated result CSVs")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generate(args.output_root, args.videos, args.narrations, args.qa_per_category, args.height, args.width,
+             args.fps, args.datasets, args.categories, not args.no_results, args.seed)
+
+
+if __name__ == "__main__":
+    main()
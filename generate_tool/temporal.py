@@ -4,8 +4,10 @@ import csv
 import base64
 import argparse
 from openai import OpenAI
+from tracing_hooks import traced
 
 
+@traced("io.group_frames")
 def group_frames_and_generate_text(image_folder, json_file, target_group_index, group_size=9):
     """
     Groups images from a folder and retrieves narration and gaze information from JSON.
@@ -68,6 +70,7 @@ def group_frames_and_generate_text(image_folder, json_file, target_group_index,
         return [], []
 
 
+@traced("io.encode_images")
 def encode_images_from_folder(folder_path, group_id):
     """
     Encode image files to Base64 format.
@@ -90,6 +93,7 @@ def encode_images_from_folder(folder_path, group_id):
     return image_data_list
 
 
+@traced("io.append_json")
 def append_to_json(target_group_index, group_id, caption, completion_content, output_path):
     """
     Append generated QA data to JSON file.
@@ -122,6 +126,7 @@ def append_to_json(target_group_index, group_id, caption, completion_content, ou
     print(f"New entry appended to {output_path}")
 
 
+@traced("io.save_csv")
 def save_completion_to_csv(video_id, group_id, completion_content, output_csv):
     """
     Parse completion content and save to CSV file.
@@ -204,7 +209,8 @@ def main():
             base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
         )
 
-        completion = client.chat.completions.create(
+        api_request = traced("api.request")(client.chat.completions.create)
+        completion = api_request(
             model="qwen-vl-max-latest",
             messages=[
                 {
@@ -0,0 +1,49 @@
+import os
+import sys
+import importlib.util
+
+
+TRACING_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_tool', 'tracing.py')
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _load_tracing():
+    """
+    test_tool/tracing.py, without putting test_tool on sys.path, or None if it is not there.
+
+    The module is registered as "tracing", so test_tool modules imported later
+    in the same process share its spans.
+    """
+    if 'tracing' in sys.modules:
+        return sys.modules['tracing']
+    if not os.path.exists(TRACING_PATH):
+        return None
+    spec = importlib.util.spec_from_file_location('tracing', TRACING_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['tracing'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+_tracing = _load_tracing()
+
+if _tracing is not None:
+    span, traced = _tracing.span, _tracing.traced
+else:
+    # Standalone copy of generate_tool: the dataset generators run untraced.
+    _NULL_SPAN = _NullSpan()
+
+    def span(name, **args):
+        return _NULL_SPAN
+
+    def traced(name=None):
+        return lambda fn: fn
@@ -1,22 +1,187 @@
-import pandas as pd
 import os
+import re
+import glob
+import argparse
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+
+DATASETS = ['ego4d', 'egoexo', 'egtea']
+CATEGORIES = ['spatial', 'temporal', 'causal']
+
+# Result scripts do not agree on column names; map every known variant to one schema.
+COLUMN_ALIASES = {
+    'video_id': ['video_id'],
+    'question': ['question', 'Question'],
+    'answer_options': ['answer_options', 'Answer Options'],
+    'model_answer': ['model_answer', 'Model_Answer', 'InternVL_Model_Answer'],
+    'reference_answer': ['reference_answer', 'Reference_Answer', 'Correct Answer'],
+    'row_key': ['row_key'],
+}
+# API runs name their files "<category>_<dataset>[-<setting>].csv" and all use this model.
+API_MODEL = 'qwen-vl-max-latest'
+
+RESULT_NAME_PATTERN = re.compile(
+    r'(?P<category>' + '|'.join(CATEGORIES) + r')_(?P<dataset>' + '|'.join(DATASETS) + r')(?:-(?P<strategy>[A-Za-z0-9][\w-]*))?'
+)
+# Per-shard outputs of a --shard i/N run (result_writer.shard_path)
+SHARD_NAME_PATTERN = re.compile(r'\.shard\d+of\d+\.csv$')
+# "C", "C: The knife...", "(C)", "**C**", "C." at the start of the answer
+LEADING_CHOICE = r'^\W*([A-E])(?=\s*(?:$|[:.)\]*,]))'
+# "The answer is C", "Option: (B)" anywhere in a free-form answer
+STATED_CHOICE = r'(?i:answer|option)\W*(?:is\W*)?([A-E])(?![A-Za-z])'
+
+
+def normalize_columns(df):
+    """Rename result columns to video_id, question, answer_options, model_answer, reference_answer."""
+    renames = {}
+    for target, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in df.columns and target not in renames.values():
+                renames[alias] = target
+                break
+    return df.rename(columns=renames)
+
+
+def extract_choice(answers):
+    """
+    Vectorized extraction of the option letter from model or reference answers.
+
+    Args:
+        answers: Series of raw answers
+
+    Returns:
+        Series of letters A-E, NaN where no option could be found
+    """
+    answers = answers.fillna('').astype(str).str.strip()
+    choice = answers.str.extract(LEADING_CHOICE, expand=False)
+    missing = choice.isna()
+    if missing.any():
+        choice.loc[missing] = answers[missing].str.extract(STATED_CHOICE, expand=False)
+    return choice
+
+
+def parse_result_name(file_path):
+    """
+    Dataset, category, strategy and model encoded in a result file path.
+
+    Handles "<model>-<category>_<dataset>-<strategy>.csv" (qwenvl_test),
+    "<model>_<category>_<dataset>.csv" (gazees) and "<category>_<dataset>[-<setting>].csv"
+    (API runs: the model is API_MODEL and the strategy is the parent directory,
+    followed by the setting suffix when there is one, e.g. qwenvl_api-fov336_c64).
+    """
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    parent = os.path.basename(os.path.dirname(os.path.abspath(file_path)))
+    match = RESULT_NAME_PATTERN.search(name)
+    if match is None:
+        return {'dataset': None, 'category': None, 'strategy': parent, 'model': parent}
+    strategy = match.group('strategy')
+    model = name[:match.start()].rstrip('-_')
+    if not model:
+        model = API_MODEL
+        strategy = f"{parent}-{strategy}" if strategy else parent
+    elif strategy is None:
+        strategy = parent
+    return {'dataset': match.group('dataset'), 'category': match.group('category'),
+            'strategy': strategy, 'model': model}
+
+
+def load_result_file(file_path):
+    """Load one result CSV with normalized columns, metadata columns and a boolean `correct` column."""
+    df = normalize_columns(pd.read_csv(file_path))
+    for column, value in parse_result_name(file_path).items():
+        df[column] = value
+    df['file'] = file_path
+    df['model_choice'] = extract_choice(df['model_answer'])
+    df['reference_choice'] = extract_choice(df['reference_answer'])
+    df['correct'] = df['model_choice'].notna() & (df['model_choice'] == df['reference_choice'])
+    return df
+
+
+def find_result_files(result_dir, pattern='*.csv'):
+    """Result CSVs below result_dir, without per-shard outputs (their rows are in the merged CSV)."""
+    files = glob.glob(os.path.join(result_dir, '**', pattern), recursive=True)
+    return sorted(path for path in files if not SHARD_NAME_PATTERN.search(path))
+
+
+def load_results(result_dir, pattern='*.csv', workers=8):
+    """
+    Load every result file below result_dir concurrently into one DataFrame.
+
+    Files without model/reference answer columns are skipped.
+    """
+    files = find_result_files(result_dir, pattern)
+
+    def load(file_path):
+        try:
+            return load_result_file(file_path)
+        except (KeyError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+            print(f"Skipping {file_path}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        frames = [df for df in executor.map(load, files) if df is not None]
+    if not frames:
+        return pd.DataFrame(columns=['dataset', 'category', 'strategy', 'model', 'file', 'correct'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def accuracy_table(df, by):
+    """Accuracy (%) and row count grouped by the given columns."""
+    grouped = df.groupby(by, dropna=False)['correct'].agg(['mean', 'size'])
+    grouped['accuracy'] = (grouped['mean'] * 100).round(2)
+    return grouped.rename(columns={'size': 'count'})[['accuracy', 'count']].reset_index()
+
+
+def accuracy_report(df):
+    """Per-file, per-dataset, per-category, per-strategy and dataset x category accuracy tables."""
+    grid = df.groupby(['model', 'strategy', 'dataset', 'category'])['correct'].mean().mul(100).round(2)
+    return {
+        'file': accuracy_table(df, ['file']),
+        'dataset': accuracy_table(df, ['model', 'strategy', 'dataset']),
+        'category': accuracy_table(df, ['model', 'strategy', 'category']),
+        'strategy': accuracy_table(df, ['model', 'strategy']),
+        'grid': grid.unstack('category'),
+    }
+
 
 def calculate_accuracy(file_path):
 
-    df = pd.read_csv(file_path)
-    
-    # correct_count = (df["Model_Answer"] == df["Reference_Answer"]).sum()
-    # correct_count = (df["InternVL_Model_Answer"] == df["Reference_Answer"]).sum()
-    correct_count = (df["model_answer"] == df["reference_answer"]).sum()
-    total_count = len(df)
-    accuracy = (correct_count / total_count) * 100 if total_count > 0 else 0
-    
+    df = load_result_file(file_path)
+    accuracy = df['correct'].mean() * 100 if len(df) > 0 else 0
+
     return round(accuracy, 2)
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy of EgoGazeVQA result files")
+    parser.add_argument('--result_file', type=str, default=None, help="Single result CSV")
+    parser.add_argument('--result_dir', type=str, default="/home/pty_ssd/EgoEye/results",
+                        help="Directory tree searched for result CSVs")
+    parser.add_argument('--pattern', type=str, default='*.csv', help="File name pattern, e.g. '*_merged.csv'")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--output', type=str, default=None, help="Write the per-file table to this CSV")
+    args = parser.parse_args()
+
+    if args.result_file:
+        accuracy = calculate_accuracy(args.result_file)
+        print(f"{os.path.basename(args.result_file)} Acc: {accuracy:.2f}%")
+        return
+
+    df = load_results(args.result_dir, args.pattern, args.workers)
+    if df.empty:
+        print(f"No result files matching {args.pattern} in {args.result_dir}")
+        return
+    report = accuracy_report(df)
+    for name in ['strategy', 'dataset', 'category']:
+        print(f"----Accuracy per {name}----")
+        print(report[name].to_string(index=False))
+    print("----Accuracy per dataset x category----")
+    print(report['grid'].to_string())
+    if args.output:
+        report['file'].to_csv(args.output, index=False)
+        print(f"Per-file accuracy saved to {args.output}")
+
+
 if __name__ == "__main__":
-    folder_path = "/home/pty_ssd/EgoEye/results/multiframes/frame4"
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith("_merged.csv"):
-            file_path = os.path.join(folder_path, file_name)
-            accuracy = calculate_accuracy(file_path)
-            print(f"{file_name} Acc: {accuracy:.2f}%")
+    main()
@@ -0,0 +1,136 @@
+import io
+import base64
+from collections import OrderedDict
+from PIL import Image
+from pixel_budget import PATCH_PIXELS, MAX_PIXELS, resize_to_budget
+from tracing import span
+
+
+DEFAULT_CROP_SIZE = 336
+DEFAULT_CONTEXT_PIXELS = 64 * PATCH_PIXELS
+
+FOVEATED_PROMPT = ("The first video shows the full scene at low resolution. The second video shows, frame by frame, "
+                   "a high-resolution crop centered on my gaze point.\n")
+
+
+def gaze_crop_box(width, height, gaze_x, gaze_y, crop_size):
+    """
+    Square crop box of side crop_size centered on the gaze point and shifted to lie inside the frame.
+
+    Returns:
+        (left, top, right, bottom) in pixels
+    """
+    side = min(crop_size, width, height)
+    left = int(round(gaze_x * width - side / 2))
+    top = int(round(gaze_y * height - side / 2))
+    left = min(max(left, 0), width - side)
+    top = min(max(top, 0), height - side)
+    return left, top, left + side, top + side
+
+
+def foveate_frame(image, gaze_x, gaze_y, crop_size=DEFAULT_CROP_SIZE, context_pixels=DEFAULT_CONTEXT_PIXELS):
+    """
+    Split a frame into a full-resolution gaze crop and a low-resolution context.
+
+    Args:
+        image: RGB PIL image
+        gaze_x: Normalized gaze x in [0, 1], left to right
+        gaze_y: Normalized gaze y in [0, 1], top to bottom
+        crop_size: Side of the square crop in source pixels
+        context_pixels: Pixel budget of the downscaled full frame
+
+    Returns:
+        (crop, context) PIL images
+    """
+    crop = image.crop(gaze_crop_box(image.width, image.height, gaze_x, gaze_y, crop_size))
+    context = resize_to_budget(image, min_pixels=PATCH_PIXELS, max_pixels=context_pixels)
+    return crop, context
+
+
+def _data_url(image):
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG")
+    return f"data:image/jpeg;base64,{base64.b64encode(buffered.getvalue()).decode('utf-8')}"
+
+
+class Foveator:
+    """
+    Foveated input mode: a high-resolution crop around the gaze point plus a
+    low-resolution view of the whole frame, instead of the full frame.
+
+    Crops and contexts are sent as two videos, and Qwen2.5-VL merges video
+    frames in pairs (temporal_patch_size 2), so every two frames cost
+    (crop_size / 28)^2 + context_pixels / 784 vision tokens, about half of
+    that per frame, whatever the resolution of the source. Frames without
+    gaze are cropped at their center.
+    Rendered pairs are kept in an LRU cache keyed by (frame, gaze, settings).
+
+    Example:
+        foveator = Foveator(crop_size=336, context_pixels=64 * 28 * 28)
+        crops, contexts = foveator.render_group(image_files, gaze_info_per_frame(narration_json, video_id, image_paths))
+        content = foveator.content(crops, contexts) + [{"type": "text", "text": FOVEATED_PROMPT + question}]
+    """
+
+    def __init__(self, crop_size=DEFAULT_CROP_SIZE, context_pixels=DEFAULT_CONTEXT_PIXELS, cache_size=1024):
+        self.crop_size = crop_size
+        self.context_pixels = context_pixels
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.source_pixels = 0
+        self.sent_pixels = 0
+
+    def tag(self):
+        """Short settings identifier for output file names, e.g. fov336_c64."""
+        return f"fov{self.crop_size}_c{self.context_pixels // PATCH_PIXELS}"
+
+    def pixel_range(self):
+        """(min_pixels, max_pixels) to load a local processor with, so crops and contexts are not upscaled."""
+        return min(self.context_pixels, self.crop_size * self.crop_size), MAX_PIXELS
+
+    def render(self, image_path, gaze_info):
+        """(crop, context) of one frame as RGB PIL images."""
+        gaze = (0.5, 0.5)
+        if gaze_info is not None and gaze_info.get('gaze_x') is not None and gaze_info.get('gaze_y') is not None:
+            gaze = (float(gaze_info['gaze_x']), float(gaze_info['gaze_y']))
+        key = (image_path, gaze, self.crop_size, self.context_pixels)
+        pair = self.cache.get(key)
+        if pair is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return pair
+
+        self.misses += 1
+        with span("render.foveate"):
+            with Image.open(image_path) as image:
+                image = image.convert('RGB')
+            pair = foveate_frame(image, gaze[0], gaze[1], self.crop_size, self.context_pixels)
+        self.source_pixels += image.width * image.height
+        self.sent_pixels += sum(part.width * part.height for part in pair)
+        self.cache[key] = pair
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return pair
+
+    def render_group(self, image_files, gaze_info_list):
+        """(crops, contexts) of one QA group, in frame order."""
+        pairs = [self.render(image_path, gaze_info) for image_path, gaze_info in zip(image_files, gaze_info_list)]
+        return [crop for crop, _ in pairs], [context for _, context in pairs]
+
+    def render_group_data_urls(self, image_files, gaze_info_list):
+        """(crops, contexts) of one QA group as JPEG data URLs for the API path."""
+        crops, contexts = self.render_group(image_files, gaze_info_list)
+        return [_data_url(crop) for crop in crops], [_data_url(context) for context in contexts]
+
+    def content(self, crops, contexts):
+        """Message content of the two videos described by FOVEATED_PROMPT: context first, then crops."""
+        return [
+            {"type": "video", "video": contexts},
+            {"type": "video", "video": crops},
+        ]
+
+    def summary(self):
+        rate = self.sent_pixels / self.source_pixels * 100 if self.source_pixels else 0.0
+        return (f"Foveator ({self.tag()}): {self.misses} frames rendered, {self.hits} served from cache, "
+                f"{rate:.1f}% of the source pixels sent")
@@ -0,0 +1,218 @@
+import os
+import io
+import json
+import mmap
+import time
+import base64
+import argparse
+
+
+DEFAULT_STORE_ROOT = "/home/pty_ssd/EgoEye/frame_store"
+INDEX_FILE = "index.json"
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+MIME_TYPES = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png'}
+
+
+def shard_name(shard_id, generation=0):
+    """Shard file name; every repack writes a new generation so readers of the old index keep valid shards."""
+    if generation == 0:
+        return f"shard-{shard_id:05d}.pack"
+    return f"shard-g{generation}-{shard_id:05d}.pack"
+
+
+def is_shard_file(name):
+    return name.startswith("shard-") and (name.endswith(".pack") or name.endswith(".pack.tmp"))
+
+
+def store_generation(store_dir):
+    """Generation of the store in store_dir, -1 if there is none."""
+    try:
+        with open(os.path.join(store_dir, INDEX_FILE), 'r') as f:
+            return json.load(f).get('generation', 0)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return -1
+
+
+def pack_frames(image_dir, store_dir, shard_size=1 << 30):
+    """
+    Convert a <image_dir>/<video_id>/.../<frame> folder tree into a packed frame store.
+
+    Encoded frames are concatenated unchanged into shard files of about
+    shard_size bytes; index.json maps every (video_id, frame name) to
+    (shard, offset, length). The frame name is the path relative to the video
+    folder, as written in group_id (e.g. "<uid>/123.jpg" for ego4d and egoexo).
+
+    A repack writes its shards under the names of a new generation, never over
+    the shards of the current index, and swaps index.json in last, so readers
+    never see a half-written store. Shards of older generations are deleted
+    once the new index is in place.
+
+    Args:
+        image_dir: Folder with one sub-folder of frames per video
+        store_dir: Output folder for shards and index
+        shard_size: Target shard size in bytes
+
+    Returns:
+        Number of frames packed
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    generation = store_generation(store_dir) + 1
+    frames = {}
+    shards = []
+    current = None
+    offset = 0
+    count = 0
+    total_bytes = 0
+    start = time.time()
+
+    def open_shard():
+        shards.append(shard_name(len(shards), generation))
+        return open(os.path.join(store_dir, shards[-1] + ".tmp"), 'wb')
+
+    try:
+        for video_id in sorted(os.listdir(image_dir)):
+            video_dir = os.path.join(image_dir, video_id)
+            if not os.path.isdir(video_dir):
+                continue
+            video_frames = frames.setdefault(video_id, {})
+            for root, dirs, files in os.walk(video_dir):
+                dirs.sort()
+                for file_name in sorted(files):
+                    if not file_name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    image_path = os.path.join(root, file_name)
+                    image_name = os.path.relpath(image_path, video_dir).replace(os.sep, '/')
+                    with open(image_path, 'rb') as f:
+                        data = f.read()
+                    if current is None or (offset > 0 and offset + len(data) > shard_size):
+                        if current is not None:
+                            current.close()
+                        current = open_shard()
+                        offset = 0
+                    current.write(data)
+                    video_frames[image_name] = [len(shards) - 1, offset, len(data)]
+                    offset += len(data)
+                    count += 1
+                    total_bytes += len(data)
+    finally:
+        if current is not None:
+            current.close()
+
+    for name in shards:
+        os.replace(os.path.join(store_dir, name + ".tmp"), os.path.join(store_dir, name))
+    tmp_index = os.path.join(store_dir, INDEX_FILE + ".tmp")
+    with open(tmp_index, 'w') as f:
+        json.dump({'generation': generation, 'shards': shards, 'frames': frames}, f)
+    os.replace(tmp_index, os.path.join(store_dir, INDEX_FILE))
+    for name in os.listdir(store_dir):
+        if is_shard_file(name) and name not in shards:
+            os.remove(os.path.join(store_dir, name))
+
+    elapsed = time.time() - start
+    print(f"Packed {count} frames ({total_bytes / 1e9:.2f} GB) of {len(frames)} videos into {len(shards)} shards "
+          f"in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} frames/s)")
+    return count
+
+
+class FrameStore:
+    """
+    Read-only view of a packed frame store.
+
+    Shards are memory-mapped on first use; get() returns a memoryview into the
+    mapping, so fetching a frame costs neither a file open nor a copy.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, INDEX_FILE), 'r') as f:
+            index = json.load(f)
+        self.shards = index['shards']
+        self.frames = index['frames']
+        self._maps = {}
+
+    def _shard(self, shard_id):
+        mapped = self._maps.get(shard_id)
+        if mapped is None:
+            with open(os.path.join(self.store_dir, self.shards[shard_id]), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[shard_id] = mapped
+        return mapped
+
+    def __contains__(self, key):
+        video_id, image_name = key
+        return image_name in self.frames.get(video_id, {})
+
+    def get(self, video_id, image_name):
+        """Encoded bytes of one frame as a zero-copy memoryview."""
+        shard_id, offset, length = self.frames[video_id][image_name.strip()]
+        return memoryview(self._shard(shard_id))[offset:offset + length]
+
+    def data_url(self, video_id, image_name):
+        mime = MIME_TYPES.get(os.path.splitext(image_name.strip())[1].lower(), 'image/jpeg')
+        return f"data:{mime};base64,{base64.b64encode(self.get(video_id, image_name)).decode('utf-8')}"
+
+    def load_video(self, image_paths, video_id):
+        """
+        Frames of one QA group as PIL images, in the place of the file paths
+        returned by the load_video() helpers of the test scripts.
+        """
+        from PIL import Image
+        images = []
+        for image_name in image_paths:
+            image = Image.open(io.BytesIO(self.get(video_id, image_name)))
+            image.load()
+            images.append(image.convert('RGB'))
+        return images
+
+    def data_urls(self, video_id, group_id):
+        """Base64 data URLs of the frames of one QA group that are in the store."""
+        return [self.data_url(video_id, image_name) for image_name in group_id if (video_id, image_name.strip()) in self]
+
+    def summary(self):
+        count = sum(len(video_frames) for video_frames in self.frames.values())
+        return f"Frame store {self.store_dir}: {len(self.frames)} videos, {count} frames, {len(self.shards)} shards"
+
+    def close(self):
+        for mapped in self._maps.values():
+            try:
+                mapped.close()
+            except BufferError:
+                # A caller still holds a memoryview; the mapping goes away with it.
+                pass
+        self._maps = {}
+
+
+def open_frame_store(store_dir):
+    """FrameStore for store_dir, or None if no store has been packed there."""
+    if os.path.exists(os.path.join(store_dir, INDEX_FILE)):
+        return FrameStore(store_dir)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packed frame store for evaluation datasets")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pack_parser = subparsers.add_parser('pack', help="Convert <image_root>/<dataset> folders into frame stores")
+    pack_parser.add_argument('--datasets', nargs='+', default=['ego4d', 'egoexo', 'egtea'])
+    pack_parser.add_argument('--image_root', type=str, default="/home/pty_ssd/EgoEye/datasets")
+    pack_parser.add_argument('--store_root', type=str, default=DEFAULT_STORE_ROOT)
+    pack_parser.add_argument('--shard_size_mb', type=int, default=1024)
+
+    stats_parser = subparsers.add_parser('stats', help="Show the content of frame stores")
+    stats_parser.add_argument('--datasets', nargs='+', default=['ego4d', 'egoexo', 'egtea'])
+    stats_parser.add_argument('--store_root', type=str, default=DEFAULT_STORE_ROOT)
+    args = parser.parse_args()
+
+    for dataset in args.datasets:
+        store_dir = os.path.join(args.store_root, dataset)
+        if args.command == 'pack':
+            print(f"----Packing {dataset}----")
+            pack_frames(os.path.join(args.image_root, dataset), store_dir, args.shard_size_mb << 20)
+        else:
+            store = open_frame_store(store_dir)
+            print(store.summary() if store else f"No frame store in {store_dir}")
+
+
+if __name__ == "__main__":
+    main()
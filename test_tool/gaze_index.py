@@ -0,0 +1,82 @@
+import os
+import json
+from functools import lru_cache
+from tracing import traced
+
+
+def dataset_of(json_file):
+    """Dataset name of a narration JSON, e.g. narrations/egtea.json -> egtea."""
+    return os.path.splitext(os.path.basename(json_file))[0]
+
+
+def frame_number(image_file, dataset):
+    """Frame number encoded in a group_id image name."""
+    if dataset == 'egtea':
+        return int(image_file.split('.')[0].split('_')[1])  # egtea
+    return int(image_file.split('/')[-1].split('.')[0])  # ego4d, egoexo
+
+
+def group_frame_numbers(group, dataset):
+    """
+    Frame numbers of the image names of a group, or None if one of them does not encode a frame number.
+
+    QA rows with such a group are left out of evaluation (qa_dataset) and of
+    the rows a merged result must cover (result_writer.qa_row_keys).
+    """
+    try:
+        return [frame_number(image_file, dataset) for image_file in group]
+    except (ValueError, IndexError):
+        return None
+
+
+@lru_cache(maxsize=None)
+@traced("io.load_gaze_index")
+def load_gaze_index(json_file):
+    """
+    Parse a narration JSON once into {video_id: {timestamp_frame: gaze_info}}.
+
+    The first narration of a frame wins, as in the per-row lookups it replaces.
+    The result is cached per file for the lifetime of the process.
+    """
+    with open(json_file, 'r') as f:
+        data = json.load(f)
+    index = {}
+    for video_id, video_data in data.items():
+        frames = {}
+        for narration in video_data.get("narrations", []):
+            frames.setdefault(narration["timestamp_frame"], narration["gaze_info"])
+        index[video_id] = frames
+    return index
+
+
+def gaze_info_for_group(json_file, video_id, group_id):
+    """
+    Drop-in replacement for the get_gaze_info_from_json() helpers of the test scripts.
+
+    Returns:
+        List of gaze_info dictionaries for the frames of group_id that have one,
+        or None if the video is not in the JSON
+    """
+    frames = load_gaze_index(json_file).get(video_id)
+    if not frames:
+        return None
+    dataset = dataset_of(json_file)
+    gaze_info_list = []
+    for image_file in group_id:
+        gaze_info = frames.get(frame_number(image_file, dataset))
+        if gaze_info is not None:
+            gaze_info_list.append(gaze_info)
+    return gaze_info_list
+
+
+def gaze_info_per_frame(json_file, video_id, group_id):
+    """
+    Gaze of every frame of group_id, aligned with group_id.
+
+    Returns:
+        List with one gaze_info dictionary or None per frame (all None if the
+        video is not in the JSON)
+    """
+    frames = load_gaze_index(json_file).get(video_id) or {}
+    dataset = dataset_of(json_file)
+    return [frames.get(frame_number(image_file, dataset)) for image_file in group_id]
@@ -3,7 +3,9 @@ import matplotlib.pyplot as plt
 import numpy as np
 import base64
 from io import BytesIO
+from tracing import traced
 
+@traced("render.salience_map")
 def plot_gaze_trajectory(image_path, gaze_info_list, output_image_path="gaze_trajectory.png", sigma=20, radius=60, weight_factor=20, alpha=0.5):
 
 
@@ -0,0 +1,258 @@
+import gc
+import json
+import time
+from tracing import span
+from pixel_budget import message_max_pixels
+
+
+# Extra result columns written by the evaluation scripts for every row.
+USAGE_FIELDS = ['prompt_tokens', 'vision_tokens', 'generated_tokens', 'latency_s', 'cached', 'max_pixels']
+VISION_PAD_TOKENS = ('<|image_pad|>', '<|video_pad|>')
+
+
+def processor_params(processor, max_new_tokens):
+    """Settings of a local processor/decoder pair that change the model answer."""
+    image_processor = getattr(processor, 'image_processor', None)
+    return {
+        'max_new_tokens': max_new_tokens,
+        'min_pixels': getattr(image_processor, 'min_pixels', None),
+        'max_pixels': getattr(image_processor, 'max_pixels', None),
+    }
+
+
+def vision_token_count(processor, input_ids):
+    """Number of image and video placeholder tokens in a tokenized prompt."""
+    tokenizer = getattr(processor, 'tokenizer', processor)
+    pad_ids = [tokenizer.convert_tokens_to_ids(token) for token in VISION_PAD_TOKENS]
+    return int(sum((input_ids == pad_id).sum().item() for pad_id in pad_ids if pad_id is not None))
+
+
+def qwen_generate(model, processor, messages, max_new_tokens=128, return_usage=False, pruner=None):
+    """
+    Run one Qwen2.5-VL chat request with the local transformers model.
+
+    Args:
+        model: Loaded Qwen2_5_VLForConditionalGeneration
+        processor: Matching AutoProcessor
+        messages: Chat messages in qwen_vl_utils format
+        max_new_tokens: Generation length limit
+        return_usage: Also return the token usage of the request
+        pruner: token_pruning.GazeTokenPruner dropping video tokens far from the gaze before prefill
+
+    Returns:
+        Decoded model answer, or (answer, usage) with return_usage
+    """
+    import torch
+
+    start = time.perf_counter()
+    from qwen_vl_utils import process_vision_info
+
+    with span("vision.chat_template"):
+        text = processor.apply_chat_template(
+            messages, tokenize=False, add_generation_prompt=True, add_vision_id=True
+        )
+    with span("vision.process_vision_info"):
+        image_inputs, video_inputs = process_vision_info(messages)
+    with span("vision.processor"):
+        inputs = processor(
+            text=[text],
+            images=image_inputs,
+            videos=video_inputs,
+            padding=True,
+            return_tensors="pt",
+        )
+        inputs = inputs.to("cuda")
+
+    keep = None
+    with torch.no_grad():
+        with span("model.generate"):
+            if pruner is None:
+                generated_ids = model.generate(**inputs, max_new_tokens=max_new_tokens)
+                generated_ids_trimmed = [
+                    out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
+                ]
+            else:
+                generated, keep = pruner.generate(model, inputs, messages, max_new_tokens)
+                generated_ids_trimmed = [generated]
+        with span("model.decode"):
+            output_text = processor.batch_decode(
+                generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
+            )
+            answer = output_text[0].strip()
+
+    # With pruning, token counts are those of the prompt the language model actually saw.
+    prompt_ids = inputs.input_ids if keep is None else inputs.input_ids[:, keep]
+    usage = {
+        'prompt_tokens': int(prompt_ids.shape[1]),
+        'vision_tokens': vision_token_count(processor, prompt_ids),
+        'generated_tokens': int(len(generated_ids_trimmed[0])),
+        'latency_s': time.perf_counter() - start,
+        'cached': False,
+        # Per-row budget of pixel_budget.apply_pixel_budget(), else the processor's fixed one.
+        'max_pixels': message_max_pixels(messages, processor_params(processor, max_new_tokens)['max_pixels']),
+    }
+    with span("model.cleanup"):
+        del inputs, prompt_ids, image_inputs, video_inputs
+        torch.cuda.empty_cache()
+        gc.collect()
+    if return_usage:
+        return answer, usage
+    return answer
+
+
+def local_answer(model, processor, messages, model_name, cache=None, max_new_tokens=128, with_usage=False,
+                 pruner=None):
+    """
+    qwen_generate() behind the optional response cache.
+
+    Args:
+        model_name: Checkpoint name used as the cache model identifier
+        cache: ResponseCache instance, or None to always run the model
+        with_usage: Return (answer, usage) instead of the answer
+        pruner: token_pruning.GazeTokenPruner, or None for unpruned generation
+    """
+    def compute():
+        return qwen_generate(model, processor, messages, max_new_tokens, return_usage=with_usage, pruner=pruner)
+
+    if cache is None:
+        return compute()
+    params = processor_params(processor, max_new_tokens)
+    if pruner is not None:
+        params.update(pruner.params())
+    return cache.get_or_compute(model_name, messages, params, compute, with_usage=with_usage)
+
+
+def api_usage(completion, latency_s):
+    """
+    Usage dictionary of an OpenAI-compatible completion.
+
+    Vision tokens are only known when the endpoint reports them in
+    prompt_tokens_details (image_tokens / video_tokens); otherwise they are None.
+    """
+    usage = getattr(completion, 'usage', None)
+    details = getattr(usage, 'prompt_tokens_details', None)
+    vision_tokens = None
+    if details is not None:
+        counts = [getattr(details, name, None) for name in ('image_tokens', 'video_tokens')]
+        counts = [count for count in counts if count is not None]
+        vision_tokens = sum(counts) if counts else None
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+        'vision_tokens': vision_tokens,
+        'generated_tokens': getattr(usage, 'completion_tokens', None),
+        'latency_s': latency_s,
+        'cached': False,
+        'max_pixels': None,
+    }
+
+
+def api_answer(client, model, content, cache=None, with_usage=False):
+    """
+    Send one user turn to an OpenAI-compatible endpoint, optionally through the response cache.
+
+    Args:
+        client: openai.OpenAI client
+        model: API model name, e.g. "qwen-vl-max-latest"
+        content: Content list of the user message
+        cache: ResponseCache instance, or None to always call the API
+        with_usage: Return (answer, usage) from completion.usage instead of the answer
+
+    Returns:
+        Message content of the first choice, "" if it has no text content
+    """
+    messages = [{"role": "user", "content": content}]
+
+    def call():
+        start = time.perf_counter()
+        with span("api.request", model=model):
+            completion = client.chat.completions.create(model=model, messages=messages)
+        answer = completion.choices[0].message.content
+        if with_usage:
+            return answer, api_usage(completion, time.perf_counter() - start)
+        return answer
+
+    if cache is None:
+        if with_usage:
+            answer, usage = call()
+            return answer or "", usage
+        return call() or ""
+    model_id = f"{model}@{getattr(client, 'base_url', '')}"
+    return cache.get_or_compute(model_id, messages, {}, call, with_usage=with_usage)
+
+
+def usage_columns(usage):
+    """USAGE_FIELDS of one usage dictionary, for the result CSV row."""
+    usage = usage or {}
+    return {field: usage.get(field) for field in USAGE_FIELDS}
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+class UsageMeter:
+    """
+    Token and latency totals of one evaluation run.
+
+    Cached rows count towards the token totals (they are what the prompt
+    costs) but not towards latency and throughput, which only reflect
+    requests actually sent to the model.
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self.rows = []
+
+    def add(self, usage):
+        if usage is not None:
+            self.rows.append(usage)
+
+    def report(self):
+        def total(field):
+            values = [row.get(field) for row in self.rows if row.get(field) is not None]
+            return sum(values) if values else None
+
+        computed = [row for row in self.rows if not row.get('cached')]
+        latencies = [row['latency_s'] for row in computed if row.get('latency_s') is not None]
+        generated = sum(row.get('generated_tokens') or 0 for row in computed)
+        report = {
+            'name': self.name,
+            'rows': len(self.rows),
+            'cached_rows': len(self.rows) - len(computed),
+            'prompt_tokens': total('prompt_tokens'),
+            'vision_tokens': total('vision_tokens'),
+            'generated_tokens': total('generated_tokens'),
+            'latency_total_s': sum(latencies),
+            'latency_p50_s': _percentile(latencies, 50),
+            'latency_p95_s': _percentile(latencies, 95),
+            'generated_tokens_per_s': generated / sum(latencies) if latencies and sum(latencies) > 0 else None,
+        }
+        rows = len(self.rows)
+        for field in ('prompt_tokens', 'vision_tokens', 'generated_tokens'):
+            report[f'{field}_per_row'] = report[field] / rows if rows and report[field] is not None else None
+        text = [row['prompt_tokens'] - row['vision_tokens'] for row in self.rows
+                if row.get('prompt_tokens') is not None and row.get('vision_tokens') is not None]
+        report['text_tokens'] = sum(text) if text else None
+        return report
+
+    def summary(self):
+        r = self.report()
+        if not r['rows']:
+            return f"Usage {self.name}: no rows"
+
+        def fmt(value, spec=".0f"):
+            return "n/a" if value is None else format(value, spec)
+
+        return (f"Usage {self.name}: {r['rows']} rows ({r['cached_rows']} cached), "
+                f"prompt {fmt(r['prompt_tokens_per_row'], '.1f')} tok/row "
+                f"(vision {fmt(r['vision_tokens_per_row'], '.1f')}), "
+                f"generated {fmt(r['generated_tokens_per_row'], '.1f')} tok/row, "
+                f"latency p50 {fmt(r['latency_p50_s'], '.2f')}s p95 {fmt(r['latency_p95_s'], '.2f')}s, "
+                f"{fmt(r['generated_tokens_per_s'], '.1f')} generated tok/s")
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
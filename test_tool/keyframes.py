@@ -0,0 +1,202 @@
+import math
+import argparse
+from gaze_index import load_gaze_index
+
+
+# Normalized gaze distances: samples within FIXATION_RADIUS of the running
+# centroid belong to the same fixation, a jump of SHIFT_THRESHOLD or more
+# between consecutive samples counts as a large shift.
+FIXATION_RADIUS = 0.05
+SHIFT_THRESHOLD = 0.15
+
+
+def uniform_subset(items, count):
+    """count items spread uniformly over items, in order (all of them if there are fewer)."""
+    if len(items) <= count:
+        return list(items)
+    return [items[int(i * len(items) / count)] for i in range(count)]
+
+
+def gaze_track(json_file, video_id, start_frame=None, end_frame=None):
+    """
+    Gaze samples of a video from its narration JSON.
+
+    Returns:
+        Sorted list of (frame, gaze_x, gaze_y), restricted to [start_frame, end_frame] when given
+    """
+    frames = load_gaze_index(json_file).get(video_id) or {}
+    track = []
+    for frame, gaze_info in sorted(frames.items()):
+        if start_frame is not None and frame < start_frame:
+            continue
+        if end_frame is not None and frame > end_frame:
+            continue
+        if gaze_info is None or gaze_info.get('gaze_x') is None or gaze_info.get('gaze_y') is None:
+            continue
+        track.append((frame, float(gaze_info['gaze_x']), float(gaze_info['gaze_y'])))
+    return track
+
+
+def fixation_starts(track, radius=FIXATION_RADIUS):
+    """Positions in track where a new fixation begins (the first sample always does)."""
+    starts = []
+    cx = cy = None
+    count = 0
+    for i, (_, x, y) in enumerate(track):
+        if count and math.hypot(x - cx, y - cy) <= radius:
+            count += 1
+            cx += (x - cx) / count
+            cy += (y - cy) / count
+        else:
+            starts.append(i)
+            cx, cy, count = x, y, 1
+    return starts
+
+
+def keyframe_scores(track, narration_frames=(), radius=FIXATION_RADIUS, shift_threshold=SHIFT_THRESHOLD):
+    """
+    Informativeness score of every sample of a gaze track.
+
+    A fixation boundary scores 1. A large shift adds its size in units of
+    shift_threshold. The sample nearest to each narration timestamp adds 2,
+    which ranks it above any boundary that is not also a large shift.
+
+    Returns:
+        List of scores aligned with track
+    """
+    scores = [0.0] * len(track)
+    for i in fixation_starts(track, radius):
+        scores[i] += 1.0
+    for i in range(1, len(track)):
+        shift = math.hypot(track[i][1] - track[i - 1][1], track[i][2] - track[i - 1][2])
+        if shift >= shift_threshold:
+            scores[i] += shift / shift_threshold
+    if track:
+        for frame in narration_frames:
+            nearest = min(range(len(track)), key=lambda i: abs(track[i][0] - frame))
+            scores[nearest] += 2.0
+    return scores
+
+
+def select_keyframes(track, max_frames, narration_frames=(), min_frames=1, min_gap=0,
+                     radius=FIXATION_RADIUS, shift_threshold=SHIFT_THRESHOLD):
+    """
+    Frames of a gaze track to show the model, best first up to max_frames.
+
+    Samples are taken in decreasing score order, skipping those closer than
+    min_gap frames to one already taken. If fewer than min_frames samples
+    score at all, the rest is filled with samples spread uniformly over the track.
+
+    Returns:
+        Sorted frame numbers
+    """
+    if not track:
+        return []
+    scores = keyframe_scores(track, narration_frames, radius, shift_threshold)
+    order = sorted((i for i in range(len(track)) if scores[i] > 0), key=lambda i: (-scores[i], track[i][0]))
+    chosen = []
+    for i in order:
+        if len(chosen) >= max_frames:
+            break
+        if all(abs(track[i][0] - track[j][0]) >= min_gap for j in chosen):
+            chosen.append(i)
+    if len(chosen) < min_frames:
+        for i in uniform_subset([i for i in range(len(track)) if i not in chosen], min_frames - len(chosen)):
+            chosen.append(i)
+    return sorted(track[i][0] for i in chosen)
+
+
+class KeyframeSelector:
+    """
+    Gaze-aware replacement for uniform frame sampling.
+
+    Frames are ranked by keyframe_scores(): fixation boundaries, large gaze
+    shifts and the frames nearest the narration timestamps of the question.
+    Without gaze the selector falls back to uniform sampling, so it can be
+    swapped in wherever uniform_frame_indices() or a fixed frame group is used.
+    qwen_vl_utils pads videos to an even number of frames, so even max_frames
+    waste no tokens.
+
+    Example:
+        keyframes = KeyframeSelector(max_frames=4)
+        image_paths = keyframes.select_group(image_paths, gaze_info_per_frame(narration_json, video_id, image_paths))
+    """
+
+    def __init__(self, max_frames=4, min_frames=2, min_gap=0, radius=FIXATION_RADIUS, shift_threshold=SHIFT_THRESHOLD):
+        self.max_frames = max_frames
+        self.min_frames = min(min_frames, max_frames)
+        self.min_gap = min_gap
+        self.radius = radius
+        self.shift_threshold = shift_threshold
+        self.rows = 0
+        self.frames_out = 0
+
+    def tag(self):
+        """Short name of the selection settings, used in output file names."""
+        return f"key{self.max_frames}"
+
+    def _select(self, track, narration_frames=()):
+        return select_keyframes(track, self.max_frames, narration_frames, self.min_frames, self.min_gap,
+                                self.radius, self.shift_threshold)
+
+    def select_group(self, image_paths, gaze_info_list):
+        """
+        Subset of a QA frame group, in the original order.
+
+        Args:
+            image_paths: Frame names of the group (group_id lines)
+            gaze_info_list: One gaze_info dictionary or None per frame (gaze_index.gaze_info_per_frame)
+        """
+        track = [(i, float(g['gaze_x']), float(g['gaze_y'])) for i, g in enumerate(gaze_info_list)
+                 if g is not None and g.get('gaze_x') is not None and g.get('gaze_y') is not None]
+        positions = self._select(track) if track else uniform_subset(range(len(image_paths)), self.max_frames)
+        self.rows += 1
+        self.frames_out += len(positions)
+        return [image_paths[i] for i in positions]
+
+    def frame_indices(self, json_file, video_id, start_frame, end_frame, narration_frames=()):
+        """
+        Frame numbers to sample from [start_frame, end_frame) of a video.
+
+        Candidates are the gaze samples of the narration JSON inside the range;
+        without any, max_frames frames are spread uniformly as FrameSampler does.
+        """
+        track = gaze_track(json_file, video_id, start_frame, end_frame)
+        indices = self._select(track, narration_frames)
+        if not indices:
+            indices = uniform_subset(list(range(start_frame, end_frame)), self.max_frames)
+        self.rows += 1
+        self.frames_out += len(indices)
+        return indices
+
+    def summary(self):
+        per_row = self.frames_out / self.rows if self.rows else 0.0
+        return f"Keyframes ({self.tag()}): {self.frames_out} frames for {self.rows} rows ({per_row:.1f} per row)"
+
+
+def main():
+    import csv
+    from gaze_index import gaze_info_per_frame
+
+    parser = argparse.ArgumentParser(description="Show the gaze-aware keyframes chosen for the QA groups of a dataset")
+    parser.add_argument('--dataset', type=str, default='egtea')
+    parser.add_argument('--category', type=str, default='spatial')
+    parser.add_argument('--max_frames', type=int, default=4)
+    parser.add_argument('--min_frames', type=int, default=2)
+    parser.add_argument('--rows', type=int, default=10, help="Number of QA rows to print")
+    args = parser.parse_args()
+
+    qa_csv = f"/home/pty_ssd/EgoEye/qa_pairs/{args.category}_{args.dataset}.csv"
+    narration_json = f"/home/pty_ssd/EgoEye/narrations/{args.dataset}.json"
+    keyframes = KeyframeSelector(args.max_frames, args.min_frames)
+    with open(qa_csv, 'r') as f:
+        for index, row in enumerate(csv.DictReader(f)):
+            image_paths = row['group_id'].split("\n")
+            selected = keyframes.select_group(image_paths, gaze_info_per_frame(narration_json, row['video_id'], image_paths))
+            if index < args.rows:
+                print(f"{row['video_id']}: {' '.join(selected)}")
+    print(keyframes.summary())
+
+
+if __name__ == "__main__":
+    main()
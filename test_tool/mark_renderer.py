@@ -0,0 +1,122 @@
+import io
+import base64
+from collections import OrderedDict
+import cv2
+from PIL import Image
+from tracing import span
+
+
+# Gaze samples below this confidence are not marked, as in generate_tool/spatial.py.
+MIN_GAZE_CONFIDENCE = 1.0
+
+
+def gaze_mark_position(gaze_info):
+    """
+    Normalized (gaze_x, gaze_y) to mark for a narration gaze_info, or None.
+
+    Like generate_tool/spatial.py, gaze with a confidence below
+    MIN_GAZE_CONFIDENCE or a negative coordinate is not marked. gaze_info
+    without a confidence field is marked.
+    """
+    if not gaze_info or 'gaze_x' not in gaze_info or 'gaze_y' not in gaze_info:
+        return None
+    gaze_x, gaze_y = float(gaze_info['gaze_x']), float(gaze_info['gaze_y'])
+    if gaze_x < 0 or gaze_y < 0 or float(gaze_info.get('confidence', MIN_GAZE_CONFIDENCE)) < MIN_GAZE_CONFIDENCE:
+        return None
+    return gaze_x, gaze_y
+
+
+def draw_gaze_mark(image, gaze_x, gaze_y, radius=20, color=(0, 0, 255), thickness=2):
+    """
+    Draw a gaze circle on a BGR frame in place.
+
+    Args:
+        image: BGR uint8 array as returned by cv2.imread
+        gaze_x: Normalized gaze x in [0, 1], left to right
+        gaze_y: Normalized gaze y in [0, 1], top to bottom
+        radius: Radius of the gaze circle in pixels
+        color: BGR color of the circle (default: red)
+        thickness: Line thickness, -1 fills the circle
+
+    Returns:
+        The same image, for chaining; negative coordinates (no gaze) draw nothing
+    """
+    if gaze_x < 0 or gaze_y < 0:
+        return image
+    height, width = image.shape[:2]
+    center = (int(round(gaze_x * width)), int(round(gaze_y * height)))
+    cv2.circle(image, center, radius, color, thickness)
+    return image
+
+
+class MarkRenderer:
+    """
+    In-memory visual-mark renderer for the mark prompting strategy.
+
+    Frames are read from the original dataset tree and the gaze circle is drawn
+    at evaluation time, so every marker style can be evaluated without a
+    pre-rendered copy of the dataset. Rendered frames are kept in an LRU cache
+    keyed by (frame, gaze, style); frames shared by several QA rows are drawn once.
+    """
+
+    def __init__(self, radius=20, color=(0, 0, 255), thickness=2, cache_size=1024):
+        self.radius = radius
+        self.color = tuple(color)
+        self.thickness = thickness
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def style(self):
+        return (self.radius, self.color, self.thickness)
+
+    def tag(self):
+        """Short style identifier for output file names, e.g. r20_t2_0-0-255."""
+        return f"r{self.radius}_t{self.thickness}_{'-'.join(str(c) for c in self.color)}"
+
+    def render(self, image_path, gaze_info):
+        """
+        Frame with its gaze mark as an RGB PIL image.
+
+        Frames without gaze information, or whose gaze gaze_mark_position()
+        rejects, are returned unmarked.
+        """
+        gaze = gaze_mark_position(gaze_info)
+        key = (image_path, gaze, self.style)
+        image = self.cache.get(key)
+        if image is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        with span("render.gaze_mark"):
+            frame = cv2.imread(image_path)
+            if frame is None:
+                raise FileNotFoundError(f"Failed to load image {image_path}")
+            if gaze is not None:
+                draw_gaze_mark(frame, gaze[0], gaze[1], self.radius, self.color, self.thickness)
+            image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+        self.cache[key] = image
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return image
+
+    def render_group(self, image_files, gaze_info_list):
+        """Marked frames of one QA group, in order."""
+        return [self.render(image_path, gaze_info) for image_path, gaze_info in zip(image_files, gaze_info_list)]
+
+    def render_group_data_urls(self, image_files, gaze_info_list):
+        """Marked frames of one QA group as JPEG data URLs for the API path."""
+        data_urls = []
+        for image in self.render_group(image_files, gaze_info_list):
+            buffered = io.BytesIO()
+            image.save(buffered, format="JPEG")
+            data_urls.append(f"data:image/jpeg;base64,{base64.b64encode(buffered.getvalue()).decode('utf-8')}")
+        return data_urls
+
+    def summary(self):
+        return f"Mark renderer: {self.misses} frames drawn, {self.hits} served from cache"
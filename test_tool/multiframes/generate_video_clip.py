@@ -1,102 +1,223 @@
 import os
-import pandas as pd
+import time
 import json
-import subprocess
 import glob
+import argparse
+import subprocess
+import pandas as pd
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
-csv_path = '/home/pty_ssd/EgoEye/qa_pairs/temporal_egtea.csv'
-long_video_dir = '/home/pty_ssd/EGTEA'  
-clip_dir = 'clips_egtea'        
-output_json = 'temporal_egtea.json'
-
-
-os.makedirs(clip_dir, exist_ok=True)
-
+KEYSTEP_JSON = '/home/pty_ssd/ego4d_exo_gaze/ego4d_exo_gaze_annotations/annotations/keystep_train.json'
+TAKES_ROOT = '/home/pty_ssd/ego4d_exo_gaze/takes'
+FPS = 30
 
-df = pd.read_csv(csv_path)
 
+def load_take_names(keystep_json):
+    """Map Ego-Exo4D take_uid to take_name from the keystep annotations."""
+    if not keystep_json or not os.path.exists(keystep_json):
+        return {}
+    with open(keystep_json, 'r') as f:
+        keystep_data = json.load(f)
+    return {ann['take_uid']: ann['take_name'] for ann in keystep_data['annotations'].values()}
 
-with open('/home/pty_ssd/ego4d_exo_gaze/ego4d_exo_gaze_annotations/annotations/keystep_train.json', 'r') as f:
-    keystep_data = json.load(f)
-videoid2takename = {ann['take_uid']: ann['take_name'] for ann in keystep_data['annotations'].values()}
 
-def find_egoexo_video(take_name):
-    search_dir = f'/home/pty_ssd/ego4d_exo_gaze/takes/{take_name}/frame_aligned_videos/'
+@lru_cache(maxsize=None)
+def find_egoexo_video(take_name, takes_root=TAKES_ROOT):
+    search_dir = os.path.join(takes_root, take_name, 'frame_aligned_videos')
     files = glob.glob(os.path.join(search_dir, '*214-1.mp4'))
     if files:
         return files[0]
     else:
         return None
 
-qa_dict = {}
 
-for idx, row in df.iterrows():
-    video_id = row['video_id']
-    group_id = row['group_id']
-    question = row['Question']
-    answer_options = row['Answer Options'].split('\n')
-    correct_answer = row['Correct Answer']
+def resolve_long_video(video_id, videoid2takename, long_video_dir, takes_root=TAKES_ROOT):
+    """Source video of a QA item: the Aria take video for Ego-Exo4D, <video_id>.mp4 otherwise."""
+    if video_id in videoid2takename:
+        return find_egoexo_video(videoid2takename[video_id], takes_root)
+    return os.path.join(long_video_dir, f'{video_id}.mp4')
 
 
-    frame_indices = [int(f.replace('.jpg', '')) for f in group_id.strip().split('\n')]
+def parse_frame_indices(group_id):
+    # "<frame>.jpg" (ego4d, egoexo) or "<video_id>_<frame>.jpg" (egtea)
+    frame_indices = [int(os.path.splitext(f)[0].split('_')[-1]) for f in group_id.strip().split('\n')]
     frame_indices.sort()
-    start_frame = frame_indices[0]
-    end_frame = frame_indices[-1]
-
-
-    fps = 30
-    start_time = start_frame / fps
-    end_time = end_frame / fps
-    duration = end_time - start_time
-
-
-    is_egoexo = video_id in videoid2takename
-    if is_egoexo:
-        take_name = videoid2takename[video_id]
-        long_video_path = find_egoexo_video(take_name)
+    return frame_indices
+
+
+def plan_clips(df, videoid2takename, long_video_dir, clip_dir, takes_root=TAKES_ROOT):
+    """
+    Turn QA rows into unique clip requests and the QA JSON consumed by the multiframe tests.
+
+    Args:
+        df: QA pairs DataFrame (video_id, group_id, Question, Answer Options, Correct Answer)
+        videoid2takename: Ego-Exo4D take_uid -> take_name
+        long_video_dir: Directory with <video_id>.mp4 for non Ego-Exo4D videos
+        clip_dir: Output directory, clips go to <clip_dir>/<video_id>/<start>_<end>.mp4
+
+    Returns:
+        clips: Dictionary mapping (long_video_path, start_frame, end_frame) to clip path
+        qa_dict: Dictionary mapping video_id to its list of QA items
+    """
+    clips = {}
+    qa_dict = {}
+    for _, row in df.iterrows():
+        video_id = row['video_id']
+        frame_indices = parse_frame_indices(row['group_id'])
+        start_frame = frame_indices[0]
+        end_frame = frame_indices[-1]
+
+        long_video_path = resolve_long_video(video_id, videoid2takename, long_video_dir, takes_root)
         if long_video_path is None:
             continue
-    else:
-        long_video_path = os.path.join(long_video_dir, f'{video_id}.mp4')
-
-    clip_name = f'{start_frame}_{end_frame}.mp4'
-    video_clip_dir = os.path.join(clip_dir, video_id)
-    os.makedirs(video_clip_dir, exist_ok=True)  
-    clip_path = os.path.join(video_clip_dir, clip_name)
-
-
-    if not os.path.exists(clip_path):
-        cmd = [
-            'ffmpeg',
-            '-ss', str(start_time),
-            '-i', long_video_path,
-            '-t', str(duration),
-            '-c', 'copy',
-            '-y',  
-            clip_path
-        ]
-        print(' '.join(cmd))
-        subprocess.run(cmd, check=True)
-
-
-    frame_paths = [
-        os.path.join(f"{idx}.jpg") for idx in frame_indices
-    ]
-
- 
-    qa_item = {
-        "clip_name": clip_name,
-        "clip_path": os.path.basename(clip_path),
-        "frames": frame_paths,
-        "question": question,
-        "answer_options": answer_options,
-        "correct_answer": correct_answer
-    }
-
-    if video_id not in qa_dict:
-        qa_dict[video_id] = []
-    qa_dict[video_id].append(qa_item)
-
-with open(output_json, 'w', encoding='utf-8') as f:
-    json.dump(qa_dict, f, ensure_ascii=False, indent=2)
+
+        clip_name = f'{start_frame}_{end_frame}.mp4'
+        clip_path = os.path.join(clip_dir, video_id, clip_name)
+        clips[(long_video_path, start_frame, end_frame)] = clip_path
+
+        qa_item = {
+            "clip_name": clip_name,
+            "clip_path": os.path.basename(clip_path),
+            "source_video": long_video_path,
+            "start_frame": start_frame,
+            "end_frame": end_frame,
+            "frames": [f"{idx}.jpg" for idx in frame_indices],
+            "question": row['Question'],
+            "answer_options": row['Answer Options'].split('\n'),
+            "correct_answer": row['Correct Answer']
+        }
+        qa_dict.setdefault(video_id, []).append(qa_item)
+    return clips, qa_dict
+
+
+def group_clips(clips, max_outputs=8):
+    """
+    Bundle pending clips of the same long video into ffmpeg jobs.
+
+    Clips whose file already exists are dropped, which makes reruns idempotent.
+
+    Returns:
+        List of (long_video_path, [(start_frame, end_frame, clip_path), ...])
+    """
+    by_video = {}
+    for (video_path, start_frame, end_frame), clip_path in clips.items():
+        if os.path.exists(clip_path):
+            continue
+        by_video.setdefault(video_path, []).append((start_frame, end_frame, clip_path))
+
+    groups = []
+    for video_path, video_clips in by_video.items():
+        video_clips.sort()
+        for i in range(0, len(video_clips), max_outputs):
+            groups.append((video_path, video_clips[i:i + max_outputs]))
+    return groups
+
+
+def ffmpeg_command(video_path, video_clips, fps=FPS):
+    """
+    One ffmpeg invocation that cuts several clips from the same source video.
+
+    Every clip is a separate seeked input of the same file (same keyframe-snapped
+    stream copy as a single-clip call), so the file is probed once and stays in
+    the page cache while its clips are written.
+    """
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y']
+    for start_frame, end_frame, _ in video_clips:
+        start_time = start_frame / fps
+        duration = (end_frame - start_frame) / fps
+        cmd += ['-ss', str(start_time), '-t', str(duration), '-i', video_path]
+    for i, (_, _, clip_path) in enumerate(video_clips):
+        cmd += ['-map', f'{i}:v:0', '-map', f'{i}:a?', '-c', 'copy', '-f', 'mp4', f'{clip_path}.part']
+    return cmd
+
+
+def cut_group(video_path, video_clips, fps=FPS):
+    """
+    Run ffmpeg for one group and move finished clips into place.
+
+    ffmpeg can exit 0 without writing an output (e.g. a clip that starts past
+    the end of the video), so every output is checked before it is moved.
+
+    Returns:
+        List of the clip paths that were not written
+    """
+    for _, _, clip_path in video_clips:
+        os.makedirs(os.path.dirname(clip_path), exist_ok=True)
+    subprocess.run(ffmpeg_command(video_path, video_clips, fps), check=True)
+    missing = []
+    for _, _, clip_path in video_clips:
+        part_path = f'{clip_path}.part'
+        if os.path.exists(part_path) and os.path.getsize(part_path) > 0:
+            os.replace(part_path, clip_path)
+        else:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            missing.append(clip_path)
+    return missing
+
+
+def cut_clips(clips, workers=4, max_outputs=8, fps=FPS):
+    """
+    Cut all missing clips with a bounded pool of ffmpeg processes.
+
+    Returns:
+        (number of clips written, number of failed clips)
+    """
+    groups = group_clips(clips, max_outputs)
+    pending = sum(len(video_clips) for _, video_clips in groups)
+    print(f"{len(clips)} unique clips, {len(clips) - pending} already cut, {pending} to cut in {len(groups)} ffmpeg jobs")
+
+    written = 0
+    failed = 0
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(cut_group, video_path, video_clips, fps): (video_path, video_clips)
+                   for video_path, video_clips in groups}
+        for future in as_completed(futures):
+            video_path, video_clips = futures[future]
+            try:
+                missing = future.result()
+            except subprocess.CalledProcessError as e:
+                failed += len(video_clips)
+                print(f"ffmpeg failed for {video_path}: {e}")
+                for _, _, clip_path in video_clips:
+                    if os.path.exists(f'{clip_path}.part'):
+                        os.remove(f'{clip_path}.part')
+                continue
+            written += len(video_clips) - len(missing)
+            failed += len(missing)
+            for clip_path in missing:
+                print(f"ffmpeg wrote no output for {clip_path} from {video_path}")
+    elapsed = time.time() - start
+    rate = written / elapsed if elapsed > 0 else 0.0
+    print(f"Cut {written} clips in {elapsed:.1f}s ({rate:.2f} clips/s), {failed} failed")
+    return written, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cut QA clips from long egocentric videos")
+    parser.add_argument('--csv_path', type=str, default='/home/pty_ssd/EgoEye/qa_pairs/temporal_egtea.csv')
+    parser.add_argument('--long_video_dir', type=str, default='/home/pty_ssd/EGTEA')
+    parser.add_argument('--clip_dir', type=str, default='clips_egtea')
+    parser.add_argument('--output_json', type=str, default='temporal_egtea.json')
+    parser.add_argument('--keystep_json', type=str, default=KEYSTEP_JSON)
+    parser.add_argument('--takes_root', type=str, default=TAKES_ROOT)
+    parser.add_argument('--workers', type=int, default=4, help="Number of concurrent ffmpeg processes")
+    parser.add_argument('--max_outputs', type=int, default=8, help="Maximum clips cut by one ffmpeg process")
+    args = parser.parse_args()
+
+    os.makedirs(args.clip_dir, exist_ok=True)
+    df = pd.read_csv(args.csv_path)
+    videoid2takename = load_take_names(args.keystep_json)
+
+    clips, qa_dict = plan_clips(df, videoid2takename, args.long_video_dir, args.clip_dir, args.takes_root)
+    cut_clips(clips, workers=args.workers, max_outputs=args.max_outputs)
+
+    with open(args.output_json, 'w', encoding='utf-8') as f:
+        json.dump(qa_dict, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
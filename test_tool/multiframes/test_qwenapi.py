@@ -1,44 +1,44 @@
 import os
 import json
-import base64
-import cv2
-from PIL import Image
-import io
 from openai import OpenAI
-import pandas as pd
 import time
-
-def extract_frames_from_video(video_path, num_frames):
-
-    cap = cv2.VideoCapture(video_path)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    if total_frames < num_frames:
-        frame_indices = list(range(total_frames))
-    else:
-        frame_indices = [int(i * total_frames / num_frames) for i in range(num_frames)]
-    images = []
-    for idx in frame_indices:
-        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
-        ret, frame = cap.read()
-        if ret:
-    
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
-            images.append(img)
-    cap.release()
-    return images
-
-def encode_images_to_base64(images):
-
-    image_data_list = []
-    for img in images:
-        buffered = io.BytesIO()
-        img.save(buffered, format="JPEG")
-        base64_image = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        image_data_list.append(f"data:image/jpeg;base64,{base64_image}")
-    return image_data_list
-
-def main():
+import argparse
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from inference import api_answer, USAGE_FIELDS, UsageMeter, usage_columns
+from response_cache import ResponseCache
+from result_writer import ResultWriter, row_key, parse_shard
+from video_frames import FrameSampler, jpegs_to_data_urls
+from virtual_clips import is_virtual, sample_virtual_clip
+from keyframes import KeyframeSelector
+
+
+def sample_keyframes(sampler, keyframes, qa, narration_json, video_id, video_path=None):
+    """
+    Data URLs of the gaze keyframes of a QA clip.
+
+    Frames are read from the long source video, or from the cut clip at
+    video_path, whose frame 0 is start_frame of the source.
+    """
+    narration_frames = [int(os.path.splitext(frame)[0]) for frame in qa.get("frames", [])]
+    indices = keyframes.frame_indices(narration_json, video_id, qa["start_frame"], qa["end_frame"], narration_frames)
+    if video_path is None:
+        if not os.path.exists(qa["source_video"]):
+            return []
+        return jpegs_to_data_urls(sampler.sample_frames(qa["source_video"], indices))
+    return jpegs_to_data_urls(sampler.sample_frames(video_path, [index - qa["start_frame"] for index in indices]))
+
+
+def main(resume=True, use_virtual_clips=True, keyframes=None, shard=None):
+    """
+    Args:
+        keyframes: KeyframeSelector choosing the frames of each clip from the gaze
+            stream instead of sampling num_frames uniformly
+        shard: (i, N) from --shard; only the rows of shard i of N are evaluated
+    """
+    cache = ResponseCache()
+    sampler = FrameSampler()
+    num_frames = 9
     datasets = ['ego4d','egoexo','egtea']
     categories = ['spatial','temporal','causal']
     for dataset in datasets:
@@ -49,6 +49,10 @@ def main():
             json_path = f"/home/pty_ssd/EgoEye/qa_pairs/{category}_{dataset}.json"
             file_name = os.path.basename(json_path)
             new_file = os.path.splitext(file_name)[0]
+            output_csv = f"results/multiframes/frame{num_frames}/{new_file}.csv"
+            if keyframes is not None:
+                output_csv = f"results/multiframes/{keyframes.tag()}/{new_file}.csv"
+            narration_json = f"/home/pty_ssd/EgoEye/narrations/{dataset}.json"
             base_folder = f"/home/pty_ssd/EgoEye/datasets/clips_video/{dataset}"
             api_key = ""  
             base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1" 
@@ -57,20 +61,34 @@ def main():
                 qa_data = json.load(f)
             client = OpenAI(api_key=api_key, base_url=base_url)
             
-            results = []
+            result_writer = ResultWriter(output_csv, ["video_id", "clip_name", "question", "answer_options", "model_answer", "reference_answer"] + USAGE_FIELDS, resume=resume, shard=shard)
+            usage_meter = UsageMeter(os.path.basename(output_csv))
 
+            index = 0
             for video_id, qa_list in qa_data.items():
                 for qa in qa_list:
+                    index += 1
                     clip_name = qa["clip_name"]
-                    video_path = os.path.join(base_folder, video_id, clip_name)
-                    if not os.path.exists(video_path):                     
+                    key = row_key(video_id, clip_name, qa["question"])
+                    if result_writer.is_done(key):
                         continue
-
-                   
-                    images = extract_frames_from_video(video_path, num_frames=9)
-                    if not images:
+                    if use_virtual_clips and is_virtual(qa):
+                        if keyframes is not None:
+                            image_data_list = sample_keyframes(sampler, keyframes, qa, narration_json, video_id)
+                        else:
+                            image_data_list = sample_virtual_clip(sampler, qa, num_frames)
+                    else:
+                        video_path = os.path.join(base_folder, video_id, clip_name)
+                        if not os.path.exists(video_path):
+                            result_writer.skip_row(key, index, "no clip", retry=True)
+                            continue
+                        if keyframes is not None and "start_frame" in qa:
+                            image_data_list = sample_keyframes(sampler, keyframes, qa, narration_json, video_id, video_path)
+                        else:
+                            image_data_list = sampler.sample_data_urls(video_path, num_frames)
+                    if not image_data_list:
+                        result_writer.skip_row(key, index, "no frames", retry=True)
                         continue
-                    image_data_list = encode_images_to_base64(images)
 
                     question = qa["question"]
                     answer_options = "\n".join(qa["answer_options"])
@@ -81,43 +99,49 @@ def main():
                                     "Choose the most appropriate option. Only return the letter of the correct option.")
                     
                     try:
-                        completion = client.chat.completions.create(
-                            model="qwen-vl-max-latest",
-                            messages=[
-                                {
-                                    "role": "user",
-                                    "content": [
-                                        {"type": "video", "video": image_data_list},
-                                        {"type": "text", "text": input_question}
-                                    ]
-                                }
-                            ]
-                        )
-                        model_answer = completion.choices[0].message.content
+                        model_answer, usage = api_answer(client, "qwen-vl-max-latest", [
+                            {"type": "video", "video": image_data_list},
+                            {"type": "text", "text": input_question}
+                        ], cache, with_usage=True)
+                        api_failed = False
 
                     except Exception as e:
                         model_answer = f"API 调用失败: {e}"
+                        usage = None
+                        api_failed = True
                     
                     print(f'{input_question}\nModel Answer: {model_answer} \nCorrect Answer: {reference}')
 
-                    results.append({
+                    usage_meter.add(usage)
+                    result_writer.write(key, {
                         "video_id": video_id,
                         "clip_name": clip_name,
                         "question": question,
                         "answer_options": answer_options,
                         "model_answer": model_answer,
-                        "reference_answer": reference
-                    })
+                        "reference_answer": reference,
+                        **usage_columns(usage)
+                    }, index, done=not api_failed)
              
 
 
-            results_df = pd.DataFrame(results)
-            results_df.to_csv(f"results/multiframes/frame9/{new_file}.csv", index=False, encoding="utf-8")
-            print(f"save results/multiframes/frame9/{new_file}.csv。")
+            result_writer.finalize()
+            print(usage_meter.summary())
+            usage_meter.save(f"{result_writer.output_csv}.usage.json")
+            print(f"save {result_writer.output_csv}。")
 
             end_time = time.time()
             elapsed_min = (end_time - start_time) / 60
 
+    print(cache.summary())
+    print(sampler.summary())
+    if keyframes is not None:
+        print(keyframes.summary())
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help="i/N: evaluate only shard i of N (0-based); merge with result_writer.py merge")
+    main(shard=parser.parse_args().shard)
 
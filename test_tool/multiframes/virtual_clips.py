@@ -0,0 +1,51 @@
+import os
+import json
+import argparse
+import pandas as pd
+
+from generate_video_clip import KEYSTEP_JSON, TAKES_ROOT, load_take_names, plan_clips
+
+
+def build_virtual_index(csv_path, long_video_dir, keystep_json=KEYSTEP_JSON, takes_root=TAKES_ROOT):
+    """
+    QA JSON whose items point into the long source videos instead of cut clips.
+
+    Items have the same fields as the generate_video_clip.py output plus
+    source_video, start_frame and end_frame, so they can be used with or without
+    materialized clips.
+    """
+    df = pd.read_csv(csv_path)
+    videoid2takename = load_take_names(keystep_json)
+    _, qa_dict = plan_clips(df, videoid2takename, long_video_dir, clip_dir='', takes_root=takes_root)
+    return qa_dict
+
+
+def is_virtual(qa):
+    return "source_video" in qa and "start_frame" in qa and "end_frame" in qa
+
+
+def sample_virtual_clip(sampler, qa, num_frames):
+    """Data URLs of num_frames frames of a virtual clip, read straight from its source video."""
+    if not os.path.exists(qa["source_video"]):
+        return []
+    return sampler.sample_range_data_urls(qa["source_video"], qa["start_frame"], qa["end_frame"], num_frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a virtual clip index for multiframe evaluation")
+    parser.add_argument('--csv_path', type=str, required=True, help="QA pairs CSV, e.g. qa_pairs/temporal_egtea.csv")
+    parser.add_argument('--long_video_dir', type=str, required=True, help="Directory with <video_id>.mp4 source videos")
+    parser.add_argument('--output_json', type=str, required=True)
+    parser.add_argument('--keystep_json', type=str, default=KEYSTEP_JSON)
+    parser.add_argument('--takes_root', type=str, default=TAKES_ROOT)
+    args = parser.parse_args()
+
+    qa_dict = build_virtual_index(args.csv_path, args.long_video_dir, args.keystep_json, args.takes_root)
+    with open(args.output_json, 'w', encoding='utf-8') as f:
+        json.dump(qa_dict, f, ensure_ascii=False)
+    num_items = sum(len(qa_list) for qa_list in qa_dict.values())
+    print(f"Indexed {num_items} virtual clips of {len(qa_dict)} videos to {args.output_json}")
+
+
+if __name__ == "__main__":
+    main()
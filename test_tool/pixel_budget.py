@@ -0,0 +1,315 @@
+import os
+import math
+
+
+IMAGE_FACTOR = 28
+MIN_PIXELS = 256 * 28 * 28
+MAX_PIXELS = 448 * 28 * 28
+MAX_RATIO = 200
+
+
+def round_by_factor(number, factor):
+    return round(number / factor) * factor
+
+
+def ceil_by_factor(number, factor):
+    return math.ceil(number / factor) * factor
+
+
+def floor_by_factor(number, factor):
+    return math.floor(number / factor) * factor
+
+
+def smart_resize(height, width, factor=IMAGE_FACTOR, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS):
+    """
+    Target size the Qwen2.5-VL processor resizes a frame to.
+
+    Same rule as qwen_vl_utils.smart_resize: both sides become multiples of
+    factor, the aspect ratio is kept and the area ends up in [min_pixels, max_pixels].
+
+    Returns:
+        (height, width) after resizing
+    """
+    if max(height, width) / min(height, width) > MAX_RATIO:
+        raise ValueError(
+            f"absolute aspect ratio must be smaller than {MAX_RATIO}, got {max(height, width) / min(height, width)}"
+        )
+    h_bar = max(factor, round_by_factor(height, factor))
+    w_bar = max(factor, round_by_factor(width, factor))
+    if h_bar * w_bar > max_pixels:
+        beta = math.sqrt((height * width) / max_pixels)
+        h_bar = floor_by_factor(height / beta, factor)
+        w_bar = floor_by_factor(width / beta, factor)
+    elif h_bar * w_bar < min_pixels:
+        beta = math.sqrt(min_pixels / (height * width))
+        h_bar = ceil_by_factor(height * beta, factor)
+        w_bar = ceil_by_factor(width * beta, factor)
+    return h_bar, w_bar
+
+
+def resize_to_budget(image, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS):
+    """Resize a PIL image to its smart_resize() target size."""
+    from PIL import Image
+
+    width, height = image.size
+    resized_height, resized_width = smart_resize(height, width, min_pixels=min_pixels, max_pixels=max_pixels)
+    if (resized_width, resized_height) == (width, height):
+        return image
+    return image.resize((resized_width, resized_height), Image.BICUBIC)
+
+
+PATCH_PIXELS = IMAGE_FACTOR * IMAGE_FACTOR
+TEMPORAL_PATCH_SIZE = 2
+# Candidate per-row max_pixels, in 28x28 patches, from coarse to the fixed default budget.
+DEFAULT_BUDGETS = [128 * PATCH_PIXELS, 192 * PATCH_PIXELS, 256 * PATCH_PIXELS,
+                   320 * PATCH_PIXELS, 384 * PATCH_PIXELS, 448 * PATCH_PIXELS]
+
+
+def vision_frames(messages):
+    """(number of images, number of video frames) in a chat message list."""
+    images = video_frames = 0
+    for message in messages:
+        content = message.get('content')
+        if not isinstance(content, list):
+            continue
+        for item in content:
+            if item.get('type') == 'image':
+                images += 1
+            elif item.get('type') == 'video' and isinstance(item.get('video'), (list, tuple)):
+                video_frames += len(item['video'])
+    return images, video_frames
+
+
+def estimate_vision_tokens(max_pixels, images=0, video_frames=0):
+    """
+    Upper bound on the vision tokens of a request at a per-frame pixel budget.
+
+    One token covers a 28x28 patch; video frames are merged in pairs along time.
+    """
+    per_frame = max_pixels // PATCH_PIXELS
+    return per_frame * (images + math.ceil(video_frames / TEMPORAL_PATCH_SIZE))
+
+
+def apply_pixel_budget(messages, max_pixels, min_pixels=None):
+    """
+    Copy of messages with a per-item max_pixels on every image and video entry.
+
+    qwen_vl_utils.process_vision_info honours these keys, so the frames reach
+    the processor already resized to the budget.
+    """
+    budgeted = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, list):
+            items = []
+            for item in content:
+                if item.get('type') in ('image', 'video'):
+                    item = dict(item, max_pixels=max_pixels)
+                    if min_pixels is not None:
+                        item['min_pixels'] = min(min_pixels, max_pixels)
+                items.append(item)
+            message = dict(message, content=items)
+        budgeted.append(message)
+    return budgeted
+
+
+def message_max_pixels(messages, default=None):
+    """Largest per-item max_pixels set by apply_pixel_budget(), or default if there is none."""
+    budgets = [item['max_pixels'] for message in messages if isinstance(message.get('content'), list)
+               for item in message['content'] if 'max_pixels' in item]
+    return max(budgets) if budgets else default
+
+
+class PixelBudgetController:
+    """
+    Adaptive per-row pixel budget for local Qwen2.5-VL inference.
+
+    With target_tokens the largest budget whose estimated vision tokens fit is
+    chosen. With target_latency_s the latency of a row is predicted as
+    prompt tokens x seconds per prompt token, where seconds per token and the
+    text part of the prompt are EWMAs of the rows measured so far (cached rows
+    are ignored); until the first measurement the largest budget is used.
+
+    The processor must be loaded with the pixel_range() of the controller so it
+    does not upscale frames that were resized below its own min_pixels.
+
+    Example:
+        budget = PixelBudgetController(target_latency_s=2.0)
+        model, processor = load_model(model_name, *budget.pixel_range())
+        messages = budget.apply(messages)
+        answer, usage = local_answer(model, processor, messages, model_name, cache, with_usage=True)
+        budget.update(usage)
+    """
+
+    def __init__(self, target_latency_s=None, target_tokens=None, budgets=DEFAULT_BUDGETS, alpha=0.2):
+        if (target_latency_s is None) == (target_tokens is None):
+            raise ValueError("Set exactly one of target_latency_s and target_tokens")
+        self.target_latency_s = target_latency_s
+        self.target_tokens = target_tokens
+        self.budgets = sorted(budgets)
+        self.alpha = alpha
+        self.seconds_per_token = None
+        self.text_tokens = None
+        self.chosen = {}
+
+    def pixel_range(self):
+        """(min_pixels, max_pixels) to load the processor with."""
+        return self.budgets[0], self.budgets[-1]
+
+    def _ewma(self, previous, value):
+        return value if previous is None else (1 - self.alpha) * previous + self.alpha * value
+
+    def predict_latency(self, max_pixels, images=0, video_frames=0):
+        if self.seconds_per_token is None:
+            return None
+        tokens = (self.text_tokens or 0) + estimate_vision_tokens(max_pixels, images, video_frames)
+        return tokens * self.seconds_per_token
+
+    def choose(self, images=0, video_frames=0):
+        """Largest budget that meets the target for a request with this many frames."""
+        choice = self.budgets[0]
+        for max_pixels in self.budgets:
+            if self.target_tokens is not None:
+                fits = estimate_vision_tokens(max_pixels, images, video_frames) <= self.target_tokens
+            else:
+                latency = self.predict_latency(max_pixels, images, video_frames)
+                fits = latency is None or latency <= self.target_latency_s
+            if fits:
+                choice = max_pixels
+        self.chosen[choice] = self.chosen.get(choice, 0) + 1
+        return choice
+
+    def apply(self, messages):
+        """messages with the budget chosen for their frame count applied."""
+        return apply_pixel_budget(messages, self.choose(*vision_frames(messages)), self.budgets[0])
+
+    def update(self, usage):
+        """Fold the measured usage of one row into the throughput estimate."""
+        if not usage or usage.get('cached'):
+            return
+        prompt_tokens, latency_s = usage.get('prompt_tokens'), usage.get('latency_s')
+        if not prompt_tokens or not latency_s:
+            return
+        self.seconds_per_token = self._ewma(self.seconds_per_token, latency_s / prompt_tokens)
+        if usage.get('vision_tokens') is not None:
+            self.text_tokens = self._ewma(self.text_tokens, prompt_tokens - usage['vision_tokens'])
+
+    def summary(self):
+        target = (f"{self.target_tokens} vision tokens" if self.target_tokens is not None
+                  else f"{self.target_latency_s:.2f}s")
+        counts = ", ".join(f"{max_pixels // PATCH_PIXELS}: {count}" for max_pixels, count in sorted(self.chosen.items()))
+        return f"Pixel budget (target {target}): rows per budget in 28x28 patches {{{counts}}}"
+
+
+def processor_pixel_range(*controllers):
+    """
+    (min_pixels, max_pixels) for loading the processor.
+
+    Covers the pixel_range() of every controller that is not None
+    (PixelBudgetController, foveate.Foveator); the fixed budget without any.
+    """
+    ranges = [controller.pixel_range() for controller in controllers if controller is not None]
+    if not ranges:
+        return MIN_PIXELS, MAX_PIXELS
+    return min(low for low, _ in ranges), max(high for _, high in ranges)
+
+
+def autotune(model_path, qa_csv, image_dir, budgets=DEFAULT_BUDGETS, sample=50, seed=0, max_new_tokens=128):
+    """
+    Run the same sample of QA rows at every pixel budget, without the response cache.
+
+    The prompt is the one of qwenvl_test/test_wo.py (frames and question only),
+    so the curve reflects the cost of the frames rather than of any gaze cue.
+
+    Returns:
+        One dictionary per budget with accuracy, tokens per row and latency percentiles
+    """
+    import csv
+    import random
+    import pandas as pd
+    from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor
+    from inference import local_answer, UsageMeter
+    from caculate import extract_choice
+
+    with open(qa_csv, 'r') as f:
+        rows = list(csv.DictReader(f))
+    rows = random.Random(seed).sample(rows, min(sample, len(rows)))
+    budgets = sorted(budgets)
+    model = Qwen2_5_VLForConditionalGeneration.from_pretrained(model_path, torch_dtype="auto", device_map="auto")
+    processor = AutoProcessor.from_pretrained(model_path, min_pixels=budgets[0], max_pixels=budgets[-1])
+
+    curve = []
+    for max_pixels in budgets:
+        meter = UsageMeter(f"{max_pixels // PATCH_PIXELS}x28x28")
+        answers = []
+        for row in rows:
+            image_files = [os.path.join(image_dir, row['video_id'], path) for path in row['group_id'].split("\n")]
+            input_question = (f"Given the visual sequence and associated question:\n"
+                              f"{row['Question']}\nOptions:\n{row['Answer Options']}\n"
+                              "Choose the most appropriate option. Return the letter of the correct option.")
+            messages = apply_pixel_budget([{"role": "user", "content": [
+                {"type": "video", "video": image_files},
+                {"type": "text", "text": input_question},
+            ]}], max_pixels, budgets[0])
+            answer, usage = local_answer(model, processor, messages, os.path.basename(model_path),
+                                         None, max_new_tokens, with_usage=True)
+            meter.add(usage)
+            answers.append(answer)
+        predicted = extract_choice(pd.Series(answers))
+        reference = extract_choice(pd.Series([row['Correct Answer'] for row in rows]))
+        report = meter.report()
+        curve.append({
+            'max_pixels': max_pixels,
+            'patches': max_pixels // PATCH_PIXELS,
+            'rows': len(rows),
+            'accuracy': float((predicted == reference).mean() * 100),
+            'vision_tokens_per_row': report['vision_tokens_per_row'],
+            'prompt_tokens_per_row': report['prompt_tokens_per_row'],
+            'latency_p50_s': report['latency_p50_s'],
+            'latency_p95_s': report['latency_p95_s'],
+        })
+        print(meter.summary())
+    return curve
+
+
+def main():
+    import csv
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pixel budget tools for the Qwen2.5-VL processor")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    autotune_parser = subparsers.add_parser('autotune', help="Sweep pixel budgets and report accuracy against latency")
+    autotune_parser.add_argument('--model_name', type=str, default='Qwen2.5-VL-7B-Instruct')
+    autotune_parser.add_argument('--model_path', type=str, default=None,
+                                 help="Checkpoint folder (default: /home/pty/Qwen2.5-VL/pretrained/<model_name>)")
+    autotune_parser.add_argument('--dataset', type=str, default='egtea')
+    autotune_parser.add_argument('--category', type=str, default='spatial')
+    autotune_parser.add_argument('--budgets', type=int, nargs='+', default=[b // PATCH_PIXELS for b in DEFAULT_BUDGETS],
+                                 help="max_pixels in 28x28 patches")
+    autotune_parser.add_argument('--sample', type=int, default=50, help="QA rows per budget")
+    autotune_parser.add_argument('--seed', type=int, default=0)
+    autotune_parser.add_argument('--output', type=str, default=None, help="CSV of the trade-off curve")
+    args = parser.parse_args()
+
+    model_path = args.model_path or f"/home/pty/Qwen2.5-VL/pretrained/{args.model_name}"
+    qa_csv = f"/home/pty_ssd/EgoEye/qa_pairs/{args.category}_{args.dataset}.csv"
+    image_dir = f"/home/pty_ssd/EgoEye/datasets/{args.dataset}"
+    curve = autotune(model_path, qa_csv, image_dir, [b * PATCH_PIXELS for b in args.budgets], args.sample, args.seed)
+
+    def fmt(value, spec):
+        return "n/a" if value is None else format(value, spec)
+
+    print(f"{'patches':>8s} {'accuracy':>9s} {'vision tok':>11s} {'p50 s':>7s} {'p95 s':>7s}")
+    for point in curve:
+        print(f"{point['patches']:8d} {point['accuracy']:8.1f}% {fmt(point['vision_tokens_per_row'], '11.1f')} "
+              f"{fmt(point['latency_p50_s'], '7.2f')} {fmt(point['latency_p95_s'], '7.2f')}")
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(curve[0]))
+            writer.writeheader()
+            writer.writerows(curve)
+        print(f"Trade-off curve saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
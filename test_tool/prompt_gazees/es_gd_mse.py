@@ -1,40 +1,11 @@
 import os
-import json
 import csv
 import sys
+import argparse
 import numpy as np
+import pandas as pd
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from gaze_trajectory import plot_gaze_trajectory
-
-
-
-def load_video(image_paths, image_dir, video_id):
-    image_files = [os.path.join(image_dir, video_id, path) for path in image_paths]
-    return image_files
-
-def get_gaze_info_from_json(json_file, video_id, group_id):
-    
-    with open(json_file, 'r') as f:
-        data = json.load(f)
-    json_name = os.path.basename(json_file)
-    
-    
-    video_data = data.get(video_id)
-    if not video_data:
-        return None
-    
-    gaze_info_list = []
-    for image_file in group_id:
-        if json_name == 'egtea.json':
-            frame = int(image_file.split('.')[0].split('_')[1]) # egtea
-        else:
-            frame = int(image_file.split('/')[-1].split('.')[0])  # ego4d, egoexo
-        for narration in video_data["narrations"]:
-            if narration["timestamp_frame"] == frame:
-                gaze_info_list.append(narration["gaze_info"])
-                break  
-
-    return gaze_info_list
+from gaze_index import load_gaze_index, frame_number
 
 
 def get_gaze_info_from_csv(csv_folder, video_id, group_id):
@@ -43,7 +14,7 @@ def get_gaze_info_from_csv(csv_folder, video_id, group_id):
     if not os.path.exists(csv_file):
         return None
 
-  
+
     gaze_dict = {}
     with open(csv_file, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
@@ -60,78 +31,130 @@ def get_gaze_info_from_csv(csv_folder, video_id, group_id):
         if gaze_info:
             gaze_info_list.append(gaze_info)
         else:
-            gaze_info_list.append(None)  
+            gaze_info_list.append(None)
     return gaze_info_list
 
-def calc_mae(gaze_es_list, gaze_gd_list):
-    dists = []
-    for es, gd in zip(gaze_es_list, gaze_gd_list):
-        if es is None or gd is None:
-            continue
-        dx = es['gaze_x'] - gd['gaze_x']
-        dy = es['gaze_y'] - gd['gaze_y']
-        dist = np.sqrt(dx**2 + dy**2)
-        dists.append(dist)
-    if len(dists) == 0:
-        return None
-    return np.mean(dists)
 
-def calc_mse(gaze_es_list, gaze_gd_list):
-    errors = []
-    for es, gd in zip(gaze_es_list, gaze_gd_list):
-        if es is None or gd is None:
+def load_gazees_table(csv_file):
+    """Read an estimated-gaze CSV (frame, "(x, y)") into {frame name: (x, y)}."""
+    df = pd.read_csv(csv_file, dtype={'frame': str, 'gaze': str})
+    xy = df['gaze'].str.strip('()').str.split(',', expand=True).astype(np.float64).to_numpy()
+    return dict(zip(df['frame'], map(tuple, xy)))
+
+
+def align_gaze(qa_csv, narration_json, gazees_folder, dataset):
+    """
+    Align estimated and ground-truth gaze of every frame of every QA row.
+
+    The narration JSON and each estimated-gaze CSV are parsed once. Frames are
+    paired by frame name, frames missing on either side are dropped.
+
+    Returns:
+        es: (M, 2) estimated gaze
+        gd: (M, 2) ground-truth gaze
+        rows: (M,) index of the QA row each frame belongs to
+    """
+    gaze_index = load_gaze_index(narration_json)
+    gazees_tables = {}
+    es, gd, rows = [], [], []
+    qa = pd.read_csv(qa_csv, usecols=['video_id', 'group_id'])
+    for row_index, (video_id, group_id) in enumerate(zip(qa['video_id'], qa['group_id'])):
+        gd_frames = gaze_index.get(video_id)
+        if video_id not in gazees_tables:
+            csv_file = os.path.join(gazees_folder, f"{video_id}.csv")
+            gazees_tables[video_id] = load_gazees_table(csv_file) if os.path.exists(csv_file) else None
+        es_frames = gazees_tables[video_id]
+        if not gd_frames or es_frames is None:
             continue
-        dx = es['gaze_x'] - gd['gaze_x']
-        dy = es['gaze_y'] - gd['gaze_y']
-        errors.append(dx**2 + dy**2)
-    if len(errors) == 0:
-        return None
-    return np.mean(errors)
-
-all_mse_total = []
-all_mae_total = []  
-
-datasets = ['ego4d', 'egoexo', 'egtea']
-categories = ['spatial', 'causal', 'temporal']
-for dataset in datasets:
-    all_mae = []
-    all_mse = []
-    for category in categories:
-       
-        file_path = f"./qa_pairs/{category}_{dataset}.csv"
-        file_name = os.path.basename(file_path)
-        new_file = os.path.splitext(file_name)[0]
-        base_folder = f"./datasets/{dataset}"
-        gazees_folder = f"./ablation/gazees_vllm/{dataset}"
-        narration_json = f"./narrations/{dataset}.json"
-        model_name = 'Qwen2.5-VL-7B-Instruct'
-        output_csv = f"./results/gazees_vllm/{model_name}_{new_file}.csv"
-
-        with open(file_path, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                video_id = row['video_id']
-                image_paths = row['group_id'].split("\n")
-                gaze_es_list = get_gaze_info_from_csv(gazees_folder, video_id, image_paths)
-                gaze_gd_list = get_gaze_info_from_json(narration_json, video_id, image_paths)
-                if gaze_es_list is None or gaze_gd_list is None:
-                    continue
-                mse = calc_mse(gaze_es_list, gaze_gd_list)
-                mae = calc_mae(gaze_es_list, gaze_gd_list)
-                if mse is not None:
-                    all_mse.append(mse)
-                    all_mse_total.append(mse)
-                if mae is not None:
-                    all_mae.append(mae)
-                    all_mae_total.append(mae)
-
-    if all_mse:
-        print(f" {dataset} MSE: {np.mean(all_mse):.4f}")
-    if all_mae:
-        print(f"{dataset} MAE: {np.mean(all_mae):.4f}")
-
-
-
-
-                
-
+        for image_file in group_id.split("\n"):
+            es_xy = es_frames.get(image_file)
+            gd_info = gd_frames.get(frame_number(image_file, dataset))
+            if es_xy is None or gd_info is None:
+                continue
+            es.append(es_xy)
+            gd.append((gd_info['gaze_x'], gd_info['gaze_y']))
+            rows.append(row_index)
+    return (np.asarray(es, dtype=np.float64).reshape(-1, 2),
+            np.asarray(gd, dtype=np.float64).reshape(-1, 2),
+            np.asarray(rows, dtype=np.int64))
+
+
+def gaze_error_metrics(es, gd, rows, radii=(0.05, 0.1), percentiles=(50, 90, 95)):
+    """
+    Vectorized gaze error metrics over aligned frames.
+
+    MSE and MAE are averaged per QA row first and then over rows; per-frame
+    statistics use all frames directly.
+
+    Returns:
+        Dictionary of metric name -> value
+    """
+    if len(es) == 0:
+        return {'rows': 0, 'frames': 0}
+    sq_err = np.sum((es - gd) ** 2, axis=1)
+    dist = np.sqrt(sq_err)
+    _, row_ids, counts = np.unique(rows, return_inverse=True, return_counts=True)
+    metrics = {
+        'rows': len(counts),
+        'frames': len(dist),
+        'MSE': float(np.mean(np.bincount(row_ids, weights=sq_err) / counts)),
+        'MAE': float(np.mean(np.bincount(row_ids, weights=dist) / counts)),
+        'frame_MSE': float(sq_err.mean()),
+        'frame_MAE': float(dist.mean()),
+    }
+    for p, value in zip(percentiles, np.percentile(dist, percentiles)):
+        metrics[f'P{p}'] = float(value)
+    for radius in radii:
+        metrics[f'hit@{radius}'] = float(np.mean(dist <= radius))
+    return metrics
+
+
+def evaluate_gaze_estimator(root, gazees_dir, datasets, categories):
+    """
+    Error of an estimated gaze stream against the narration ground truth.
+
+    Args:
+        root: Directory holding qa_pairs/ and narrations/
+        gazees_dir: Directory with one <dataset>/<video_id>.csv per video of estimated gaze
+
+    Returns:
+        DataFrame with one row per (dataset, category) plus an "all" row per dataset
+    """
+    records = []
+    for dataset in datasets:
+        narration_json = os.path.join(root, "narrations", f"{dataset}.json")
+        gazees_folder = os.path.join(gazees_dir, dataset)
+        dataset_parts = []
+        row_offset = 0
+        for category in categories:
+            qa_csv = os.path.join(root, "qa_pairs", f"{category}_{dataset}.csv")
+            if not os.path.exists(qa_csv):
+                continue
+            es, gd, rows = align_gaze(qa_csv, narration_json, gazees_folder, dataset)
+            records.append({'dataset': dataset, 'category': category, **gaze_error_metrics(es, gd, rows)})
+            # Row ids must stay unique once categories are pooled.
+            dataset_parts.append((es, gd, rows + row_offset))
+            row_offset += int(rows.max()) + 1 if len(rows) else 0
+        if dataset_parts:
+            es, gd, rows = (np.concatenate(arrays) for arrays in zip(*dataset_parts))
+            records.append({'dataset': dataset, 'category': 'all', **gaze_error_metrics(es, gd, rows)})
+    return pd.DataFrame(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimated vs. ground-truth gaze error")
+    parser.add_argument('--root', type=str, default=".", help="Directory with qa_pairs/ and narrations/")
+    parser.add_argument('--gazees_dir', type=str, default="./ablation/gazees_vllm")
+    parser.add_argument('--datasets', nargs='+', default=['ego4d', 'egoexo', 'egtea'])
+    parser.add_argument('--categories', nargs='+', default=['spatial', 'causal', 'temporal'])
+    parser.add_argument('--output', type=str, default=None, help="Write the metrics table to this CSV")
+    args = parser.parse_args()
+
+    table = evaluate_gaze_estimator(args.root, args.gazees_dir, args.datasets, args.categories)
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,14 @@ import csv
 import base64
 import pandas as pd
 from openai import OpenAI
+import argparse
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from gaze_trajectory import plot_gaze_trajectory
+from inference import api_answer, USAGE_FIELDS, UsageMeter, usage_columns
+from response_cache import ResponseCache
+from result_writer import ResultWriter, row_key, parse_shard
+from tracing import traced
 
 
 def encode_images_from_folder(base_folder, video_id, group_id):
@@ -26,6 +31,7 @@ def encode_images_from_folder(base_folder, video_id, group_id):
     return image_data_list, image_path
 
 
+@traced("io.gaze_lookup")
 def get_gaze_info_from_csv(csv_folder, video_id, group_id):
 
     csv_file = os.path.join(csv_folder, f"{video_id}.csv")
@@ -54,7 +60,8 @@ def get_gaze_info_from_csv(csv_folder, video_id, group_id):
     return gaze_info_list
 
 
-def main():
+def main(resume=True, shard=None):
+    cache = ResponseCache()
     datasets = ['egtea']
     categories = ['spatial', 'temporal', 'causal']
     for dataset in datasets:
@@ -64,6 +71,7 @@ def main():
             file_path = f"/home/pty_ssd/EgoEye/qa_pairs/{category}_{dataset}.csv"
             file_name = os.path.basename(file_path)
             new_file = os.path.splitext(file_name)[0]
+            output_csv = f"/home/pty_ssd/EgoEye/results/prompt_gazees/{new_file}.csv"
             base_folder = f"/home/pty_ssd/EgoEye/datasets/{dataset}"
             gazees_folder = f"/home/pty_ssd/EgoEye/ablation/gazees_vllm/{dataset}"  
             api_key = ""  #  API Key
@@ -72,7 +80,8 @@ def main():
             df = pd.read_csv(file_path)
             client = OpenAI(api_key=api_key, base_url=base_url)
             
-            results = []
+            result_writer = ResultWriter(output_csv, ["video_id", "question", "answer_options", "model_answer", "reference_answer"] + USAGE_FIELDS, resume=resume, shard=shard)
+            usage_meter = UsageMeter(os.path.basename(output_csv))
 
             for index, row in df.iterrows():
                 video_id = row["video_id"]
@@ -80,12 +89,16 @@ def main():
                 question = row["Question"]
                 answer_options = row["Answer Options"]
                 reference = row["Correct Answer"]
+                key = row_key(video_id, row["group_id"], question)
+                if result_writer.is_done(key):
+                    continue
 
                 image_data_list, image_path = encode_images_from_folder(base_folder, video_id, group_id)
 
         
                 if not image_data_list:
                     print(f"jump {video_id}")
+                    result_writer.skip_row(key, index, "no frames", retry=True)
                     continue
 
   
@@ -105,39 +118,39 @@ def main():
 
                 
                 try:
-                    completion = client.chat.completions.create(
-                        model="qwen-vl-max-latest",
-                        messages=[
-                            {
-                                "role": "user",
-                                "content": [
-                                    {"type": "image_url", "image_url":{"url":f"data:image/png;base64,{salience_image_base64}"}},
-                                    {"type": "video", "video": image_data_list},
-                                    {"type": "text", "text": input_question}
-                                ]
-                            }
-                        ]
-                    )
-                    model_answer = completion.choices[0].message.content
+                    model_answer, usage = api_answer(client, "qwen-vl-max-latest", [
+                        {"type": "image_url", "image_url":{"url":f"data:image/png;base64,{salience_image_base64}"}},
+                        {"type": "video", "video": image_data_list},
+                        {"type": "text", "text": input_question}
+                    ], cache, with_usage=True)
+                    api_failed = False
 
                 except Exception as e:
                     model_answer = f"API fail: {e}"
+                    usage = None
+                    api_failed = True
                 
                 # print(f'{input_question}\nModel Answer: {model_answer} \nCorrect Answer: {reference}')
 
-                results.append({
+                usage_meter.add(usage)
+                result_writer.write(key, {
                     "video_id": video_id,
                     "question": question,
                     "answer_options": answer_options,
                     "model_answer": model_answer,
-                    "reference_answer": reference
-                })
-
-            results_df = pd.DataFrame(results)
-            results_df.to_csv(f"/home/pty_ssd/EgoEye/results/prompt_gazees/{new_file}.csv", index=False, encoding="utf-8")
+                    "reference_answer": reference,
+                    **usage_columns(usage)
+                }, index, done=not api_failed)
 
+            result_writer.finalize()
+            print(usage_meter.summary())
+            usage_meter.save(f"{result_writer.output_csv}.usage.json")
 
+    print(cache.summary())
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help="i/N: evaluate only shard i of N (0-based); merge with result_writer.py merge")
+    main(shard=parser.parse_args().shard)
@@ -7,21 +7,23 @@ from torchvision import transforms
 import csv
 import random
 from PIL import Image
-import gc
 from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor
-from qwen_vl_utils import process_vision_info
+import argparse
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from gaze_trajectory import plot_gaze_trajectory
+from salience_prefetch import SaliencePrefetcher
+from inference import local_answer, USAGE_FIELDS, UsageMeter, usage_columns
+from pixel_budget import MIN_PIXELS, MAX_PIXELS, PixelBudgetController, processor_pixel_range
+from response_cache import ResponseCache
+from result_writer import ResultWriter, row_key, parse_shard
+from tracing import traced
 
 
-def load_model(model_name):
+def load_model(model_name, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS):
     model = Qwen2_5_VLForConditionalGeneration.from_pretrained(
-        f"Qwen2.5-VL/pretrained/{model_name}", torch_dtype="auto", device_map="auto"
+        f"/home/pty/Qwen2.5-VL/pretrained/{model_name}", torch_dtype="auto", device_map="auto"
     )
-    min_pixels = 256*28*28
-    max_pixels = 448*28*28
-    processor = AutoProcessor.from_pretrained(f"Qwen2.5-VL/pretrained/{model_name}", min_pixels=min_pixels, max_pixels=max_pixels)
+    processor = AutoProcessor.from_pretrained(f"/home/pty/Qwen2.5-VL/pretrained/{model_name}", min_pixels=min_pixels, max_pixels=max_pixels)
     return model, processor
 
 
@@ -31,6 +33,7 @@ def load_video(image_paths, image_dir, video_id):
     return image_files
 
 
+@traced("io.gaze_lookup")
 def get_gaze_info_from_csv(csv_folder, video_id, group_id):
 
     csv_file = os.path.join(csv_folder, f"{video_id}.csv")
@@ -59,121 +62,148 @@ def get_gaze_info_from_csv(csv_folder, video_id, group_id):
 
 datasets = ['egtea']
 categories = ['temporal', 'causal']
-for dataset in datasets:
-    for category in categories:
-        print(f"----Processing {category}_{dataset}.csv----\n")
+resume = True
+# PixelBudgetController(target_latency_s=...) or (target_tokens=...) picks max_pixels per row; None keeps the fixed budget.
+pixel_budget = None
+sample_seed = 0
+# SaliencePrefetcher renders the salience maps of upcoming rows in background processes; None renders them inline.
+salience_prefetch = SaliencePrefetcher(lookahead=8, workers=4)
+model_name = 'Qwen2.5-VL-7B-Instruct'
+
+
+def evaluate(model, processor, model_name, dataset, category, cache=None, resume=True, shard=None,
+             pixel_budget=None, sample_seed=0, prefetcher=None):
+    """
+    Evaluate one QA file, {category}_{dataset}.csv, with a loaded model.
+
+    Args:
+        prefetcher: SaliencePrefetcher rendering the salience maps of the next
+            rows in the background; None renders each map inline
+
+    Returns:
+        UsageMeter of the rows evaluated by this call
+    """
+    print(f"----Processing {category}_{dataset}.csv----\n")
  
-        file_path = f"./qa_pairs/{category}_{dataset}.csv"
-        file_name = os.path.basename(file_path)
-        new_file = os.path.splitext(file_name)[0]
-        base_folder = f"./datasets/{dataset}"
-        gazees_folder = f"./ablation/gazees_vllm/{dataset}"
-        model_name = 'Qwen2.5-VL-7B-Instruct'
-        output_csv = f"./results/gazees_vllm/{model_name}_{new_file}.csv"
-        
+    file_path = f"/home/pty_ssd/EgoEye/qa_pairs/{category}_{dataset}.csv"
+    file_name = os.path.basename(file_path)
+    new_file = os.path.splitext(file_name)[0]
+    base_folder = f"/home/pty_ssd/EgoEye/datasets/{dataset}"
+    gazees_folder = f"/home/pty_ssd/EgoEye/ablation/gazees_vllm/{dataset}"
+    output_csv = f"/home/pty_ssd/EgoEye/results/gazees_vllm/{model_name}_{new_file}.csv"
+    
     
 
-        model, processor = load_model(model_name)
 
-        results = []
+    result_writer = ResultWriter(output_csv, ['video_id', 'Question', 'Answer Options', 'Model_Answer', 'Reference_Answer'] + USAGE_FIELDS, resume=resume, shard=shard)
+    usage_meter = UsageMeter(os.path.basename(output_csv))
 
-        
-        with open(file_path, 'r') as f:
-            reader = csv.DictReader(f)
-            all_rows = [row for row in reader]
-            sample_rows = random.sample(all_rows, 100)  
-            for row in sample_rows:
-                video_id = row['video_id']
-                question = row['Question']
-                answer_options = row['Answer Options']
-                correct_answer = row['Correct Answer']
-                
-               
-                image_paths = row['group_id'].split("\n")
-                image_files = load_video(image_paths, base_folder, video_id)
-                gaze_info_list = get_gaze_info_from_csv(gazees_folder, video_id, image_paths)
-                salience_image_base64 = plot_gaze_trajectory(image_files[0], gaze_info_list)
-
-
-                input_question = ("I provide you with a Picture{Frame 0} and a video{Frame 1-9}. Choose the correct option based on the first-person perspective scene question.\n"
-                                "You must follow these steps to answer the question:\n"
-                                "1. {Frame 0} is the saliency grayscale map of the gaze trajectory from the first-person perspective, with gaze sequence from low brightness to high brightness.\n"
-                                "2. Remember the location and time sequence of gaze areas in {Frame 0}.\n"
-                                "3. Observe the video according to the gaze sequence in step 2.\n"
-                                f"4. Question:\n{question}\nOptions:\n{answer_options}\n"
-                                "Choose the most appropriate option. Only return the letter of the correct option.")
-                            
-                messages = [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image",
-                                "image": f"data:image;base64,{salience_image_base64}",
-                            },
-                            {
-                                "type": "video",
-                                "video": image_files,
-                            },
-                            {"type": "text", "text": input_question},
-                        ],
-                    }
-                ]
-
-
-
-                text = processor.apply_chat_template(
-                    messages, tokenize=False, add_generation_prompt=True, add_vision_id=True
-                )
-                image_inputs, video_inputs= process_vision_info(messages)
-                inputs = processor(
-                    text=[text],
-                    images=image_inputs,
-                    videos=video_inputs,
-                    padding=True,
-                    return_tensors="pt",
-                )
-                    
-
-                inputs = inputs.to("cuda")
-
-             
-                with torch.no_grad():
-                    generated_ids = model.generate(**inputs, max_new_tokens=128)
-                    generated_ids_trimmed = [
-                        out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-                    ]
-                    output_text = processor.batch_decode(
-                        generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
-                    )
-                    qwenvl_model_answer = output_text[0].strip()
-
-             
-                del inputs, image_inputs, video_inputs
-                torch.cuda.empty_cache()
-                gc.collect()
-
-                print(f'{input_question}\nModel Answer: {qwenvl_model_answer} \nCorrect Answer: {correct_answer}')
-
-                
-                
-            
-                results.append({
-                    'video_id': video_id,
-                    'Question': question,
-                    'Answer Options': answer_options,
-                    'Model_Answer': qwenvl_model_answer,
-                    'Reference_Answer': correct_answer
-                })
+    def pending_rows(sample_rows):
+        # Everything plot_gaze_trajectory needs, for the rows still to evaluate.
+        for index, row in enumerate(sample_rows):
+            video_id = row['video_id']
+            key = row_key(video_id, row['group_id'], row['Question'])
+            if result_writer.is_done(key):
+                continue
 
+            image_paths = row['group_id'].split("\n")
+            image_files = load_video(image_paths, base_folder, video_id)
+            gaze_info_list = get_gaze_info_from_csv(gazees_folder, video_id, image_paths)
+            yield index, row, key, image_files, gaze_info_list
+
+    if prefetcher is None:
+        prefetcher = SaliencePrefetcher(workers=0)
+    with open(file_path, 'r') as f:
+        reader = csv.DictReader(f)
+        all_rows = [row for row in reader]
+        sample_rows = random.Random(sample_seed).sample(all_rows, 100)  
+        rendered = prefetcher.iter_rendered(pending_rows(sample_rows), lambda pending: (pending[3][0], pending[4]))
+        for (index, row, key, image_files, gaze_info_list), salience_image_base64 in rendered:
+            video_id = row['video_id']
+            question = row['Question']
+            answer_options = row['Answer Options']
+            correct_answer = row['Correct Answer']
+
+
+            input_question = ("I provide you with a Picture{Frame 0} and a video{Frame 1-9}. Choose the correct option based on the first-person perspective scene question.\n"
+                            "You must follow these steps to answer the question:\n"
+                            "1. {Frame 0} is the saliency grayscale map of the gaze trajectory from the first-person perspective, with gaze sequence from low brightness to high brightness.\n"
+                            "2. Remember the location and time sequence of gaze areas in {Frame 0}.\n"
+                            "3. Observe the video according to the gaze sequence in step 2.\n"
+                            f"4. Question:\n{question}\nOptions:\n{answer_options}\n"
+                            "Choose the most appropriate option. Only return the letter of the correct option.")
+                        
+            messages = [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image",
+                            "image": f"data:image;base64,{salience_image_base64}",
+                        },
+                        {
+                            "type": "video",
+                            "video": image_files,
+                        },
+                        {"type": "text", "text": input_question},
+                    ],
+                }
+            ]
+
+
+
+            if pixel_budget is not None:
+                messages = pixel_budget.apply(messages)
+            qwenvl_model_answer, usage = local_answer(model, processor, messages, model_name, cache, with_usage=True)
+            usage_meter.add(usage)
+            if pixel_budget is not None:
+                pixel_budget.update(usage)
+
+            print(f'{input_question}\nModel Answer: {qwenvl_model_answer} \nCorrect Answer: {correct_answer}')
 
             
             
+        
+            result_writer.write(key, {
+                'video_id': video_id,
+                'Question': question,
+                'Answer Options': answer_options,
+                'Model_Answer': qwenvl_model_answer,
+                'Reference_Answer': correct_answer,
+                **usage_columns(usage)
+            }, index)
+
+
+        
+        
+
+    result_writer.finalize()
+    print(usage_meter.summary())
+    usage_meter.save(f"{result_writer.output_csv}.usage.json")
+    if pixel_budget is not None:
+        print(pixel_budget.summary())
+
+    print(f"Results saved to {result_writer.output_csv}")
+    return usage_meter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help="i/N: evaluate only shard i of N (0-based); merge with result_writer.py merge")
+    shard = parser.parse_args().shard
+    cache = ResponseCache()
+    model, processor = load_model(model_name, *processor_pixel_range(pixel_budget))
+    for dataset in datasets:
+        for category in categories:
+            evaluate(model, processor, model_name, dataset, category, cache, resume, shard,
+                     pixel_budget=pixel_budget, sample_seed=sample_seed, prefetcher=salience_prefetch)
 
-        with open(output_csv, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['video_id', 'Question', 'Answer Options', 'Model_Answer', 'Reference_Answer'])
-            writer.writeheader()
-            writer.writerows(results)
+    print(cache.summary())
+    if salience_prefetch is not None:
+        print(salience_prefetch.summary())
+        salience_prefetch.close()
 
-        print(f"Results saved to {output_csv}")
 
+if __name__ == "__main__":
+    main()
\ No newline at end of file
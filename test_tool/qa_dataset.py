@@ -0,0 +1,259 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from gaze_index import group_frame_numbers
+from result_writer import row_key
+
+
+DEFAULT_QA_DIR = "/home/pty_ssd/EgoEye/qa_pairs"
+DEFAULT_QA_TABLE = "/home/pty_ssd/EgoEye/qa_pairs/qa_pairs.parquet"
+DATASETS = ['ego4d', 'egoexo', 'egtea']
+CATEGORIES = ['spatial', 'temporal', 'causal']
+
+# One schema for the QA CSVs and the clip JSON of generate_video_clip.py.
+COLUMNS = ['key', 'dataset', 'category', 'source', 'video_id', 'group_id', 'frames', 'frame_indices',
+           'question', 'answer_options', 'correct_answer', 'clip_name', 'source_video', 'start_frame', 'end_frame']
+
+
+def split_name(path):
+    """(category, dataset) of a qa_pairs/<category>_<dataset>.<ext> file."""
+    category, _, dataset = os.path.splitext(os.path.basename(path))[0].partition('_')
+    return category, dataset
+
+
+def _clip_frame_indices(frames):
+    try:
+        return [int(os.path.splitext(frame)[0]) for frame in frames]
+    except ValueError:
+        return None
+
+
+def _report_malformed(path, count):
+    if count:
+        print(f"Skipped {count} QA rows of {path} with malformed frame names")
+
+
+def read_qa_csv(csv_file, dataset=None, category=None):
+    """
+    QA pairs CSV as a table in the unified schema.
+
+    group_id is kept verbatim (it is part of the result row key) and parsed
+    once into the frames and frame_indices list columns. Rows whose image
+    names do not encode a frame number are dropped; their count is kept in
+    table.attrs['malformed_rows'].
+    """
+    name_category, name_dataset = split_name(csv_file)
+    dataset = dataset or name_dataset
+    category = category or name_category
+    df = pd.read_csv(csv_file, dtype=str, keep_default_na=False)
+    frames = df['group_id'].str.split('\n')
+    table = pd.DataFrame({
+        'dataset': dataset,
+        'category': category,
+        'source': 'csv',
+        'video_id': df['video_id'],
+        'group_id': df['group_id'],
+        'frames': frames,
+        'frame_indices': [group_frame_numbers(group, dataset) for group in frames],
+        'question': df['Question'],
+        'answer_options': df['Answer Options'],
+        'correct_answer': df['Correct Answer'],
+        'clip_name': None,
+        'source_video': None,
+        'start_frame': pd.array([pd.NA] * len(df), dtype='Int64'),
+        'end_frame': pd.array([pd.NA] * len(df), dtype='Int64'),
+    })
+    malformed = table['frame_indices'].isna()
+    table = table[~malformed].reset_index(drop=True)
+    table['key'] = [row_key(v, g, q) for v, g, q in zip(table['video_id'], table['group_id'], table['question'])]
+    table = table[COLUMNS]
+    table.attrs['malformed_rows'] = int(malformed.sum())
+    _report_malformed(csv_file, table.attrs['malformed_rows'])
+    return table
+
+
+def read_clip_json(json_file, dataset=None, category=None):
+    """Clip QA JSON ({video_id: [qa item, ...]}) as a table in the unified schema, without malformed rows."""
+    name_category, name_dataset = split_name(json_file)
+    dataset = dataset or name_dataset
+    category = category or name_category
+    with open(json_file, 'r', encoding='utf-8') as f:
+        qa_data = json.load(f)
+    records = []
+    malformed = 0
+    for video_id, qa_list in qa_data.items():
+        for qa in qa_list:
+            frames = qa.get('frames', [])
+            frame_indices = _clip_frame_indices(frames)
+            if frame_indices is None:
+                malformed += 1
+                continue
+            records.append({
+                'key': row_key(video_id, qa['clip_name'], qa['question']),
+                'dataset': dataset,
+                'category': category,
+                'source': 'clip',
+                'video_id': video_id,
+                'group_id': '\n'.join(frames),
+                'frames': frames,
+                'frame_indices': frame_indices,
+                'question': qa['question'],
+                'answer_options': '\n'.join(qa['answer_options']),
+                'correct_answer': qa['correct_answer'],
+                'clip_name': qa['clip_name'],
+                'source_video': qa.get('source_video'),
+                'start_frame': qa.get('start_frame'),
+                'end_frame': qa.get('end_frame'),
+            })
+    table = pd.DataFrame.from_records(records, columns=COLUMNS)
+    table['start_frame'] = table['start_frame'].astype('Int64')
+    table['end_frame'] = table['end_frame'].astype('Int64')
+    table.attrs['malformed_rows'] = malformed
+    _report_malformed(json_file, malformed)
+    return table
+
+
+def build_qa_table(qa_dir=DEFAULT_QA_DIR, datasets=DATASETS, categories=CATEGORIES):
+    """All QA CSVs and clip JSONs of qa_dir in one table."""
+    tables = []
+    for dataset in datasets:
+        for category in categories:
+            csv_file = os.path.join(qa_dir, f"{category}_{dataset}.csv")
+            json_file = os.path.join(qa_dir, f"{category}_{dataset}.json")
+            if os.path.exists(csv_file):
+                tables.append(read_qa_csv(csv_file, dataset, category))
+            if os.path.exists(json_file):
+                tables.append(read_clip_json(json_file, dataset, category))
+    if not tables:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(tables, ignore_index=True)
+
+
+def save_qa_table(table, output_path):
+    """Write the table to Parquet through a temporary file."""
+    tmp_path = f"{output_path}.tmp"
+    table.to_parquet(tmp_path, engine='pyarrow', index=False)
+    os.replace(tmp_path, output_path)
+
+
+class QADataset:
+    """
+    QA pairs backed by the columnar table, with an index by video.
+
+    Filters passed to from_parquet() are pushed down to the Parquet reader, so
+    loading one dataset or category only reads the matching row groups.
+    """
+
+    def __init__(self, table):
+        self.table = table.reset_index(drop=True)
+        self._video_index = None
+
+    @classmethod
+    def from_parquet(cls, path=DEFAULT_QA_TABLE, columns=None, **filters):
+        """
+        Load the table, keeping rows whose columns match the keyword filters.
+
+        Example:
+            QADataset.from_parquet(dataset='egtea', category=['spatial', 'causal'], source='csv')
+        """
+        pushdown = [(column, 'in', list(value)) if isinstance(value, (list, tuple, set)) else (column, '==', value)
+                    for column, value in filters.items()]
+        table = pd.read_parquet(path, engine='pyarrow', columns=columns, filters=pushdown or None)
+        return cls(table)
+
+    @classmethod
+    def for_file(cls, dataset, category, qa_dir=DEFAULT_QA_DIR, table_path=DEFAULT_QA_TABLE):
+        """
+        QA pairs of qa_dir/<category>_<dataset>.csv in file order, as the evaluation scripts read them.
+
+        The rows come from the Parquet table when it is at least as recent as
+        the CSV, and are parsed from the CSV otherwise.
+        """
+        csv_file = os.path.join(qa_dir, f"{category}_{dataset}.csv")
+        if os.path.exists(table_path) and os.path.getmtime(table_path) >= os.path.getmtime(csv_file):
+            return cls.from_parquet(table_path, dataset=dataset, category=category, source='csv')
+        return cls(read_qa_csv(csv_file, dataset, category))
+
+    @classmethod
+    def from_source(cls, path):
+        """Load a single QA CSV, clip JSON or Parquet table."""
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.csv':
+            return cls(read_qa_csv(path))
+        if ext == '.json':
+            return cls(read_clip_json(path))
+        return cls.from_parquet(path)
+
+    def __len__(self):
+        return len(self.table)
+
+    @property
+    def video_index(self):
+        """{video_id: array of row positions}, built on first use."""
+        if self._video_index is None:
+            self._video_index = {video_id: np.asarray(rows) for video_id, rows
+                                 in self.table.groupby('video_id', sort=False).indices.items()}
+        return self._video_index
+
+    def video_ids(self):
+        return list(self.video_index)
+
+    def rows_for_video(self, video_id):
+        return self.table.iloc[self.video_index.get(video_id, np.empty(0, dtype=np.int64))]
+
+    def filter(self, video_ids=None, **filters):
+        """Subset by column values (scalars or lists) and optionally by video."""
+        mask = np.ones(len(self.table), dtype=bool)
+        for column, value in filters.items():
+            if isinstance(value, (list, tuple, set)):
+                mask &= self.table[column].isin(list(value)).to_numpy()
+            else:
+                mask &= (self.table[column] == value).to_numpy()
+        if video_ids is not None:
+            mask &= self.table['video_id'].isin(list(video_ids)).to_numpy()
+        return QADataset(self.table[mask])
+
+    def iter_rows(self):
+        """Rows as dictionaries, in table order, with frames and frame_indices as lists."""
+        for row in self.table.to_dict('records'):
+            for column in ('frames', 'frame_indices'):
+                if row.get(column) is not None:
+                    row[column] = list(row[column])
+            yield row
+
+    def batches(self, batch_size):
+        """Consecutive slices of at most batch_size rows."""
+        for start in range(0, len(self.table), batch_size):
+            yield self.table.iloc[start:start + batch_size]
+
+    def summary(self):
+        counts = self.table.groupby(['dataset', 'category', 'source']).size()
+        return f"{len(self.table)} QA pairs of {len(self.video_index)} videos\n{counts.to_string()}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the QA pairs into one columnar table")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = subparsers.add_parser('convert', help="QA CSVs and clip JSONs -> Parquet")
+    convert_parser.add_argument('--qa_dir', type=str, default=DEFAULT_QA_DIR)
+    convert_parser.add_argument('--output', type=str, default=DEFAULT_QA_TABLE)
+    convert_parser.add_argument('--datasets', nargs='+', default=DATASETS)
+    convert_parser.add_argument('--categories', nargs='+', default=CATEGORIES)
+
+    stats_parser = subparsers.add_parser('stats', help="Show the content of a QA table")
+    stats_parser.add_argument('--table', type=str, default=DEFAULT_QA_TABLE)
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        table = build_qa_table(args.qa_dir, args.datasets, args.categories)
+        save_qa_table(table, args.output)
+        print(f"Wrote {len(table)} QA pairs to {args.output}")
+    else:
+        print(QADataset.from_parquet(args.table).summary())
+
+
+if __name__ == "__main__":
+    main()
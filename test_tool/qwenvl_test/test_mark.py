@@ -1,19 +1,25 @@
 import os
 import torch
-import csv
 import json
-import gc
 from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor
-from qwen_vl_utils import process_vision_info
 from torch.cuda.amp import autocast
-
-
-def load_model(model_name):
+import argparse
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from inference import local_answer, USAGE_FIELDS, UsageMeter, usage_columns
+from pixel_budget import MIN_PIXELS, MAX_PIXELS, PixelBudgetController, processor_pixel_range
+from response_cache import ResponseCache
+from result_writer import ResultWriter, parse_shard
+from qa_dataset import QADataset
+from keyframes import KeyframeSelector
+from gaze_index import gaze_info_per_frame
+from mark_renderer import MarkRenderer
+
+
+def load_model(model_name, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS):
     model = Qwen2_5_VLForConditionalGeneration.from_pretrained(
         f"/home/pty/Qwen2.5-VL/pretrained/{model_name}", torch_dtype="auto", device_map="auto"
     )
-    min_pixels = 256*28*28
-    max_pixels = 448*28*28
     processor = AutoProcessor.from_pretrained(f"/home/pty/Qwen2.5-VL/pretrained/{model_name}", min_pixels=min_pixels, max_pixels=max_pixels)
     return model, processor
 
@@ -28,99 +34,137 @@ def load_video(image_paths, image_dir, video_id):
 
 datasets = ['egtea']
 categories = ['spatial', 'causal', 'temporal']
-for dataset in datasets:
-    for category in categories:
-        print(f"----Processing {category}_{dataset}----\n")
-        csv_file = f"/home/pty_ssd/EgoEye/qa_pairs/{category}_{dataset}.csv"
+resume = True
+# PixelBudgetController(target_latency_s=...) or (target_tokens=...) picks max_pixels per row; None keeps the fixed budget.
+pixel_budget = None
+# KeyframeSelector(max_frames=4) sends only the gaze keyframes of each group; None sends every frame.
+keyframes = None
+# Marks are drawn on the original frames at evaluation time; set render_marks
+# to False to read the pre-rendered datasets/visual_mark tree instead.
+render_marks = True
+mark_style = {'radius': 20, 'color': (0, 0, 255), 'thickness': 2}
+model_name = 'Qwen2.5-VL-7B-4D_EXO'
+
+
+def evaluate(model, processor, model_name, dataset, category, cache=None, resume=True, shard=None,
+             pixel_budget=None, keyframes=None, renderer=None):
+    """
+    Evaluate one QA file, {category}_{dataset}.csv, with a loaded model.
+
+    Args:
+        renderer: MarkRenderer drawing the marks on the original frames;
+            None reads the pre-rendered datasets/visual_mark tree
+
+    Returns:
+        UsageMeter of the rows evaluated by this call
+    """
+    print(f"----Processing {category}_{dataset}----\n")
+    csv_file = f"/home/pty_ssd/EgoEye/qa_pairs/{category}_{dataset}.csv"
+    narration_json = f"/home/pty_ssd/EgoEye/narrations/{dataset}.json"
+    file_name = os.path.basename(csv_file)
+    new_file = os.path.splitext(file_name)[0]
+    if renderer is not None:
+        image_dir = f"/home/pty_ssd/EgoEye/datasets/{dataset}"
+        output_csv = f"/home/pty_ssd/EgoEye/results/lora_sft/{model_name}-{new_file}-mark_{renderer.tag()}.csv"
+    else:
         image_dir = f"/home/pty_ssd/EgoEye/datasets/visual_mark/{dataset}"
-        model_name = 'Qwen2.5-VL-7B-4D_EXO'
-        file_name = os.path.basename(csv_file)
-        new_file = os.path.splitext(file_name)[0]
         output_csv = f"/home/pty_ssd/EgoEye/results/lora_sft/{model_name}-{new_file}-mark.csv"
     
-        model, processor = load_model(model_name)
-        results = []
+    if keyframes is not None:
+        output_csv = f"{os.path.splitext(output_csv)[0]}-{keyframes.tag()}.csv"
+    result_writer = ResultWriter(output_csv, ['video_id', 'Question', 'Answer Options', 'Model_Answer', 'Reference_Answer'] + USAGE_FIELDS, resume=resume, shard=shard)
+    usage_meter = UsageMeter(os.path.basename(output_csv))
 
     
-        with open(csv_file, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                video_id = row['video_id']
-                question = row['Question']
-                answer_options = row['Answer Options']
-                correct_answer = row['Correct Answer']
-         
-                image_paths = row['group_id'].split("\n")
-                image_files = load_video(image_paths, image_dir, video_id)
-                
-                input_question =("I provide you with a video that contains gaze information. For each frame, the gaze point will be marked on the image with a red heart-shaped circle.\n" 
-                                "Choose the correct option based on the first-person perspective scene question. You must follow these steps to answer the question:\n"
-                                "1.Focus on the objects marked by each red heart-shaped circle.\n"
-                                "2.Observe the video chronological order according to the gaze sequence in step 1.\n"
-                                f"3.Question:\n{question}\nOptions:\n{answer_options}\n"
-                                "Choose the most appropriate option. Return the letter of the correct option.")
-
-         
-                messages = [
+    qa = QADataset.for_file(dataset, category)
+    for index, row in enumerate(qa.iter_rows()):
+        video_id = row['video_id']
+        question = row['question']
+        answer_options = row['answer_options']
+        correct_answer = row['correct_answer']
+        key = row['key']
+        if result_writer.is_done(key):
+            continue
+ 
+        image_paths = row['frames']
+        if keyframes is not None:
+            image_paths = keyframes.select_group(image_paths, gaze_info_per_frame(narration_json, video_id, image_paths))
+        image_files = load_video(image_paths, image_dir, video_id)
+        if renderer is not None:
+            gaze_info_list = gaze_info_per_frame(narration_json, video_id, image_paths)
+            image_files = renderer.render_group(image_files, gaze_info_list)
+        
+        input_question =("I provide you with a video that contains gaze information. For each frame, the gaze point will be marked on the image with a red heart-shaped circle.\n" 
+                        "Choose the correct option based on the first-person perspective scene question. You must follow these steps to answer the question:\n"
+                        "1.Focus on the objects marked by each red heart-shaped circle.\n"
+                        "2.Observe the video chronological order according to the gaze sequence in step 1.\n"
+                        f"3.Question:\n{question}\nOptions:\n{answer_options}\n"
+                        "Choose the most appropriate option. Return the letter of the correct option.")
+
+ 
+        messages = [
+            {
+                "role": "user",
+                "content": [
                     {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "video",
-                                "video": image_files,  
-                            },
-                            {"type": "text", "text": input_question},
-                        ],
-                    }
-                ]
-
-                text = processor.apply_chat_template(
-                    messages, tokenize=False, add_generation_prompt=True, add_vision_id=True
-                )
-                image_inputs, video_inputs = process_vision_info(messages)
-
-                inputs = processor(
-                    text=[text],
-                    images=image_inputs,
-                    videos=video_inputs,
-                    padding=True,
-                    return_tensors="pt",
-                )
-
-                inputs = inputs.to("cuda")
-
-                with torch.no_grad():
-                    generated_ids = model.generate(**inputs, max_new_tokens=128)
-                    generated_ids_trimmed = [
-                        out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-                    ]
-                    output_text = processor.batch_decode(
-                        generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
-                    )
-                    qwenvl_model_answer = output_text[0].strip()
-
-          
-                del inputs, image_inputs, video_inputs
-                torch.cuda.empty_cache()
-                gc.collect()
-
-       
-                print(f'{input_question}\nModel Answer: {qwenvl_model_answer} \nCorrect Answer: {correct_answer}')
-                
-           
-                results.append({
-                    'video_id': video_id,
-                    'Question': question,
-                    'Answer Options': answer_options,
-                    'Model_Answer': qwenvl_model_answer,
-                    'Reference_Answer': correct_answer
-                })
-                break
-
-
-        with open(output_csv, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['video_id', 'Question', 'Answer Options', 'Model_Answer', 'Reference_Answer'])
-            writer.writeheader()
-            writer.writerows(results)
-
-        print(f"Results saved to {output_csv}")
+                        "type": "video",
+                        "video": image_files,  
+                    },
+                    {"type": "text", "text": input_question},
+                ],
+            }
+        ]
+
+        if pixel_budget is not None:
+            messages = pixel_budget.apply(messages)
+        qwenvl_model_answer, usage = local_answer(model, processor, messages, model_name, cache, with_usage=True)
+        usage_meter.add(usage)
+        if pixel_budget is not None:
+            pixel_budget.update(usage)
+
+   
+        print(f'{input_question}\nModel Answer: {qwenvl_model_answer} \nCorrect Answer: {correct_answer}')
+        
+   
+        result_writer.write(key, {
+            'video_id': video_id,
+            'Question': question,
+            'Answer Options': answer_options,
+            'Model_Answer': qwenvl_model_answer,
+            'Reference_Answer': correct_answer,
+            **usage_columns(usage)
+        }, index)
+
+
+    result_writer.finalize()
+    print(usage_meter.summary())
+    usage_meter.save(f"{result_writer.output_csv}.usage.json")
+    if pixel_budget is not None:
+        print(pixel_budget.summary())
+
+    print(f"Results saved to {result_writer.output_csv}")
+    return usage_meter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help="i/N: evaluate only shard i of N (0-based); merge with result_writer.py merge")
+    shard = parser.parse_args().shard
+    cache = ResponseCache()
+    renderer = MarkRenderer(**mark_style) if render_marks else None
+    model, processor = load_model(model_name, *processor_pixel_range(pixel_budget))
+    for dataset in datasets:
+        for category in categories:
+            evaluate(model, processor, model_name, dataset, category, cache, resume, shard,
+                     pixel_budget=pixel_budget, keyframes=keyframes, renderer=renderer)
+
+    print(cache.summary())
+    if keyframes is not None:
+        print(keyframes.summary())
+    if renderer is not None:
+        print(renderer.summary())
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
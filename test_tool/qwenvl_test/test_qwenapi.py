@@ -2,17 +2,28 @@ import os
 import json
 import csv
 import base64
-import pandas as pd
 from openai import OpenAI
+import argparse
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from gaze_trajectory import plot_gaze_trajectory
+from inference import api_answer, USAGE_FIELDS, UsageMeter, usage_columns
+from response_cache import ResponseCache
+from result_writer import ResultWriter, parse_shard
+from qa_dataset import QADataset
+from tracing import traced
+from frame_store import DEFAULT_STORE_ROOT, open_frame_store
+from gaze_index import gaze_info_per_frame
+from foveate import FOVEATED_PROMPT
 
 
-def encode_images_from_folder(base_folder, video_id, group_id):
+def encode_images_from_folder(base_folder, video_id, group_id, frame_store=None):
 
     image_data_list = []
     folder_path = os.path.join(base_folder, video_id)
+    if frame_store is not None:
+        image_path = os.path.join(folder_path, group_id[-1].strip())
+        return frame_store.data_urls(video_id, group_id), image_path
     
     for image_file in group_id:
         image_path = os.path.join(folder_path, image_file.strip())
@@ -25,6 +36,7 @@ def encode_images_from_folder(base_folder, video_id, group_id):
     return image_data_list, image_path
 
 
+@traced("io.gaze_lookup")
 def get_gaze_info_from_json(json_file, video_id, group_id):
     with open(json_file, 'r') as f:
         data = json.load(f)
@@ -49,7 +61,14 @@ def get_gaze_info_from_json(json_file, video_id, group_id):
 
 
 
-def main():
+def main(resume=True, foveator=None, shard=None):
+    """
+    Args:
+        foveator: foveate.Foveator sending a gaze crop plus a low-resolution
+            context per frame instead of the full frames
+        shard: (i, N) from --shard; only the rows of shard i of N are evaluated
+    """
+    cache = ResponseCache()
     datasets = ['egoexo']
     categories = ['temporal']
     for dataset in datasets:
@@ -59,30 +78,38 @@ def main():
             file_path = f"/home/pty_ssd/EgoEye/qa_pairs/{category}_{dataset}.csv"
             file_name = os.path.basename(file_path)
             new_file = os.path.splitext(file_name)[0]
+            output_csv = f"/home/pty_ssd/EgoEye/results/qwenvl_api/{new_file}.csv"
+            if foveator is not None:
+                output_csv = f"{os.path.splitext(output_csv)[0]}-{foveator.tag()}.csv"
             base_folder = f"/home/pty_ssd/EgoEye/datasets/{dataset}"
+            frame_store = open_frame_store(os.path.join(DEFAULT_STORE_ROOT, dataset))
             narration_json = f"/home/pty_ssd/EgoEye/narrations/{dataset}.json"
             api_key = ""  
             base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"  
             
-            df = pd.read_csv(file_path)
+            qa = QADataset.for_file(dataset, category)
             client = OpenAI(api_key=api_key, base_url=base_url)
             
-            results = []
+            result_writer = ResultWriter(output_csv, ["video_id", "question", "answer_options", "model_answer", "reference_answer"] + USAGE_FIELDS, resume=resume, shard=shard)
+            usage_meter = UsageMeter(os.path.basename(output_csv))
 
      
-            for index, row in df.iterrows():
+            for index, row in enumerate(qa.iter_rows()):
                 video_id = row["video_id"]
-                group_id = row["group_id"].split("\n")  
-                question = row["Question"]
-                answer_options = row["Answer Options"]
-                reference = row["Correct Answer"]
+                group_id = row["frames"]
+                question = row["question"]
+                answer_options = row["answer_options"]
+                reference = row["correct_answer"]
+                key = row["key"]
+                if result_writer.is_done(key):
+                    continue
 
                 
-                image_data_list, image_path = encode_images_from_folder(base_folder, video_id, group_id)
+                image_data_list, image_path = encode_images_from_folder(base_folder, video_id, group_id, frame_store)
 
                 
                 if not image_data_list:
-             
+                    result_writer.skip_row(key, index, "no frames", retry=True)
                     continue
 
               
@@ -101,43 +128,53 @@ def main():
 
 
                 
+                video_content = [{"type": "video", "video": image_data_list}]
+                if foveator is not None:
+                    crops, contexts = foveator.render_group_data_urls(
+                        [os.path.join(base_folder, video_id, path.strip()) for path in group_id],
+                        gaze_info_per_frame(narration_json, video_id, group_id))
+                    video_content = foveator.content(crops, contexts)
+                    input_question = FOVEATED_PROMPT + input_question
+
                 try:
-                    completion = client.chat.completions.create(
-                        model="qwen-vl-max-latest",
-                        messages=[
-                            {
-                                "role": "user",
-                                "content": [
-                                    {"type": "image_url", "image_url":{"url":f"data:image/png;base64,{salience_image_base64}"}},
-                                    {"type": "video", "video": image_data_list},
-                                    {"type": "text", "text": input_question}
-                                ]
-                            }
-                        ]
-                    )
-                    model_answer = completion.choices[0].message.content
+                    model_answer, usage = api_answer(client, "qwen-vl-max-latest", [
+                        {"type": "image_url", "image_url":{"url":f"data:image/png;base64,{salience_image_base64}"}},
+                        *video_content,
+                        {"type": "text", "text": input_question}
+                    ], cache, with_usage=True)
+                    api_failed = False
 
                 except Exception as e:
                     model_answer = f"API fail: {e}"
+                    usage = None
+                    api_failed = True
                 
                 # print(f'{input_question}\nModel Answer: {model_answer} \nCorrect Answer: {reference}')
 
-                results.append({
+                usage_meter.add(usage)
+                result_writer.write(key, {
                     "video_id": video_id,
                     "question": question,
                     "answer_options": answer_options,
                     "model_answer": model_answer,
-                    "reference_answer": reference
-                })
+                    "reference_answer": reference,
+                    **usage_columns(usage)
+                }, index, done=not api_failed)
                 
 
 
-            results_df = pd.DataFrame(results)
-            results_df.to_csv(f"/home/pty_ssd/EgoEye/results/qwenvl_api/{new_file}.csv", index=False, encoding="utf-8")
-
+            result_writer.finalize()
+            print(usage_meter.summary())
+            usage_meter.save(f"{result_writer.output_csv}.usage.json")
 
+    print(cache.summary())
+    if foveator is not None:
+        print(foveator.summary())
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help="i/N: evaluate only shard i of N (0-based); merge with result_writer.py merge")
+    main(shard=parser.parse_args().shard)
 
@@ -1,119 +1,165 @@
 import os
 import torch
-import csv
 import json
-import gc
 from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor
-from qwen_vl_utils import process_vision_info
 from torch.cuda.amp import autocast
-
-
-def load_model(model_name):
+import argparse
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from inference import local_answer, USAGE_FIELDS, UsageMeter, usage_columns
+from pixel_budget import MIN_PIXELS, MAX_PIXELS, PixelBudgetController, processor_pixel_range
+from response_cache import ResponseCache
+from result_writer import ResultWriter, parse_shard
+from qa_dataset import QADataset
+from keyframes import KeyframeSelector
+from token_pruning import GazeTokenPruner
+from gaze_index import gaze_info_per_frame
+from frame_store import DEFAULT_STORE_ROOT, open_frame_store
+from resize_cache import resized_dataset_dir, resized_frame_paths
+
+
+def load_model(model_name, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS):
     model = Qwen2_5_VLForConditionalGeneration.from_pretrained(
         f"/home/pty/Qwen2.5-VL/pretrained/{model_name}", torch_dtype="auto", device_map="auto"
     )
-    min_pixels = 256*28*28
-    max_pixels = 448*28*28
     processor = AutoProcessor.from_pretrained(f"/home/pty/Qwen2.5-VL/pretrained/{model_name}", min_pixels=min_pixels, max_pixels=max_pixels)
     return model, processor
 
 
-def load_video(image_paths, image_dir, video_id):
-
+def load_video(image_paths, image_dir, video_id, frame_store=None, resized_dir=None):
+    # Frames pre-resized to the processor budget (resize_cache.py) skip the resize in process_vision_info.
+    resized_files = resized_frame_paths(image_paths, resized_dir, video_id)
+    if resized_files is not None:
+        return resized_files
+    if frame_store is not None:
+        return frame_store.load_video(image_paths, video_id)
     image_files = [os.path.join(image_dir, video_id, path) for path in image_paths]
     return image_files
 
 datasets = ['ego4d', 'egoexo', 'egtea']
 categories = ['spatial', 'causal']
-for dataset in datasets:
-    for category in categories:
-        print(f"----Processing {category}_{dataset}----\n")
-        csv_file = f"/home/pty_ssd/EgoEye/qa_pairs/{category}_{dataset}.csv"
-        image_dir = f"/home/pty_ssd/EgoEye/datasets/{dataset}"
-        model_name = 'Qwen2.5-VL-7B-EGTEA'
-        file_name = os.path.basename(csv_file)
-        new_file = os.path.splitext(file_name)[0]
-        output_csv = f"/home/pty_ssd/EgoEye/results/lora_sft/{model_name}-{new_file}-wo.csv"
+resume = True
+# PixelBudgetController(target_latency_s=...) or (target_tokens=...) picks max_pixels per row; None keeps the fixed budget.
+pixel_budget = None
+# KeyframeSelector(max_frames=4) sends only the gaze keyframes of each group; None sends every frame.
+keyframes = None
+# GazeTokenPruner(keep_ratio=0.25) keeps only the video tokens nearest the gaze before prefill.
+token_pruner = None
+model_name = 'Qwen2.5-VL-7B-EGTEA'
+
+
+def evaluate(model, processor, model_name, dataset, category, cache=None, resume=True, shard=None,
+             pixel_budget=None, keyframes=None, token_pruner=None):
+    """
+    Evaluate one QA file, {category}_{dataset}.csv, with a loaded model.
+
+    Returns:
+        UsageMeter of the rows evaluated by this call
+    """
+    print(f"----Processing {category}_{dataset}----\n")
+    csv_file = f"/home/pty_ssd/EgoEye/qa_pairs/{category}_{dataset}.csv"
+    image_dir = f"/home/pty_ssd/EgoEye/datasets/{dataset}"
+    # Packed frames (frame_store.py pack) are used when present.
+    frame_store = open_frame_store(os.path.join(DEFAULT_STORE_ROOT, dataset))
+    resized_dir = resized_dataset_dir(dataset)
+    file_name = os.path.basename(csv_file)
+    new_file = os.path.splitext(file_name)[0]
+    output_csv = f"/home/pty_ssd/EgoEye/results/lora_sft/{model_name}-{new_file}-wo.csv"
+    narration_json = f"/home/pty_ssd/EgoEye/narrations/{dataset}.json"
     
 
-        model, processor = load_model(model_name)
-        results = []
-
-
-        with open(csv_file, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                video_id = row['video_id']
-                question = row['Question']
-                answer_options = row['Answer Options']
-                correct_answer = row['Correct Answer']
-                
-          
-                image_paths = row['group_id'].split("\n")
-                image_files = load_video(image_paths, image_dir, video_id)
-                
-                input_question = (f"Given the visual sequence and associated question:\n"
-                                f"{question}\nOptions:\n{answer_options}\n"
-                                "Choose the most appropriate option. Return the letter of the correct option.")
-
-                messages = [
+    if keyframes is not None:
+        output_csv = f"{os.path.splitext(output_csv)[0]}-{keyframes.tag()}.csv"
+    if token_pruner is not None:
+        output_csv = f"{os.path.splitext(output_csv)[0]}-{token_pruner.tag()}.csv"
+    result_writer = ResultWriter(output_csv, ['video_id', 'Question', 'Answer Options', 'Model_Answer', 'Reference_Answer'] + USAGE_FIELDS, resume=resume, shard=shard)
+    usage_meter = UsageMeter(os.path.basename(output_csv))
+
+
+    qa = QADataset.for_file(dataset, category)
+    for index, row in enumerate(qa.iter_rows()):
+        video_id = row['video_id']
+        question = row['question']
+        answer_options = row['answer_options']
+        correct_answer = row['correct_answer']
+        key = row['key']
+        if result_writer.is_done(key):
+            continue
+        
+  
+        image_paths = row['frames']
+        if keyframes is not None:
+            image_paths = keyframes.select_group(image_paths, gaze_info_per_frame(narration_json, video_id, image_paths))
+        image_files = load_video(image_paths, image_dir, video_id, frame_store, resized_dir)
+        
+        input_question = (f"Given the visual sequence and associated question:\n"
+                        f"{question}\nOptions:\n{answer_options}\n"
+                        "Choose the most appropriate option. Return the letter of the correct option.")
+
+        messages = [
+            {
+                "role": "user",
+                "content": [
                     {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "video",
-                                "video": image_files, 
-                            },
-                            {"type": "text", "text": input_question},
-                        ],
-                    }
-                ]
-
-          
-                text = processor.apply_chat_template(
-                    messages, tokenize=False, add_generation_prompt=True, add_vision_id=True
-                )
-                image_inputs, video_inputs = process_vision_info(messages)
-
-                inputs = processor(
-                    text=[text],
-                    images=image_inputs,
-                    videos=video_inputs,
-                    padding=True,
-                    return_tensors="pt",
-                )
-
-                inputs = inputs.to("cuda")
+                        "type": "video",
+                        "video": image_files, 
+                    },
+                    {"type": "text", "text": input_question},
+                ],
+            }
+        ]
+
+  
+        if token_pruner is not None:
+            token_pruner.attach_gaze(messages, gaze_info_per_frame(narration_json, video_id, image_paths))
+        if pixel_budget is not None:
+            messages = pixel_budget.apply(messages)
+        qwenvl_model_answer, usage = local_answer(model, processor, messages, model_name, cache, with_usage=True,
+                                                  pruner=token_pruner)
+        usage_meter.add(usage)
+        if pixel_budget is not None:
+            pixel_budget.update(usage)
+
+        result_writer.write(key, {
+            'video_id': video_id,
+            'Question': question,
+            'Answer Options': answer_options,
+            'Model_Answer': qwenvl_model_answer,
+            'Reference_Answer': correct_answer,
+            **usage_columns(usage)
+        }, index)
+
         
-                with torch.no_grad():
-                    generated_ids = model.generate(**inputs, max_new_tokens=128)
-                    generated_ids_trimmed = [
-                        out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-                    ]
-                    output_text = processor.batch_decode(
-                        generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
-                    )
-                    qwenvl_model_answer = output_text[0].strip()
-
-   
-                del inputs, image_inputs, video_inputs
-                torch.cuda.empty_cache()
-                gc.collect()
-
-                results.append({
-                    'video_id': video_id,
-                    'Question': question,
-                    'Answer Options': answer_options,
-                    'Model_Answer': qwenvl_model_answer,
-                    'Reference_Answer': correct_answer
-                })
-
-                
-                
-
-        with open(output_csv, 'w', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['video_id', 'Question', 'Answer Options', 'Model_Answer', 'Reference_Answer'])
-            writer.writeheader()
-            writer.writerows(results)
-
-        print(f"Results saved to {output_csv}")
+        
+
+    result_writer.finalize()
+    print(usage_meter.summary())
+    usage_meter.save(f"{result_writer.output_csv}.usage.json")
+    if pixel_budget is not None:
+        print(pixel_budget.summary())
+
+    print(f"Results saved to {result_writer.output_csv}")
+    return usage_meter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help="i/N: evaluate only shard i of N (0-based); merge with result_writer.py merge")
+    shard = parser.parse_args().shard
+    cache = ResponseCache()
+    model, processor = load_model(model_name, *processor_pixel_range(pixel_budget))
+    for dataset in datasets:
+        for category in categories:
+            evaluate(model, processor, model_name, dataset, category, cache, resume, shard,
+                     pixel_budget=pixel_budget, keyframes=keyframes, token_pruner=token_pruner)
+
+    print(cache.summary())
+    if keyframes is not None:
+        print(keyframes.summary())
+    if token_pruner is not None:
+        print(token_pruner.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pixel_budget import MIN_PIXELS, MAX_PIXELS, resize_to_budget
+
+
+DEFAULT_RESIZE_ROOT = "/home/pty_ssd/EgoEye/cache/resized"
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def budget_key(min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS):
+    return f"{min_pixels}_{max_pixels}"
+
+
+def resized_dataset_dir(dataset, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS, root=DEFAULT_RESIZE_ROOT):
+    """Folder holding the frames of a dataset pre-resized for one processor pixel budget."""
+    return os.path.join(root, budget_key(min_pixels, max_pixels), dataset)
+
+
+def resize_frame(src_path, dst_path, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS, quality=95):
+    """Resize one frame to its processor target size and write it atomically."""
+    from PIL import Image
+
+    with Image.open(src_path) as image:
+        resized = resize_to_budget(image.convert('RGB'), min_pixels, max_pixels)
+    ext = os.path.splitext(dst_path)[1]
+    tmp_path = f"{dst_path}.tmp{os.getpid()}{ext}"
+    if ext.lower() == '.png':
+        resized.save(tmp_path)
+    else:
+        resized.save(tmp_path, format='JPEG', quality=quality)
+    os.replace(tmp_path, dst_path)
+
+
+def resize_video(src_dir, dst_dir, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS, quality=95, force=False):
+    """
+    Pre-resize every frame of one video, skipping outputs newer than their source.
+
+    Sub-folders are walked and mirrored, so nested group_id frames
+    ("<uid>/123.jpg" for ego4d and egoexo) keep their relative path.
+
+    Returns:
+        (frames written, frames skipped)
+    """
+    written = skipped = 0
+    for root, dirs, files in os.walk(src_dir):
+        dirs.sort()
+        out_dir = os.path.join(dst_dir, os.path.relpath(root, src_dir))
+        os.makedirs(out_dir, exist_ok=True)
+        for image_name in sorted(files):
+            if not image_name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            src_path = os.path.join(root, image_name)
+            dst_path = os.path.join(out_dir, image_name)
+            if not force and os.path.exists(dst_path) and os.stat(dst_path).st_mtime >= os.stat(src_path).st_mtime:
+                skipped += 1
+                continue
+            resize_frame(src_path, dst_path, min_pixels, max_pixels, quality)
+            written += 1
+    return written, skipped
+
+
+def build_resize_cache(image_dir, cache_dir, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS, quality=95,
+                       workers=None, force=False):
+    """Pre-resize a <image_dir>/<video_id>/<frame> tree into cache_dir, one process per video at a time."""
+    video_ids = sorted(v for v in os.listdir(image_dir) if os.path.isdir(os.path.join(image_dir, v)))
+    start = time.time()
+    written = skipped = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(resize_video, os.path.join(image_dir, video_id), os.path.join(cache_dir, video_id),
+                            min_pixels, max_pixels, quality, force): video_id
+            for video_id in video_ids
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            video_written, video_skipped = future.result()
+            written += video_written
+            skipped += video_skipped
+            print(f"[{done}/{len(futures)}] {futures[future]}: {video_written} resized, {video_skipped} up to date")
+    elapsed = time.time() - start
+    print(f"{written} frames resized, {skipped} up to date in {elapsed:.1f}s "
+          f"({written / max(elapsed, 1e-9):.1f} frames/s)")
+    return written, skipped
+
+
+def resized_frame_paths(image_paths, cache_dir, video_id):
+    """
+    Pre-resized paths of the frames of one QA group.
+
+    Returns:
+        List of paths, or None unless every frame of the group is in the cache
+    """
+    if cache_dir is None:
+        return None
+    image_files = [os.path.join(cache_dir, video_id, path.strip()) for path in image_paths]
+    if all(os.path.exists(image_file) for image_file in image_files):
+        return image_files
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-resize frames to the processor pixel budget")
+    parser.add_argument('--datasets', nargs='+', default=['ego4d', 'egoexo', 'egtea'])
+    parser.add_argument('--image_root', type=str, default="/home/pty_ssd/EgoEye/datasets")
+    parser.add_argument('--cache_root', type=str, default=DEFAULT_RESIZE_ROOT)
+    parser.add_argument('--min_pixels', type=int, default=MIN_PIXELS)
+    parser.add_argument('--max_pixels', type=int, default=MAX_PIXELS)
+    parser.add_argument('--quality', type=int, default=95, help="JPEG quality of the resized frames")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--force', action='store_true', help="Resize frames that are up to date")
+    args = parser.parse_args()
+
+    for dataset in args.datasets:
+        cache_dir = resized_dataset_dir(dataset, args.min_pixels, args.max_pixels, args.cache_root)
+        print(f"----Resizing {dataset} to {budget_key(args.min_pixels, args.max_pixels)} -> {cache_dir}----")
+        build_resize_cache(os.path.join(args.image_root, dataset), cache_dir, args.min_pixels, args.max_pixels,
+                           args.quality, args.workers, args.force)
+
+
+if __name__ == "__main__":
+    main()
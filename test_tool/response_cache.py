@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+from tracing import span
+
+
+DEFAULT_CACHE_PATH = "/home/pty_ssd/EgoEye/cache/responses.sqlite"
+
+MEDIA_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.mp4', '.avi', '.mov', '.mkv')
+
+_file_digests = {}
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(path):
+    """
+    Content hash of a file, memoized on (path, size, mtime) so frames shared by
+    many rows are only read once per process.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    digest = _file_digests.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        digest = h.hexdigest()
+        _file_digests[memo_key] = digest
+    return digest
+
+
+def _canonicalize(value):
+    """Replace every piece of visual content in a message tree by its content hash."""
+    if isinstance(value, dict):
+        return {str(k): _canonicalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonicalize(v) for v in value]
+    if isinstance(value, str):
+        if value.startswith('data:'):
+            return {'data_sha256': _sha256(value.encode('utf-8'))}
+        if value.lower().endswith(MEDIA_EXTENSIONS) and os.path.isfile(value):
+            return {'file_sha256': file_digest(value)}
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'bytes_sha256': _sha256(bytes(value))}
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    # PIL images and numpy arrays are hashed on their raw pixels.
+    if hasattr(value, 'tobytes'):
+        shape = getattr(value, 'shape', None) or getattr(value, 'size', None)
+        mode = getattr(value, 'mode', None) or str(getattr(value, 'dtype', ''))
+        return {'pixels_sha256': _sha256(value.tobytes()), 'shape': list(shape or []), 'mode': mode}
+    return repr(value)
+
+
+def hash_messages(messages):
+    """
+    Canonical hash of a chat message list.
+
+    Text is hashed verbatim; images and videos (file paths, data URIs, PIL images
+    or arrays) are replaced by the hash of their content, so renaming a frame
+    folder keeps the cache valid while re-rendering a frame invalidates it.
+    """
+    canonical = json.dumps(_canonicalize(messages), sort_keys=True, ensure_ascii=False)
+    return _sha256(canonical.encode('utf-8'))
+
+
+def make_key(model_id, messages, params=None):
+    """
+    Cache key for one inference request.
+
+    Args:
+        model_id: Model identifier (checkpoint name or API model name)
+        messages: Chat messages sent to the model
+        params: Decoding / preprocessing parameters that affect the output
+
+    Returns:
+        Hex digest identifying the request
+    """
+    payload = json.dumps({
+        'model': model_id,
+        'messages': hash_messages(messages),
+        'params': params or {},
+    }, sort_keys=True)
+    return _sha256(payload.encode('utf-8'))
+
+
+class ResponseCache:
+    """
+    SQLite-backed store of model responses keyed by make_key().
+
+    WAL journaling lets several evaluation processes share one cache file.
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH):
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_model ON responses (model)")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(responses)")}
+        if 'usage' not in columns:
+            # Token usage of the original request (JSON), added after the first release of the cache.
+            self.conn.execute("ALTER TABLE responses ADD COLUMN usage TEXT")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS stats ("
+            "model TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0, misses INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, model_id, messages, params=None):
+        return make_key(model_id, messages, params)
+
+    def get(self, key, model_id=None):
+        return self.get_record(key, model_id)[0]
+
+    def get_record(self, key, model_id=None):
+        """(response, usage dictionary or None) of a key, (None, None) on a miss."""
+        row = self.conn.execute("SELECT response, usage FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        if model_id is not None:
+            column = 'misses' if row is None else 'hits'
+            self.conn.execute("INSERT OR IGNORE INTO stats (model) VALUES (?)", (model_id,))
+            self.conn.execute(f"UPDATE stats SET {column} = {column} + 1 WHERE model = ?", (model_id,))
+            self.conn.commit()
+        if row is None:
+            return None, None
+        return row[0], json.loads(row[1]) if row[1] else None
+
+    def put(self, key, model_id, response, usage=None):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, response, created, usage) VALUES (?, ?, ?, ?, ?)",
+            (key, model_id, response, time.time(), json.dumps(usage) if usage is not None else None),
+        )
+        self.conn.commit()
+
+    def get_or_compute(self, model_id, messages, params, compute, with_usage=False):
+        """
+        Return the cached response for a request, or call compute() and store its result.
+
+        Exceptions raised by compute() propagate and nothing is stored, so failed
+        API calls are retried on the next run. A None response (a refusal or a
+        reply without text) is returned as "" and not stored either.
+
+        With with_usage, compute() returns (response, usage) and so does this
+        method; the usage of a cache hit is the one stored with the response,
+        marked cached=True and with the lookup time as latency.
+        """
+        start = time.perf_counter()
+        with span("cache.lookup"):
+            key = self.make_key(model_id, messages, params)
+            response, usage = self.get_record(key, model_id)
+        if response is not None:
+            if not with_usage:
+                return response
+            usage = dict(usage or {}, cached=True, latency_s=time.perf_counter() - start)
+            return response, usage
+        if with_usage:
+            response, usage = compute()
+        else:
+            response, usage = compute(), None
+        if response is None:
+            return ("", usage) if with_usage else ""
+        with span("cache.store"):
+            self.put(key, model_id, response, usage)
+        return (response, usage) if with_usage else response
+
+    def invalidate(self, model_id=None, before=None):
+        """
+        Delete cached responses.
+
+        Args:
+            model_id: Only delete entries of this model (default: all models)
+            before: Only delete entries created before this UNIX timestamp
+
+        Returns:
+            Number of deleted entries
+        """
+        clauses, args = [], []
+        if model_id is not None:
+            clauses.append("model = ?")
+            args.append(model_id)
+        if before is not None:
+            clauses.append("created < ?")
+            args.append(before)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        deleted = self.conn.execute(f"DELETE FROM responses{where}", args).rowcount
+        if model_id is None and before is None:
+            self.conn.execute("DELETE FROM stats")
+        elif model_id is not None and before is None:
+            self.conn.execute("DELETE FROM stats WHERE model = ?", (model_id,))
+        self.conn.commit()
+        return deleted
+
+    def stats(self):
+        """Per-model entry counts and cumulative hit/miss counters."""
+        entries = dict(self.conn.execute("SELECT model, COUNT(*) FROM responses GROUP BY model").fetchall())
+        counters = {model: (hits, misses) for model, hits, misses in
+                    self.conn.execute("SELECT model, hits, misses FROM stats").fetchall()}
+        report = {}
+        for model in sorted(set(entries) | set(counters)):
+            hits, misses = counters.get(model, (0, 0))
+            report[model] = {'entries': entries.get(model, 0), 'hits': hits, 'misses': misses}
+        return report
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"Response cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the inference response cache")
+    parser.add_argument('--db', type=str, default=DEFAULT_CACHE_PATH, help="Path to the cache database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help="Show entries and hit/miss counters per model")
+    invalidate_parser = subparsers.add_parser('invalidate', help="Delete cached responses")
+    invalidate_parser.add_argument('--model', type=str, default=None, help="Only delete entries of this model")
+    invalidate_parser.add_argument('--older_than_days', type=float, default=None,
+                                   help="Only delete entries older than this many days")
+    invalidate_parser.add_argument('--all', action='store_true', help="Delete every entry")
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.db)
+    if args.command == 'stats':
+        report = cache.stats()
+        if not report:
+            print(f"{args.db} is empty")
+        for model, counts in report.items():
+            lookups = counts['hits'] + counts['misses']
+            rate = counts['hits'] / lookups * 100 if lookups else 0.0
+            print(f"{model}: {counts['entries']} entries, {counts['hits']} hits, "
+                  f"{counts['misses']} misses ({rate:.1f}% hit rate)")
+    else:
+        if args.model is None and args.older_than_days is None and not args.all:
+            parser.error("invalidate needs --model, --older_than_days or --all")
+        before = None
+        if args.older_than_days is not None:
+            before = time.time() - args.older_than_days * 86400
+        deleted = cache.invalidate(model_id=args.model, before=before)
+        print(f"Deleted {deleted} cached responses from {args.db}")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+import os
+import csv
+import json
+import hashlib
+import argparse
+from tracing import traced
+from gaze_index import group_frame_numbers
+
+
+# Column of the final CSVs holding row_key(), so results of different runs can be paired row by row.
+ROW_KEY_FIELD = 'row_key'
+
+
+def row_key(*fields):
+    """
+    Stable key of one QA row, e.g. row_key(video_id, group_id, question).
+
+    The key only depends on the row content, so it survives reordering of the
+    QA file and is identical across processes and machines.
+    """
+    joined = "\x1f".join(str(field).strip() for field in fields)
+    return hashlib.sha1(joined.encode('utf-8')).hexdigest()
+
+
+def parse_shard(spec):
+    """
+    Parse a "--shard i/N" value (0 <= i < N) into (i, N).
+
+    Raises argparse.ArgumentTypeError so it can be used as an argparse type.
+    """
+    try:
+        index, count = (int(part) for part in str(spec).split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like i/N, got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in [0, {count}), got {spec!r}")
+    return index, count
+
+
+def shard_of(key, num_shards):
+    """Shard of a row key: a hash of the row content, so every process computes the same partition."""
+    return int(key[:16], 16) % num_shards
+
+
+def shard_path(output_csv, shard):
+    """Output CSV of one shard, e.g. results.csv -> results.shard2of8.csv; output_csv itself without a shard."""
+    if shard is None:
+        return output_csv
+    base, ext = os.path.splitext(output_csv)
+    return f"{base}.shard{shard[0]}of{shard[1]}{ext}"
+
+
+def read_progress(progress_path):
+    """
+    Read the records of a progress file.
+
+    A partially written last line (the process died mid-write) is ignored.
+
+    Returns:
+        Dictionary mapping row key to {"index": int, "row": dict, "done": bool,
+        "skipped": reason or None}; later records of the same key replace earlier ones
+    """
+    records = {}
+    if not os.path.exists(progress_path):
+        return records
+    with open(progress_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record['key']] = {
+                'index': record['index'], 'row': record['row'], 'done': record.get('done', True),
+                'skipped': record.get('skipped'),
+            }
+    return records
+
+
+def record_row(key, record):
+    """Result row of a progress record with its row key in the ROW_KEY_FIELD column."""
+    return {**record['row'], ROW_KEY_FIELD: key}
+
+
+def result_rows(records):
+    """Result rows of progress records in QA file order, leaving out skipped rows."""
+    ordered = sorted(records.items(), key=lambda item: item[1]['index'])
+    return [record_row(key, record) for key, record in ordered if not record['skipped']]
+
+
+def write_csv_atomic(output_csv, fieldnames, rows):
+    """Write rows to output_csv through a temporary file so readers never see a half-written CSV."""
+    output_dir = os.path.dirname(os.path.abspath(output_csv))
+    os.makedirs(output_dir, exist_ok=True)
+    tmp_path = f"{output_csv}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, output_csv)
+
+
+class ResultWriter:
+    """
+    Append-only, row-by-row result log with resume support.
+
+    Every finished row is appended to "<output_csv>.progress.jsonl" and flushed
+    to disk immediately. With resume=True rows already present in that file are
+    reported by is_done() and can be skipped. finalize() writes output_csv with
+    the usual columns plus ROW_KEY_FIELD, ordered by the row position in the QA file.
+
+    Rows that can never be answered (no gaze) are logged with skip_row(): they
+    count as done for resume and merge_shards() but are left out of the CSV.
+    Rows whose inputs are missing from this machine (clip not cut, frames not
+    extracted) use skip_row(..., retry=True): they are evaluated again on
+    resume and merge_shards() reports them as not done.
+
+    With shard=(i, N) the writer logs to shard_path(output_csv, shard) and
+    is_done() also reports the rows of the other N - 1 shards, so N processes
+    running the same script with different shards evaluate disjoint rows;
+    merge_shards() reassembles output_csv.
+    """
+
+    def __init__(self, output_csv, fieldnames, resume=True, shard=None):
+        self.shard = shard
+        output_csv = shard_path(output_csv, shard)
+        self.output_csv = output_csv
+        self.fieldnames = list(fieldnames) + ([ROW_KEY_FIELD] if ROW_KEY_FIELD not in fieldnames else [])
+        self.progress_path = f"{output_csv}.progress.jsonl"
+        os.makedirs(os.path.dirname(os.path.abspath(output_csv)), exist_ok=True)
+        if not resume and os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
+        self.done = {key for key, record in read_progress(self.progress_path).items() if record['done']}
+        self.skipped = 0
+        self.unanswerable = 0
+        self.other_shards = 0
+        self.written = 0
+        self.file = open(self.progress_path, 'a', encoding='utf-8')
+        if self.file.tell() > 0:
+            # Terminate a line cut off by a crash so the next record starts cleanly.
+            with open(self.progress_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self.file.write("\n")
+        if self.done:
+            print(f"Resuming {output_csv}: {len(self.done)} rows already done")
+
+    def is_done(self, key):
+        """True for rows that need no work here: already done, or owned by another shard."""
+        if self.shard is not None and shard_of(key, self.shard[1]) != self.shard[0]:
+            self.other_shards += 1
+            return True
+        if key in self.done:
+            self.skipped += 1
+            return True
+        return False
+
+    @traced("io.write_result")
+    def write(self, key, row, index, done=True):
+        """
+        Append one finished row.
+
+        Args:
+            key: Stable row key, see row_key()
+            row: Result dictionary with the output CSV columns
+            index: Position of the row in the QA file, used to order the final CSV
+            done: False for rows that should be retried on resume (e.g. failed API
+                calls); they still appear in the final CSV until replaced
+        """
+        record = {'key': key, 'index': int(index), 'row': row, 'done': done}
+        self.file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        if done:
+            self.done.add(key)
+        self.written += 1
+
+    def skip_row(self, key, index, reason, retry=False):
+        """
+        Log a row that cannot be evaluated, e.g. skip_row(key, index, "no gaze").
+
+        The row is not written to the final CSV. It is retried on resume only
+        with retry=True, for inputs that may appear later (e.g. "no clip").
+        """
+        record = {'key': key, 'index': int(index), 'row': None, 'done': not retry, 'skipped': reason}
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        if not retry:
+            self.done.add(key)
+        self.unanswerable += 1
+
+    @traced("io.finalize_csv")
+    def finalize(self):
+        """Close the progress log and write the final CSV from it."""
+        self.file.close()
+        records = read_progress(self.progress_path)
+        rows = result_rows(records)
+        write_csv_atomic(self.output_csv, self.fieldnames, rows)
+        shard_note = f", {self.other_shards} rows left to other shards" if self.shard is not None else ""
+        skip_note = f", {self.unanswerable} rows skipped" if self.unanswerable else ""
+        print(f"{self.written} new rows, {self.skipped} resumed rows{shard_note}{skip_note}")
+        return rows
+
+
+def merge_shards(output_csv, num_shards, fieldnames=None, expected_keys=None):
+    """
+    Reassemble the shard logs of output_csv into output_csv, in QA file order.
+
+    Completeness is verified before anything is written: every shard log must
+    exist, every row must be done (no failed API calls left to retry), every
+    key must sit in the shard shard_of() assigns it to and appear only once,
+    and, when expected_keys is given, every expected key must be present.
+    Rows logged with ResultWriter.skip_row() cover their key but are not
+    written to output_csv.
+
+    Args:
+        output_csv: Unsharded output path the shards were derived from
+        num_shards: N of the --shard i/N runs
+        fieldnames: CSV columns (default: header of the first shard CSV)
+        expected_keys: Optional row keys the merged result must cover
+
+    Returns:
+        (merged rows, list of problems); nothing is written if there are problems
+    """
+    problems = []
+    records = {}
+    for index in range(num_shards):
+        progress_path = f"{shard_path(output_csv, (index, num_shards))}.progress.jsonl"
+        if not os.path.exists(progress_path):
+            problems.append(f"shard {index}/{num_shards}: missing {progress_path}")
+            continue
+        shard_records = read_progress(progress_path)
+        pending = sum(1 for record in shard_records.values() if not record['done'])
+        if pending:
+            problems.append(f"shard {index}/{num_shards}: {pending} rows not done")
+        misplaced = sum(1 for key in shard_records if shard_of(key, num_shards) != index)
+        if misplaced:
+            problems.append(f"shard {index}/{num_shards}: {misplaced} rows belong to another shard")
+        duplicates = len(records.keys() & shard_records.keys())
+        if duplicates:
+            problems.append(f"shard {index}/{num_shards}: {duplicates} rows already in another shard")
+        records.update(shard_records)
+    if expected_keys is not None:
+        missing = set(expected_keys) - records.keys()
+        if missing:
+            problems.append(f"{len(missing)} of {len(set(expected_keys))} expected rows missing")
+
+    rows = result_rows(records)
+    if problems:
+        return rows, problems
+    if fieldnames is None:
+        first_csv = shard_path(output_csv, (0, num_shards))
+        if os.path.exists(first_csv):
+            with open(first_csv, 'r', newline='', encoding='utf-8') as f:
+                fieldnames = next(csv.reader(f), None)
+        fieldnames = fieldnames or (list(rows[0]) if rows else [])
+    if ROW_KEY_FIELD not in fieldnames:
+        fieldnames = list(fieldnames) + [ROW_KEY_FIELD]
+    write_csv_atomic(output_csv, fieldnames, rows)
+    return rows, problems
+
+
+def qa_row_keys(qa_csv, key_columns=('video_id', 'group_id', 'Question')):
+    """
+    Row keys of the rows of a QA CSV the qwenvl_test and prompt_gazees scripts evaluate.
+
+    Rows whose group_id has a malformed frame name are left out, as
+    qa_dataset.read_qa_csv() drops them (gaze_index.group_frame_numbers()).
+    """
+    dataset = os.path.splitext(os.path.basename(qa_csv))[0].partition('_')[2]
+    with open(qa_csv, 'r', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    missing = [column for column in key_columns if rows and column not in rows[0]]
+    if missing:
+        raise ValueError(f"{qa_csv} has no {missing} columns; clip QA files need --qa_json")
+    rows = [row for row in rows if group_frame_numbers(row['group_id'].split('\n'), dataset) is not None]
+    return [row_key(*(row[column] for column in key_columns)) for row in rows]
+
+
+def qa_json_row_keys(qa_json):
+    """Row keys of every QA of a clip QA JSON ({video_id: [{"clip_name", "question", ...}]}), as multiframes/test_qwenapi.py computes them."""
+    with open(qa_json, 'r', encoding='utf-8') as f:
+        qa_data = json.load(f)
+    return [row_key(video_id, qa['clip_name'], qa['question']) for video_id, qa_list in qa_data.items() for qa in qa_list]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the shard outputs of a --shard i/N evaluation")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    merge_parser = subparsers.add_parser('merge', help="Reassemble and verify the shards of one output CSV")
+    merge_parser.add_argument('--output_csv', type=str, required=True, help="Unsharded output path of the script")
+    merge_parser.add_argument('--num_shards', type=int, required=True)
+    expected = merge_parser.add_mutually_exclusive_group()
+    expected.add_argument('--qa_csv', type=str, default=None,
+                          help="QA pairs CSV every row of which must be in the merged result")
+    expected.add_argument('--qa_json', type=str, default=None,
+                          help="Clip QA JSON (multiframes) every QA of which must be in the merged result")
+    args = parser.parse_args()
+
+    expected_keys = None
+    if args.qa_csv:
+        expected_keys = qa_row_keys(args.qa_csv)
+    elif args.qa_json:
+        expected_keys = qa_json_row_keys(args.qa_json)
+    rows, problems = merge_shards(args.output_csv, args.num_shards, expected_keys=expected_keys)
+    if problems:
+        for problem in problems:
+            print(problem)
+        print(f"Not merged: {len(problems)} problems in the {args.num_shards} shards of {args.output_csv}")
+        raise SystemExit(1)
+    print(f"Merged {len(rows)} rows from {args.num_shards} shards into {args.output_csv}")
+
+
+if __name__ == "__main__":
+    main()
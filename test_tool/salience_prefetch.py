@@ -0,0 +1,104 @@
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from gaze_trajectory import plot_gaze_trajectory
+
+
+def render_salience(image_path, gaze_info_list):
+    """plot_gaze_trajectory() in a pool process, returning (salience_image_base64, seconds spent rendering)."""
+    start = time.time()
+    salience_image_base64 = plot_gaze_trajectory(image_path, gaze_info_list)
+    return salience_image_base64, time.time() - start
+
+
+class SaliencePrefetcher:
+    """
+    Renders the salience maps of upcoming rows in a background process pool.
+
+    iter_rendered() keeps at most lookahead renders in flight, the one of the
+    next row to evaluate included, so the CPU draws the next maps while the
+    GPU answers the current one. The main loop only blocks when a map is not ready yet; that
+    wait is the part of the rendering that was not hidden. With workers=0 the
+    maps are rendered inline, as without the prefetcher.
+
+    The pool uses spawned processes: the evaluation process holds CUDA state
+    that must not be forked. It is started on first use and kept across QA
+    files until close().
+
+    Example:
+        prefetcher = SaliencePrefetcher(lookahead=8, workers=4)
+        for row, salience_image_base64 in prefetcher.iter_rendered(rows, lambda row: (row['image_files'][-1], row['gaze_info_list'])):
+            ...
+        print(prefetcher.summary())
+    """
+
+    def __init__(self, lookahead=8, workers=4):
+        self.lookahead = max(1, lookahead)
+        self.workers = workers
+        self.executor = None
+        self.rendered = 0
+        self.render_s = 0.0
+        self.wait_s = 0.0
+        self.elapsed_s = 0.0
+
+    def _submit(self, image_path, gaze_info_list):
+        if not self.workers:
+            return (image_path, gaze_info_list)
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self.executor.submit(render_salience, image_path, gaze_info_list)
+
+    def _result(self, pending):
+        start = time.time()
+        if self.workers:
+            salience_image_base64, render_s = pending.result()
+        else:
+            salience_image_base64, render_s = render_salience(*pending)
+        self.wait_s += time.time() - start
+        self.render_s += render_s
+        self.rendered += 1
+        return salience_image_base64
+
+    def iter_rendered(self, items, render_args):
+        """
+        Yield (item, salience_image_base64) for items, in order.
+
+        Args:
+            items: Iterable of rows to evaluate, consumed at most lookahead items ahead
+            render_args: Function of an item returning the (image_path, gaze_info_list)
+                arguments of plot_gaze_trajectory()
+        """
+        window = deque()
+        start = time.time()
+        try:
+            for item in items:
+                window.append((item, self._submit(*render_args(item))))
+                if len(window) >= self.lookahead:
+                    item, pending = window.popleft()
+                    yield item, self._result(pending)
+            while window:
+                item, pending = window.popleft()
+                yield item, self._result(pending)
+        finally:
+            for _, pending in window:
+                if self.workers:
+                    pending.cancel()
+            self.elapsed_s += time.time() - start
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def summary(self):
+        hidden = max(self.render_s - self.wait_s, 0.0)
+        rate = hidden / self.render_s * 100 if self.render_s else 0.0
+        text = (f"Salience prefetch ({self.workers} workers, look-ahead {self.lookahead}): {self.rendered} maps, "
+                f"{self.render_s:.1f}s rendering, {self.wait_s:.1f}s waited by the main loop ({rate:.0f}% hidden)")
+        if self.elapsed_s > 0 and self.rendered:
+            # Rendering inline would have added the hidden seconds to the wall time of the loop.
+            inline_s = self.elapsed_s + hidden
+            text += (f", {self.rendered / self.elapsed_s:.3f} rows/s vs ~{self.rendered / inline_s:.3f} inline "
+                     f"(x{inline_s / self.elapsed_s:.2f})")
+        return text
@@ -0,0 +1,184 @@
+import os
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from scipy.stats import binom
+
+from caculate import load_result_file, load_results
+
+
+# Result CSVs written by result_writer carry the row_key of each QA row. Older
+# files fall back to these columns; rows repeating them are paired in file order.
+FALLBACK_KEY_COLUMNS = ['video_id', 'question', 'answer_options']
+
+
+def _resample_chunks(n, n_resamples, rng, max_elements=5_000_000):
+    """Yield bootstrap index matrices of shape (chunk, n) whose total row count is n_resamples."""
+    chunk = max(1, min(n_resamples, max_elements // max(n, 1)))
+    done = 0
+    while done < n_resamples:
+        rows = min(chunk, n_resamples - done)
+        yield rng.integers(0, n, size=(rows, n), dtype=np.int32)
+        done += rows
+
+
+def bootstrap_means(outcomes, n_resamples=10000, seed=0):
+    """
+    Bootstrap distribution of the mean of one or more aligned outcome vectors.
+
+    All vectors are resampled with the same index matrix, so for two systems
+    answering the same questions the resamples stay paired.
+
+    Args:
+        outcomes: Array of shape (k, n) with 0/1 correctness of k systems on n questions
+        n_resamples: Number of bootstrap resamples
+        seed: Random seed
+
+    Returns:
+        Array of shape (k, n_resamples) with resampled accuracies
+    """
+    outcomes = np.atleast_2d(np.asarray(outcomes, dtype=np.float32))
+    n = outcomes.shape[1]
+    rng = np.random.default_rng(seed)
+    means = [outcomes[:, idx].mean(axis=2) for idx in _resample_chunks(n, n_resamples, rng)]
+    return np.concatenate(means, axis=1)
+
+
+def bootstrap_ci(correct, n_resamples=10000, alpha=0.05, seed=0):
+    """Accuracy (%) and its percentile bootstrap confidence interval."""
+    correct = np.asarray(correct, dtype=np.float32)
+    means = bootstrap_means(correct, n_resamples, seed)[0]
+    low, high = np.percentile(means, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return correct.mean() * 100, low * 100, high * 100
+
+
+def mcnemar_test(correct_a, correct_b):
+    """
+    Exact McNemar test on paired correctness vectors.
+
+    Returns:
+        (questions only A got right, questions only B got right, two-sided p-value)
+    """
+    correct_a = np.asarray(correct_a, dtype=bool)
+    correct_b = np.asarray(correct_b, dtype=bool)
+    only_a = int(np.sum(correct_a & ~correct_b))
+    only_b = int(np.sum(~correct_a & correct_b))
+    discordant = only_a + only_b
+    if discordant == 0:
+        return only_a, only_b, 1.0
+    p_value = min(1.0, 2 * binom.cdf(min(only_a, only_b), discordant, 0.5))
+    return only_a, only_b, float(p_value)
+
+
+def paired_bootstrap(correct_a, correct_b, n_resamples=10000, alpha=0.05, seed=0):
+    """
+    Paired bootstrap of the accuracy difference A - B.
+
+    Returns:
+        (difference in points, CI low, CI high, two-sided p-value)
+    """
+    outcomes = np.stack([np.asarray(correct_a, dtype=np.float32), np.asarray(correct_b, dtype=np.float32)])
+    means = bootstrap_means(outcomes, n_resamples, seed)
+    diffs = means[0] - means[1]
+    low, high = np.percentile(diffs, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    p_value = min(1.0, 2 * min(np.mean(diffs <= 0), np.mean(diffs >= 0)))
+    diff = outcomes[0].mean() - outcomes[1].mean()
+    return diff * 100, low * 100, high * 100, float(p_value)
+
+
+def pair_key_columns(df_a, df_b):
+    """Columns identifying a QA row in both tables: row_key when both have it, else FALLBACK_KEY_COLUMNS."""
+    if 'row_key' in df_a.columns and 'row_key' in df_b.columns \
+            and df_a['row_key'].notna().all() and df_b['row_key'].notna().all():
+        return ['row_key']
+    return [column for column in FALLBACK_KEY_COLUMNS if column in df_a.columns and column in df_b.columns]
+
+
+def pair_results(df_a, df_b):
+    """
+    Join two result tables on the QA row identity and return aligned correctness vectors.
+
+    No row is dropped: rows sharing a key (e.g. a template question asked on
+    several frame groups of one video in files without row_key) are matched by
+    their order of occurrence within the key.
+    """
+    key_columns = pair_key_columns(df_a, df_b)
+    a = df_a[key_columns + ['correct']].assign(occurrence=df_a.groupby(key_columns).cumcount())
+    b = df_b[key_columns + ['correct']].assign(occurrence=df_b.groupby(key_columns).cumcount())
+    joined = a.merge(b, on=key_columns + ['occurrence'], suffixes=('_a', '_b'))
+    return joined['correct_a'].to_numpy(), joined['correct_b'].to_numpy()
+
+
+def compare(df_a, df_b, n_resamples=10000, alpha=0.05, seed=0):
+    """All statistics for one pair of result tables as a flat dictionary."""
+    correct_a, correct_b = pair_results(df_a, df_b)
+    n = len(correct_a)
+    if n == 0:
+        return {'n': 0}
+    acc_a, low_a, high_a = bootstrap_ci(correct_a, n_resamples, alpha, seed)
+    acc_b, low_b, high_b = bootstrap_ci(correct_b, n_resamples, alpha, seed)
+    diff, diff_low, diff_high, p_bootstrap = paired_bootstrap(correct_a, correct_b, n_resamples, alpha, seed)
+    only_a, only_b, p_mcnemar = mcnemar_test(correct_a, correct_b)
+    return {
+        'n': n,
+        'acc_a': round(acc_a, 2), 'ci_a': f"[{low_a:.2f}, {high_a:.2f}]",
+        'acc_b': round(acc_b, 2), 'ci_b': f"[{low_b:.2f}, {high_b:.2f}]",
+        'diff': round(diff, 2), 'ci_diff': f"[{diff_low:.2f}, {diff_high:.2f}]",
+        'only_a': only_a, 'only_b': only_b,
+        'p_bootstrap': round(p_bootstrap, 4), 'p_mcnemar': round(p_mcnemar, 4),
+    }
+
+
+def compare_grid(df, n_resamples=10000, alpha=0.05, seed=0):
+    """
+    Compare every pair of strategies within each (model, dataset, category) cell.
+
+    Args:
+        df: Output of caculate.load_results()
+
+    Returns:
+        DataFrame with one row per strategy pair and cell
+    """
+    rows = []
+    for (model, dataset, category), cell in df.groupby(['model', 'dataset', 'category']):
+        strategies = sorted(cell['strategy'].unique())
+        for strategy_a, strategy_b in itertools.combinations(strategies, 2):
+            stats = compare(cell[cell['strategy'] == strategy_a], cell[cell['strategy'] == strategy_b],
+                            n_resamples, alpha, seed)
+            rows.append({'model': model, 'dataset': dataset, 'category': category,
+                         'strategy_a': strategy_a, 'strategy_b': strategy_b, **stats})
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals and paired tests between result files")
+    parser.add_argument('--result_a', type=str, default=None, help="First result CSV")
+    parser.add_argument('--result_b', type=str, default=None, help="Second result CSV")
+    parser.add_argument('--result_dir', type=str, default=None,
+                        help="Compare all strategy pairs per dataset and category below this directory")
+    parser.add_argument('--pattern', type=str, default='*.csv')
+    parser.add_argument('--n_resamples', type=int, default=10000)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default=None, help="Write the comparison table to this CSV")
+    args = parser.parse_args()
+
+    if args.result_dir:
+        table = compare_grid(load_results(args.result_dir, args.pattern), args.n_resamples, args.alpha, args.seed)
+    elif args.result_a and args.result_b:
+        stats = compare(load_result_file(args.result_a), load_result_file(args.result_b),
+                        args.n_resamples, args.alpha, args.seed)
+        table = pd.DataFrame([{'result_a': os.path.basename(args.result_a),
+                               'result_b': os.path.basename(args.result_b), **stats}])
+    else:
+        parser.error("pass --result_a and --result_b, or --result_dir")
+
+    print(table.to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"Comparison saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+import os
+import csv
+import json
+import time
+import argparse
+import traceback
+import importlib.util
+import multiprocessing
+from multiprocessing.connection import wait
+
+
+TOOL_DIR = os.path.dirname(os.path.abspath(__file__))
+QA_DIR = "/home/pty_ssd/EgoEye/qa_pairs"
+DEFAULT_STATE = "/home/pty_ssd/EgoEye/results/sweep_state.json"
+
+# Strategy name -> (script defining load_model() and evaluate(), QA rows it evaluates at most per file)
+STRATEGIES = {
+    'wo': ('qwenvl_test/test_wo.py', None),
+    'gaze': ('qwenvl_test/test_gaze.py', None),
+    'mark': ('qwenvl_test/test_mark.py', None),
+    'saliencemap': ('qwenvl_test/test_saliencemap.py', None),
+    'gazees': ('prompt_gazees/qwenvl7b_gazees_saliencemap.py', 100),
+}
+DATASETS = ['ego4d', 'egoexo', 'egtea']
+CATEGORIES = ['spatial', 'temporal', 'causal']
+
+
+def job_id(model, strategy, dataset, category):
+    return f"{model}/{strategy}/{category}_{dataset}"
+
+
+def qa_rows(dataset, category, limit=None):
+    """Number of QA rows a job evaluates, used to balance workers (0 when the QA file is missing)."""
+    qa_csv = os.path.join(QA_DIR, f"{category}_{dataset}.csv")
+    if not os.path.exists(qa_csv):
+        return 0
+    with open(qa_csv, 'r') as f:
+        rows = sum(1 for _ in csv.DictReader(f))
+    return min(rows, limit) if limit is not None else rows
+
+
+def plan_jobs(models, strategies, datasets=DATASETS, categories=CATEGORIES):
+    """
+    Jobs of a sweep, one per (model, strategy, dataset, category).
+
+    Jobs are grouped by model, largest model group first, and by decreasing
+    row count inside a group, the order in which SweepScheduler hands them out.
+
+    Returns:
+        List of job dictionaries with id, model, strategy, dataset, category and rows
+    """
+    unknown = [strategy for strategy in strategies if strategy not in STRATEGIES]
+    if unknown:
+        raise ValueError(f"Unknown strategies {unknown}, expected some of {list(STRATEGIES)}")
+    rows = {(dataset, category): qa_rows(dataset, category) for dataset in datasets for category in categories}
+    groups = {}
+    for model in models:
+        for strategy in strategies:
+            limit = STRATEGIES[strategy][1]
+            for dataset in datasets:
+                for category in categories:
+                    count = rows[(dataset, category)]
+                    groups.setdefault(model, []).append({
+                        'id': job_id(model, strategy, dataset, category),
+                        'model': model,
+                        'strategy': strategy,
+                        'dataset': dataset,
+                        'category': category,
+                        'rows': min(count, limit) if limit is not None else count,
+                    })
+    jobs = []
+    for model in sorted(groups, key=lambda model: -sum(job['rows'] for job in groups[model])):
+        jobs.extend(sorted(groups[model], key=lambda job: -job['rows']))
+    return jobs
+
+
+class SweepScheduler:
+    """
+    Hands out jobs to workers so that model checkpoints are reloaded as rarely as possible.
+
+    A worker keeps receiving jobs of the model it has loaded while any are left.
+    Otherwise it gets the model with the most pending rows per worker already
+    holding it, so an unclaimed model is preferred and a large model group is
+    only split across workers when it outweighs everything else. Each worker
+    therefore loads a checkpoint at most once, unless its group was split.
+
+    Example:
+        scheduler = SweepScheduler(plan_jobs(models, strategies))
+        job = scheduler.next_job(worker, loaded_model)
+    """
+
+    def __init__(self, jobs):
+        self.pending = list(jobs)
+        self.loaded = {}
+
+    def next_job(self, worker, model=None):
+        """Next job for worker, which has model loaded (None if it has none), or None when the queue is empty."""
+        if not self.pending:
+            self.loaded.pop(worker, None)
+            return None
+        same = [job for job in self.pending if job['model'] == model]
+        if same:
+            job = same[0]
+        else:
+            remaining = {}
+            for pending in self.pending:
+                remaining[pending['model']] = remaining.get(pending['model'], 0) + max(pending['rows'], 1)
+            holders = {}
+            for other, other_model in self.loaded.items():
+                if other != worker:
+                    holders[other_model] = holders.get(other_model, 0) + 1
+            target = max(remaining, key=lambda name: remaining[name] / (holders.get(name, 0) + 1))
+            job = next(pending for pending in self.pending if pending['model'] == target)
+        self.pending.remove(job)
+        self.loaded[worker] = job['model']
+        return job
+
+    def pending_rows(self):
+        return sum(job['rows'] for job in self.pending)
+
+
+class SweepState:
+    """
+    Status of every job of a sweep, rewritten atomically to a JSON file on each change.
+
+    Jobs marked done are skipped when the sweep is restarted. Jobs that were
+    running or failed run again; their scripts resume row by row from the
+    ResultWriter progress logs, so only unfinished rows are evaluated.
+    """
+
+    def __init__(self, path=DEFAULT_STATE):
+        self.path = path
+        self.jobs = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.jobs = json.load(f).get('jobs', {})
+
+    def is_done(self, job_id):
+        return self.jobs.get(job_id, {}).get('status') == 'done'
+
+    def update(self, job, **fields):
+        record = self.jobs.setdefault(job['id'], {})
+        record.update({key: job[key] for key in ('model', 'strategy', 'dataset', 'category')})
+        record.update(fields)
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'jobs': self.jobs}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def load_strategy(strategy):
+    """Import the script of a strategy without running its main()."""
+    script = os.path.join(TOOL_DIR, STRATEGIES[strategy][0])
+    spec = importlib.util.spec_from_file_location(f"sweep_{strategy}", script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def strategy_options(strategy, module):
+    """
+    Keyword arguments of evaluate() besides the defaults: mark draws its marks
+    with the style of test_mark.py, the salience map scripts use their prefetcher.
+    """
+    if strategy == 'mark' and module.render_marks:
+        return {'renderer': module.MarkRenderer(**module.mark_style)}
+    if getattr(module, 'salience_prefetch', None) is not None:
+        return {'prefetcher': module.salience_prefetch}
+    return {}
+
+
+def _worker(worker, device, conn):
+    """
+    Worker process: reports (loaded model, result of the last job) and receives the next job, until it gets None.
+
+    The model stays loaded between jobs and is only replaced when a job needs another one.
+    """
+    if device is not None:
+        os.environ['CUDA_VISIBLE_DEVICES'] = device
+    from response_cache import ResponseCache
+
+    cache = ResponseCache()
+    modules = {}
+    model_name = model = processor = None
+    result = None
+    while True:
+        conn.send((model_name, result))
+        job = conn.recv()
+        if job is None:
+            break
+        start = time.time()
+        loaded = False
+        try:
+            if job['strategy'] not in modules:
+                modules[job['strategy']] = load_strategy(job['strategy'])
+            module = modules[job['strategy']]
+            if job['model'] != model_name:
+                model_name = model = processor = None
+                import gc
+                import torch
+                gc.collect()
+                torch.cuda.empty_cache()
+                model, processor = module.load_model(job['model'])
+                model_name = job['model']
+                loaded = True
+            usage_meter = module.evaluate(model, processor, model_name, job['dataset'], job['category'], cache,
+                                          **strategy_options(job['strategy'], module))
+            result = {'id': job['id'], 'status': 'done', 'rows': len(usage_meter.rows),
+                      'seconds': time.time() - start, 'loaded': loaded}
+        except Exception:
+            result = {'id': job['id'], 'status': 'failed', 'error': traceback.format_exc(limit=5),
+                      'seconds': time.time() - start, 'loaded': loaded}
+    print(f"Worker {worker}: {cache.summary()}")
+    conn.close()
+
+
+def _status_line(start, scheduler, workers, counts):
+    elapsed = time.time() - start
+    running = [info for info in workers.values() if info['job'] is not None]
+    line = (f"[sweep {elapsed / 60:.1f} min] queue {len(scheduler.pending)} jobs ({scheduler.pending_rows()} rows) | "
+            f"running {len(running)} | done {counts['done']}/{counts['total']} | failed {counts['failed']} | "
+            f"{counts['rows']} rows at {counts['rows'] / elapsed if elapsed > 0 else 0.0:.2f} rows/s | "
+            f"{counts['loads']} model loads")
+    for info in running:
+        line += f"\n    worker {info['worker']}: {info['job']['id']} ({(time.time() - info['started']) / 60:.1f} min)"
+    return line
+
+
+def run_sweep(jobs, state, devices=(None,), status_interval=60):
+    """
+    Run jobs on one worker process per device, skipping those the state already marks done.
+
+    Args:
+        jobs: plan_jobs() output
+        state: SweepState the job status is persisted to
+        devices: CUDA_VISIBLE_DEVICES value of each worker, e.g. ['0', '1'] or ['0,1', '2,3'];
+            None lets a worker see every GPU
+        status_interval: Seconds between two status lines; one is also printed after every job
+
+    Returns:
+        Dictionary of job counts, evaluated rows and model loads
+    """
+    todo = [job for job in jobs if not state.is_done(job['id'])]
+    print(f"{len(jobs)} jobs, {len(jobs) - len(todo)} already done, {len(todo)} to run on {len(devices)} workers")
+    scheduler = SweepScheduler(todo)
+    counts = {'total': len(todo), 'done': 0, 'failed': 0, 'rows': 0, 'loads': 0}
+    start = time.time()
+
+    context = multiprocessing.get_context('spawn')
+    workers = {}
+    for worker, device in enumerate(devices):
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=_worker, args=(worker, device, child_conn))
+        process.start()
+        child_conn.close()
+        workers[parent_conn] = {'worker': worker, 'process': process, 'job': None, 'started': None}
+
+    last_status = time.time()
+    while workers:
+        for conn in wait(list(workers), timeout=status_interval):
+            info = workers[conn]
+            try:
+                model, result = conn.recv()
+            except EOFError:
+                info['process'].join()
+                if info['job'] is not None:
+                    state.update(info['job'], status='failed', worker=info['worker'],
+                                 error=f"worker exited with code {info['process'].exitcode}")
+                    counts['failed'] += 1
+                del workers[conn]
+                continue
+
+            if result is not None:
+                job = info['job']
+                state.update(job, worker=info['worker'], finished=time.time(),
+                             **{key: value for key, value in result.items() if key not in ('id', 'loaded')})
+                counts['done' if result['status'] == 'done' else 'failed'] += 1
+                counts['rows'] += result.get('rows', 0)
+                counts['loads'] += result['loaded']
+                if result['status'] == 'failed':
+                    print(f"Job {job['id']} failed on worker {info['worker']}:\n{result['error']}")
+
+            job = scheduler.next_job(info['worker'], model)
+            info['job'] = job
+            info['started'] = time.time()
+            if job is not None:
+                state.update(job, status='running', worker=info['worker'], started=info['started'])
+            conn.send(job)
+            if job is None:
+                info['process'].join()
+                del workers[conn]
+            if result is not None:
+                print(_status_line(start, scheduler, workers, counts))
+                last_status = time.time()
+
+        if workers and time.time() - last_status >= status_interval:
+            print(_status_line(start, scheduler, workers, counts))
+            last_status = time.time()
+
+    elapsed = time.time() - start
+    print(f"Sweep finished in {elapsed / 60:.1f} min: {counts['done']} jobs done, {counts['failed']} failed, "
+          f"{counts['rows']} rows ({counts['rows'] / elapsed if elapsed > 0 else 0.0:.2f} rows/s), "
+          f"{counts['loads']} model loads. State in {state.path}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a models x strategies x datasets x categories evaluation sweep")
+    parser.add_argument('--spec', type=str, default=None,
+                        help="JSON file with any of models, strategies, datasets, categories and devices")
+    parser.add_argument('--models', type=str, nargs='+', default=None,
+                        help="Checkpoint names under the pretrained folder of the scripts")
+    parser.add_argument('--strategies', type=str, nargs='+', default=None, help=f"Some of {list(STRATEGIES)}")
+    parser.add_argument('--datasets', type=str, nargs='+', default=None)
+    parser.add_argument('--categories', type=str, nargs='+', default=None)
+    parser.add_argument('--devices', type=str, nargs='+', default=None,
+                        help="CUDA_VISIBLE_DEVICES of each worker, e.g. 0 1 2 3 (default: one worker on every GPU)")
+    parser.add_argument('--state', type=str, default=DEFAULT_STATE, help="Job state file; done jobs are skipped")
+    parser.add_argument('--status_interval', type=float, default=60, help="Seconds between status lines")
+    parser.add_argument('--dry_run', action='store_true', help="Print the planned jobs and exit")
+    args = parser.parse_args()
+
+    spec = {}
+    if args.spec:
+        with open(args.spec, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+    models = args.models or spec.get('models')
+    if not models:
+        parser.error("no models: pass --models or a spec with models")
+    strategies = args.strategies or spec.get('strategies') or list(STRATEGIES)
+    datasets = args.datasets or spec.get('datasets') or DATASETS
+    categories = args.categories or spec.get('categories') or CATEGORIES
+    devices = args.devices or spec.get('devices') or [None]
+
+    try:
+        jobs = plan_jobs(models, strategies, datasets, categories)
+    except ValueError as e:
+        parser.error(str(e))
+    state = SweepState(args.state)
+    if args.dry_run:
+        for job in jobs:
+            status = state.jobs.get(job['id'], {}).get('status', 'pending')
+            print(f"{job['id']:70s} {job['rows']:6d} rows  {status}")
+        print(f"{len(jobs)} jobs, {sum(job['rows'] for job in jobs)} rows, {len(models)} models on {len(devices)} workers")
+        return
+    run_sweep(jobs, state, devices, args.status_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+import os
+import math
+from tracing import span
+
+
+# Qwen2.5-VL merges 2x2 patches of 14 pixels into one language-model token.
+SPATIAL_MERGE_SIZE = 2
+TEMPORAL_PATCH_SIZE = 2
+GAZE_KEY = "gaze"
+
+
+def gaze_points(gaze_info_list):
+    """(gaze_x, gaze_y) per frame from gaze_info dictionaries, None where a frame has no gaze."""
+    points = []
+    for gaze_info in gaze_info_list:
+        if gaze_info is None or gaze_info.get('gaze_x') is None or gaze_info.get('gaze_y') is None:
+            points.append(None)
+        else:
+            points.append((float(gaze_info['gaze_x']), float(gaze_info['gaze_y'])))
+    return points
+
+
+def gaze_keep_indices(grid_t, grid_h, grid_w, frame_gaze, keep_ratio, merge_size=SPATIAL_MERGE_SIZE):
+    """
+    Tokens of one video to keep, nearest to the gaze first.
+
+    The processor resizes whole frames without cropping, so a normalized gaze
+    point lands at (gaze_x * tokens per row, gaze_y * tokens per column) of the
+    merged token grid of its temporal slot. Each slot covers TEMPORAL_PATCH_SIZE
+    frames and its tokens are ranked by their distance, in token units, to the
+    nearest gaze point of those frames. Slots without any gaze keep every token.
+
+    Args:
+        grid_t, grid_h, grid_w: video_grid_thw row of the video (in 14-pixel patches)
+        frame_gaze: (gaze_x, gaze_y) or None per frame, as sent to the processor
+        keep_ratio: Fraction of the tokens of each slot to keep
+
+    Returns:
+        (kept, dropped): lists of token offsets within the video, in raster (t, h, w) order
+    """
+    rows, cols = grid_h // merge_size, grid_w // merge_size
+    per_slot = rows * cols
+    keep_count = max(1, int(math.ceil(keep_ratio * per_slot)))
+    # qwen_vl_utils pads a video to a multiple of TEMPORAL_PATCH_SIZE frames by repeating the last one.
+    if frame_gaze and len(frame_gaze) < grid_t * TEMPORAL_PATCH_SIZE:
+        frame_gaze = list(frame_gaze) + [frame_gaze[-1]] * (grid_t * TEMPORAL_PATCH_SIZE - len(frame_gaze))
+
+    kept, dropped = [], []
+    for t in range(grid_t):
+        base = t * per_slot
+        points = [p for p in (frame_gaze or [])[t * TEMPORAL_PATCH_SIZE:(t + 1) * TEMPORAL_PATCH_SIZE] if p is not None]
+        if not points or keep_count >= per_slot:
+            kept.extend(range(base, base + per_slot))
+            continue
+        distance = []
+        for offset in range(per_slot):
+            row, col = divmod(offset, cols)
+            d = min(math.hypot(col + 0.5 - x * cols, row + 0.5 - y * rows) for x, y in points)
+            distance.append((d, offset))
+        distance.sort()
+        slot_kept = sorted(offset for _, offset in distance[:keep_count])
+        slot_dropped = sorted(offset for _, offset in distance[keep_count:])
+        kept.extend(base + offset for offset in slot_kept)
+        dropped.append([base + offset for offset in slot_dropped])
+    return kept, dropped
+
+
+def video_gaze_tracks(messages):
+    """The GAZE_KEY list of every video item of messages, in order (None for videos without one)."""
+    tracks = []
+    for message in messages:
+        content = message.get('content')
+        if not isinstance(content, list):
+            continue
+        for item in content:
+            if item.get('type') == 'video':
+                tracks.append(item.get(GAZE_KEY))
+    return tracks
+
+
+class GazeTokenPruner:
+    """
+    Gaze-conditioned pruning of video tokens for local Qwen2.5-VL inference.
+
+    The vision encoder runs on every patch as usual. Before prefill, only the
+    keep_ratio of merged video tokens of each temporal slot nearest to the
+    gaze is kept, together with all text and image tokens and their original
+    3D rotary positions (get_rope_index). With merge=True the dropped tokens
+    of a slot are averaged into one extra token instead of being discarded.
+    Decoding follows the checkpoint's generation_config, like model.generate().
+
+    Gaze is read from a GAZE_KEY list on the video items of the messages,
+    one (gaze_x, gaze_y) or None per frame; see attach_gaze().
+
+    Example:
+        pruner = GazeTokenPruner(keep_ratio=0.25)
+        pruner.attach_gaze(messages, gaze_info_per_frame(narration_json, video_id, image_paths))
+        answer = local_answer(model, processor, messages, model_name, cache, pruner=pruner)
+    """
+
+    def __init__(self, keep_ratio=0.25, merge=False):
+        if not 0 < keep_ratio <= 1:
+            raise ValueError(f"keep_ratio must be in (0, 1], got {keep_ratio}")
+        self.keep_ratio = keep_ratio
+        self.merge = merge
+        self.tokens_in = 0
+        self.tokens_kept = 0
+
+    def tag(self):
+        """Short settings identifier for output file names, e.g. prune25 or prune25m."""
+        return f"prune{int(round(self.keep_ratio * 100))}{'m' if self.merge else ''}"
+
+    def params(self):
+        """Settings that change the answer, for the response cache key."""
+        return {'token_keep_ratio': self.keep_ratio, 'token_merge': self.merge}
+
+    @staticmethod
+    def attach_gaze(messages, gaze_info_list):
+        """
+        Attach per-frame gaze to the first video item of messages, in place.
+
+        Only the first video is used because it holds the full frames (with
+        foveate.Foveator the second one holds the gaze crops).
+        """
+        for message in messages:
+            content = message.get('content')
+            if not isinstance(content, list):
+                continue
+            for item in content:
+                if item.get('type') == 'video':
+                    item[GAZE_KEY] = gaze_points(gaze_info_list)
+                    return messages
+        return messages
+
+    def _input_embeds(self, model, inputs):
+        """Token embeddings with the image and video features scattered in, as the model forward does."""
+        embeds = model.get_input_embeddings()(inputs.input_ids)
+        visual = model.visual
+        for token_id, values_key, grid_key in (
+            (model.config.image_token_id, 'pixel_values', 'image_grid_thw'),
+            (model.config.video_token_id, 'pixel_values_videos', 'video_grid_thw'),
+        ):
+            if inputs.get(values_key) is None:
+                continue
+            features = visual(inputs[values_key].type(visual.dtype), grid_thw=inputs[grid_key])
+            mask = (inputs.input_ids == token_id).unsqueeze(-1).expand_as(embeds)
+            embeds = embeds.masked_scatter(mask, features.to(embeds.device, embeds.dtype))
+        return embeds
+
+    def _position_ids(self, model, inputs):
+        get_rope_index = getattr(model, 'get_rope_index', None) or model.model.get_rope_index
+        position_ids, _ = get_rope_index(
+            inputs.input_ids,
+            image_grid_thw=inputs.get('image_grid_thw'),
+            video_grid_thw=inputs.get('video_grid_thw'),
+            second_per_grid_ts=inputs.get('second_per_grid_ts'),
+            attention_mask=inputs.get('attention_mask'),
+        )
+        return position_ids
+
+    def keep_mask(self, model, inputs, messages, embeds=None):
+        """
+        Boolean mask over the prompt tokens of a batch of one.
+
+        With merge, embeds is updated in place so the first dropped token of
+        each slot carries the mean of all dropped tokens of the slot.
+        """
+        import torch
+
+        input_ids = inputs.input_ids[0]
+        keep = torch.ones_like(input_ids, dtype=torch.bool)
+        video_grids = inputs.get('video_grid_thw')
+        if video_grids is None:
+            return keep
+        positions = (input_ids == model.config.video_token_id).nonzero().squeeze(1)
+        merge_size = getattr(model.config.vision_config, 'spatial_merge_size', SPATIAL_MERGE_SIZE)
+        start = 0
+        for (grid_t, grid_h, grid_w), track in zip(video_grids.tolist(), video_gaze_tracks(messages) + [None] * len(video_grids)):
+            count = grid_t * (grid_h // merge_size) * (grid_w // merge_size)
+            video_positions = positions[start:start + count]
+            start += count
+            if track is None:
+                continue
+            _, dropped = gaze_keep_indices(grid_t, grid_h, grid_w, track, self.keep_ratio, merge_size)
+            for slot_dropped in dropped:
+                slot_positions = video_positions[slot_dropped]
+                keep[slot_positions] = False
+                if self.merge and embeds is not None:
+                    embeds[0, slot_positions[0]] = embeds[0, slot_positions].mean(dim=0)
+                    keep[slot_positions[0]] = True
+        return keep
+
+    @staticmethod
+    def _logits_processor(model, input_ids):
+        """The logits processors and warpers model.generate() builds from the checkpoint's generation_config."""
+        from transformers import LogitsProcessorList
+
+        return model._get_logits_processor(
+            generation_config=model.generation_config,
+            input_ids_seq_length=input_ids.shape[-1],
+            encoder_input_ids=input_ids,
+            prefix_allowed_tokens_fn=None,
+            logits_processor=LogitsProcessorList(),
+            device=input_ids.device,
+        )
+
+    def generate(self, model, inputs, messages, max_new_tokens=128):
+        """
+        Prefill the pruned prompt and decode as model.generate() would.
+
+        The checkpoint's generation_config is applied to every step
+        (repetition penalty, temperature, top-k/top-p, sampling), so at
+        keep_ratio=1.0 the answers match the unpruned path.
+
+        Returns:
+            (generated token ids, keep mask over the prompt tokens)
+        """
+        import torch
+
+        with span("prune.embed"):
+            embeds = self._input_embeds(model, inputs)
+            position_ids = self._position_ids(model, inputs)
+            keep = self.keep_mask(model, inputs, messages, embeds)
+        self.tokens_in += int(keep.numel())
+        self.tokens_kept += int(keep.sum().item())
+
+        embeds = embeds[:, keep]
+        position_ids = position_ids[:, :, keep]
+        attention_mask = torch.ones((1, embeds.shape[1]), dtype=torch.long, device=embeds.device)
+        prompt_length = embeds.shape[1]
+        with span("prune.prefill"):
+            outputs = model(inputs_embeds=embeds, position_ids=position_ids, attention_mask=attention_mask,
+                            use_cache=True, cache_position=torch.arange(prompt_length, device=embeds.device),
+                            logits_to_keep=1)
+
+        generation_config = model.generation_config
+        logits_processor = self._logits_processor(model, inputs.input_ids)
+        # Repetition penalties see the full prompt ids, dropped video tokens included, as in model.generate().
+        sequence = inputs.input_ids
+
+        eos_ids = model.generation_config.eos_token_id
+        eos_ids = set(eos_ids if isinstance(eos_ids, (list, tuple)) else [eos_ids])
+        # Generated tokens continue the text positions after the last prompt token on all three rotary axes.
+        next_position = position_ids[:, :, -1:] + 1
+        generated = []
+        with span("prune.decode"):
+            for step in range(max_new_tokens):
+                scores = logits_processor(sequence, outputs.logits[:, -1].float())
+                if generation_config.do_sample:
+                    token = torch.multinomial(scores.softmax(dim=-1), num_samples=1).squeeze(1)
+                else:
+                    token = scores.argmax(dim=-1)
+                if token.item() in eos_ids:
+                    break
+                generated.append(token.item())
+                sequence = torch.cat([sequence, token[:, None].to(sequence.device)], dim=1)
+                attention_mask = torch.cat([attention_mask, attention_mask.new_ones((1, 1))], dim=1)
+                outputs = model(input_ids=token[:, None], past_key_values=outputs.past_key_values,
+                                position_ids=next_position + step, attention_mask=attention_mask, use_cache=True,
+                                cache_position=torch.tensor([prompt_length + step], device=embeds.device))
+        return generated, keep
+
+    def summary(self):
+        rate = self.tokens_kept / self.tokens_in * 100 if self.tokens_in else 0.0
+        return f"Token pruning ({self.tag()}): {self.tokens_kept} of {self.tokens_in} prompt tokens kept ({rate:.1f}%)"
+
+
+def compare(model_path, qa_csv, image_dir, narration_json, keep_ratios, sample=20, seed=0, merge=False,
+            max_new_tokens=128):
+    """
+    Answer the same sample of QA rows unpruned and at every keep ratio, without the response cache.
+
+    Returns:
+        One dictionary per setting with accuracy, agreement with the unpruned
+        answers, prompt tokens per row and latency percentiles
+    """
+    import csv
+    import random
+    import pandas as pd
+    from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor
+    from inference import local_answer, UsageMeter
+    from caculate import extract_choice
+    from gaze_index import gaze_info_per_frame
+    from pixel_budget import MIN_PIXELS, MAX_PIXELS
+
+    with open(qa_csv, 'r') as f:
+        rows = list(csv.DictReader(f))
+    rows = random.Random(seed).sample(rows, min(sample, len(rows)))
+    model = Qwen2_5_VLForConditionalGeneration.from_pretrained(model_path, torch_dtype="auto", device_map="auto")
+    processor = AutoProcessor.from_pretrained(model_path, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS)
+    reference = extract_choice(pd.Series([row['Correct Answer'] for row in rows]))
+
+    results = []
+    baseline = None
+    # The baseline keeps every token but decodes through the same loop, so agreement only reflects the pruning.
+    for keep_ratio in [None] + sorted(keep_ratios, reverse=True):
+        pruner = GazeTokenPruner(keep_ratio if keep_ratio is not None else 1.0, merge)
+        meter = UsageMeter(pruner.tag() if keep_ratio is not None else "unpruned")
+        answers = []
+        for row in rows:
+            image_paths = row['group_id'].split("\n")
+            input_question = (f"Given the visual sequence and associated question:\n"
+                              f"{row['Question']}\nOptions:\n{row['Answer Options']}\n"
+                              "Choose the most appropriate option. Return the letter of the correct option.")
+            messages = [{"role": "user", "content": [
+                {"type": "video", "video": [os.path.join(image_dir, row['video_id'], path) for path in image_paths]},
+                {"type": "text", "text": input_question},
+            ]}]
+            pruner.attach_gaze(messages, gaze_info_per_frame(narration_json, row['video_id'], image_paths))
+            answer, usage = local_answer(model, processor, messages, os.path.basename(model_path), None,
+                                         max_new_tokens, with_usage=True, pruner=pruner)
+            meter.add(usage)
+            answers.append(answer)
+        predicted = extract_choice(pd.Series(answers))
+        if baseline is None:
+            baseline = predicted
+        report = meter.report()
+        results.append({
+            'setting': meter.name,
+            'rows': len(rows),
+            'accuracy': float((predicted == reference).mean() * 100),
+            'agreement': float((predicted == baseline).mean() * 100),
+            'prompt_tokens_per_row': report['prompt_tokens_per_row'],
+            'vision_tokens_per_row': report['vision_tokens_per_row'],
+            'latency_p50_s': report['latency_p50_s'],
+            'latency_p95_s': report['latency_p95_s'],
+        })
+        print(meter.summary())
+    return results
+
+
+def main():
+    import csv
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare gaze-pruned local inference against the unpruned baseline")
+    parser.add_argument('--model_name', type=str, default='Qwen2.5-VL-7B-Instruct')
+    parser.add_argument('--model_path', type=str, default=None,
+                        help="Checkpoint folder (default: /home/pty/Qwen2.5-VL/pretrained/<model_name>)")
+    parser.add_argument('--dataset', type=str, default='egtea')
+    parser.add_argument('--category', type=str, default='spatial')
+    parser.add_argument('--keep_ratios', type=float, nargs='+', default=[0.5, 0.25, 0.1])
+    parser.add_argument('--merge', action='store_true', help="Average the dropped tokens of each slot into one token")
+    parser.add_argument('--sample', type=int, default=20, help="QA rows per setting")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default=None, help="CSV of the comparison")
+    args = parser.parse_args()
+
+    model_path = args.model_path or f"/home/pty/Qwen2.5-VL/pretrained/{args.model_name}"
+    qa_csv = f"/home/pty_ssd/EgoEye/qa_pairs/{args.category}_{args.dataset}.csv"
+    image_dir = f"/home/pty_ssd/EgoEye/datasets/{args.dataset}"
+    narration_json = f"/home/pty_ssd/EgoEye/narrations/{args.dataset}.json"
+    results = compare(model_path, qa_csv, image_dir, narration_json, args.keep_ratios, args.sample, args.seed, args.merge)
+
+    def fmt(value, spec):
+        return "n/a" if value is None else format(value, spec)
+
+    print(f"{'setting':>10s} {'accuracy':>9s} {'agree':>7s} {'prompt tok':>11s} {'p50 s':>7s} {'p95 s':>7s}")
+    for r in results:
+        print(f"{r['setting']:>10s} {r['accuracy']:8.1f}% {r['agreement']:6.1f}% {fmt(r['prompt_tokens_per_row'], '11.1f')} "
+              f"{fmt(r['latency_p50_s'], '7.2f')} {fmt(r['latency_p95_s'], '7.2f')}")
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0]))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Comparison saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
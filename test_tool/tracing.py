@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import atexit
+import threading
+import functools
+import argparse
+
+
+# EGOGAZE_TRACE=1 collects spans and prints a per-stage summary at exit;
+# EGOGAZE_TRACE=<file>.json additionally writes a Chrome trace to that file.
+TRACE_ENV = "EGOGAZE_TRACE"
+
+_enabled = False
+_output = None
+_events = []
+_lock = threading.Lock()
+
+
+class _NullSpan:
+    """Shared no-op span returned while tracing is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        event = (self.name, self.start, end - self.start, threading.get_ident(), self.args)
+        with _lock:
+            _events.append(event)
+        return False
+
+
+def span(name, **args):
+    """
+    Context manager timing one pipeline stage.
+
+    With tracing disabled this returns a shared no-op object, so the cost of
+    an instrumented stage is one function call and one global lookup.
+
+    Example:
+        with span("process_vision_info"):
+            image_inputs, video_inputs = process_vision_info(messages)
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorator wrapping every call of a function in a span named after it."""
+    def decorator(fn):
+        stage = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(stage, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def enable(output=None):
+    """Start collecting spans; output is an optional Chrome trace path written at exit."""
+    global _enabled, _output
+    _enabled = True
+    _output = output or _output
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _events.clear()
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def summary():
+    """
+    Per-stage statistics of the spans collected so far.
+
+    Returns:
+        {stage: {'count', 'total_s', 'mean_ms', 'p50_ms', 'p95_ms'}} ordered by total time
+    """
+    with _lock:
+        events = list(_events)
+    durations = {}
+    for name, _, duration, _, _ in events:
+        durations.setdefault(name, []).append(duration / 1e6)
+    stats = {}
+    for name, values in durations.items():
+        values.sort()
+        stats[name] = {
+            'count': len(values),
+            'total_s': sum(values) / 1e3,
+            'mean_ms': sum(values) / len(values),
+            'p50_ms': _percentile(values, 50),
+            'p95_ms': _percentile(values, 95),
+        }
+    return dict(sorted(stats.items(), key=lambda item: -item[1]['total_s']))
+
+
+def format_summary(stats=None):
+    stats = summary() if stats is None else stats
+    if not stats:
+        return "No spans recorded"
+    lines = [f"{'stage':32s} {'count':>7s} {'total s':>10s} {'p50 ms':>10s} {'p95 ms':>10s}"]
+    for name, s in stats.items():
+        lines.append(f"{name:32s} {s['count']:7d} {s['total_s']:10.2f} {s['p50_ms']:10.2f} {s['p95_ms']:10.2f}")
+    return "\n".join(lines)
+
+
+def print_summary():
+    """Print the per-stage table if tracing is enabled."""
+    if _enabled:
+        print(format_summary())
+
+
+def export_chrome_trace(path):
+    """Write the collected spans in Chrome trace event format (chrome://tracing, Perfetto)."""
+    with _lock:
+        events = list(_events)
+    pid = os.getpid()
+    trace_events = [
+        {'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'ts': start / 1e3, 'dur': duration / 1e3,
+         'pid': pid, 'tid': tid, 'args': {k: str(v) for k, v in args.items()}}
+        for name, start, duration, tid, args in events
+    ]
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+    print(f"Trace with {len(trace_events)} spans saved to {path}")
+
+
+def _at_exit():
+    if not _enabled:
+        return
+    print_summary()
+    if _output:
+        export_chrome_trace(_output)
+
+
+_env_value = os.environ.get(TRACE_ENV, "")
+if _env_value and _env_value.lower() not in ("0", "false", "no"):
+    enable(_env_value if _env_value.lower().endswith('.json') else None)
+atexit.register(_at_exit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a Chrome trace written by tracing.py")
+    parser.add_argument('trace', type=str)
+    args = parser.parse_args()
+
+    with open(args.trace, 'r') as f:
+        trace_events = json.load(f)['traceEvents']
+    for event in trace_events:
+        _events.append((event['name'], int(event['ts'] * 1e3), int(event['dur'] * 1e3), event['tid'], {}))
+    print(format_summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import os
+import io
+import json
+import base64
+import hashlib
+from PIL import Image
+
+from pixel_budget import MIN_PIXELS, MAX_PIXELS, resize_to_budget
+from tracing import traced
+
+
+DEFAULT_FRAME_CACHE = "/home/pty_ssd/EgoEye/cache/sampled_frames"
+
+
+def uniform_frame_indices(total_frames, num_frames):
+    """Indices of num_frames frames spread uniformly over a clip of total_frames frames."""
+    if total_frames < num_frames:
+        return list(range(total_frames))
+    return [int(i * total_frames / num_frames) for i in range(num_frames)]
+
+
+def count_frames(video_path):
+    """Number of frames reported by the container, falling back to OpenCV."""
+    try:
+        import av
+        with av.open(video_path) as container:
+            frames = container.streams.video[0].frames
+        if frames:
+            return frames
+    except ImportError:
+        pass
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return frames
+
+
+@traced("video.decode")
+def decode_frames(video_path, frame_indices):
+    """
+    Decode the requested frames of a video in one sequential pass.
+
+    Frames are decoded in order with threaded PyAV decoding and only the target
+    indices are converted to RGB; decoding stops after the last target. When the
+    first target is not at the start of the video (virtual clips inside a long
+    video), the decoder first seeks to the preceding keyframe and frame numbers
+    are recovered from timestamps. Without PyAV, OpenCV grab()/retrieve() gives
+    the same single pass.
+
+    Args:
+        video_path: Path to the video file
+        frame_indices: Frame numbers to keep
+
+    Returns:
+        Dictionary mapping frame index to an RGB uint8 array
+    """
+    targets = set(frame_indices)
+    if not targets:
+        return {}
+    first = min(targets)
+    last = max(targets)
+    frames = {}
+    try:
+        import av
+    except ImportError:
+        av = None
+
+    if av is not None:
+        with av.open(video_path) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            fps = float(stream.average_rate or stream.guessed_rate or 30)
+            start_time = float(stream.start_time * stream.time_base) if stream.start_time is not None else 0.0
+            if first > 0:
+                seek_pts = int((first / fps + start_time) / stream.time_base)
+                container.seek(seek_pts, backward=True, any_frame=False, stream=stream)
+            for position, frame in enumerate(container.decode(stream)):
+                if first > 0 and frame.pts is not None:
+                    index = int(round((float(frame.pts * stream.time_base) - start_time) * fps))
+                else:
+                    index = position
+                if index in targets and index not in frames:
+                    frames[index] = frame.to_ndarray(format="rgb24")
+                if index >= last:
+                    break
+        return frames
+
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    if first > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    for index in range(first, last + 1):
+        if not cap.grab():
+            break
+        if index in targets:
+            ret, frame = cap.retrieve()
+            if ret:
+                frames[index] = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    cap.release()
+    return frames
+
+
+def encode_jpeg(image):
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG")
+    return buffered.getvalue()
+
+
+def jpegs_to_data_urls(jpegs):
+    return [f"data:image/jpeg;base64,{base64.b64encode(data).decode('utf-8')}" for data in jpegs]
+
+
+class FrameSampler:
+    """
+    Uniform clip sampler with a per-frame disk cache.
+
+    Sampled frames are resized to the pixel budget, JPEG-encoded once and stored
+    under <cache_dir>/<clip hash>/<min_pixels>_<max_pixels>/<frame>.jpg together
+    with the clip frame count. Sampling the same clip again, or with another
+    num_frames (frame4, frame9, ...), only decodes the frames not cached yet and
+    never re-encodes cached ones.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_FRAME_CACHE, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS):
+        self.cache_dir = cache_dir
+        self.min_pixels = min_pixels
+        self.max_pixels = max_pixels
+        self.decoded = 0
+        self.cached = 0
+
+    def _clip_dir(self, video_path):
+        stat = os.stat(video_path)
+        identity = f"{os.path.abspath(video_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        clip_hash = hashlib.sha1(identity.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, clip_hash)
+
+    def _total_frames(self, video_path, clip_dir):
+        meta_path = os.path.join(clip_dir, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                return json.load(f)["total_frames"]
+        total_frames = count_frames(video_path)
+        os.makedirs(clip_dir, exist_ok=True)
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"video_path": os.path.abspath(video_path), "total_frames": total_frames}, f)
+        os.replace(tmp_path, meta_path)
+        return total_frames
+
+    def sample_frames(self, video_path, frame_indices, clip_dir=None):
+        """
+        JPEG bytes of the given frames, resized to the pixel budget.
+
+        Args:
+            video_path: Path to the video file
+            frame_indices: Frame numbers to return, in output order
+            clip_dir: Cache directory of the clip (default: derived from video_path)
+
+        Returns:
+            List of JPEG-encoded frames; frames that could not be decoded are left out
+        """
+        clip_dir = clip_dir or self._clip_dir(video_path)
+        budget_dir = os.path.join(clip_dir, f"{self.min_pixels}_{self.max_pixels}")
+        os.makedirs(budget_dir, exist_ok=True)
+
+        frame_paths = {index: os.path.join(budget_dir, f"{index}.jpg") for index in frame_indices}
+        missing = [index for index, path in frame_paths.items() if not os.path.exists(path)]
+        if missing:
+            decoded = decode_frames(video_path, missing)
+            for index, rgb in decoded.items():
+                image = resize_to_budget(Image.fromarray(rgb), self.min_pixels, self.max_pixels)
+                tmp_path = f"{frame_paths[index]}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(encode_jpeg(image))
+                os.replace(tmp_path, frame_paths[index])
+            # Frames past the end of the video or that failed to decode are neither decoded nor cached.
+            self.decoded += len(decoded)
+        self.cached += len(frame_indices) - len(missing)
+
+        jpegs = []
+        for index in frame_indices:
+            path = frame_paths[index]
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    jpegs.append(f.read())
+        return jpegs
+
+    def sample(self, video_path, num_frames):
+        """JPEG bytes of num_frames frames sampled uniformly over the clip."""
+        clip_dir = self._clip_dir(video_path)
+        indices = uniform_frame_indices(self._total_frames(video_path, clip_dir), num_frames)
+        return self.sample_frames(video_path, indices, clip_dir=clip_dir)
+
+    def sample_data_urls(self, video_path, num_frames):
+        return jpegs_to_data_urls(self.sample(video_path, num_frames))
+
+    def sample_range(self, video_path, start_frame, end_frame, num_frames):
+        """
+        JPEG bytes of num_frames frames sampled uniformly from [start_frame, end_frame) of a long video.
+
+        This is what sampling a clip cut from start_frame to end_frame returns,
+        without the clip file. Frames are cached per source video, so QA items
+        with overlapping ranges share decoded frames.
+        """
+        indices = [start_frame + i for i in uniform_frame_indices(end_frame - start_frame, num_frames)]
+        return self.sample_frames(video_path, indices)
+
+    def sample_range_data_urls(self, video_path, start_frame, end_frame, num_frames):
+        return jpegs_to_data_urls(self.sample_range(video_path, start_frame, end_frame, num_frames))
+
+    def summary(self):
+        return f"Frame sampler: {self.decoded} frames decoded, {self.cached} frames served from cache"
+
+
+def frames_to_images(frames):
+    """Convert decode_frames() output to PIL images in frame order."""
+    return [Image.fromarray(frames[index]) for index in sorted(frames)]
+
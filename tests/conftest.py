@@ -0,0 +1,7 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'test_tool'))
+sys.path.append(os.path.join(ROOT, 'generate_tool'))
+sys.path.append(os.path.join(ROOT, 'test_tool', 'multiframes'))
@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip('pandas')
+
+from caculate import find_result_files, load_results
+
+HEADER = "video_id,Question,Answer Options,Model_Answer,Reference_Answer\n"
+
+
+def test_shard_outputs_are_not_counted_twice(tmp_path):
+    result_dir = tmp_path / "lora_sft"
+    result_dir.mkdir()
+    (result_dir / "Qwen2.5-VL-7B-spatial_ego4d-wo.csv").write_text(HEADER + "v1,q1,A. x,A,A\nv2,q2,A. x,B,A\n")
+    (result_dir / "Qwen2.5-VL-7B-spatial_ego4d-wo.shard0of2.csv").write_text(HEADER + "v1,q1,A. x,A,A\n")
+    (result_dir / "Qwen2.5-VL-7B-spatial_ego4d-wo.shard1of2.csv").write_text(HEADER + "v2,q2,A. x,B,A\n")
+
+    files = find_result_files(str(tmp_path))
+    assert [path.split('/')[-1] for path in files] == ["Qwen2.5-VL-7B-spatial_ego4d-wo.csv"]
+    df = load_results(str(tmp_path))
+    assert len(df) == 2
+    assert df['correct'].sum() == 1
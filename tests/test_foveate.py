@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip('PIL')
+
+from foveate import gaze_crop_box
+
+
+def test_centered_gaze():
+    assert gaze_crop_box(1000, 800, 0.5, 0.5, 200) == (400, 300, 600, 500)
+
+
+@pytest.mark.parametrize('gaze_x, gaze_y, expected', [
+    (0.0, 0.0, (0, 0, 200, 200)),
+    (1.0, 1.0, (800, 600, 1000, 800)),
+    (0.02, 0.99, (0, 600, 200, 800)),
+    (0.99, 0.05, (800, 0, 1000, 200)),
+])
+def test_crop_is_clamped_at_the_frame_edges(gaze_x, gaze_y, expected):
+    assert gaze_crop_box(1000, 800, gaze_x, gaze_y, 200) == expected
+
+
+def test_crop_larger_than_the_frame_shrinks_to_the_short_side():
+    assert gaze_crop_box(640, 360, 0.9, 0.5, 448) == (280, 0, 640, 360)
+    assert gaze_crop_box(300, 300, 0.1, 0.1, 448) == (0, 0, 300, 300)
@@ -0,0 +1,49 @@
+import os
+
+from frame_store import open_frame_store, pack_frames
+
+
+def write_frame(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def test_pack_keys_frames_by_path_relative_to_the_video(tmp_path):
+    image_dir = tmp_path / "ego4d"
+    write_frame(image_dir / "video1" / "uid1" / "123.jpg", b"frame123")
+    write_frame(image_dir / "video1" / "uid1" / "124.jpg", b"frame124")
+    write_frame(image_dir / "video1" / "notes.txt", b"not a frame")
+    write_frame(image_dir / "video2" / "OP01_00012.jpg", b"egtea")
+
+    assert pack_frames(str(image_dir), str(tmp_path / "store"), shard_size=10) == 3
+    store = open_frame_store(str(tmp_path / "store"))
+    assert set(store.frames["video1"]) == {"uid1/123.jpg", "uid1/124.jpg"}
+    assert bytes(store.get("video1", "uid1/124.jpg\n")) == b"frame124"
+    assert bytes(store.get("video2", "OP01_00012.jpg")) == b"egtea"
+    assert ("video1", "uid1/123.jpg") in store
+    assert len(store.shards) == 3
+    store.close()
+
+
+def test_repack_keeps_the_shards_of_open_readers(tmp_path):
+    image_dir = tmp_path / "egtea"
+    write_frame(image_dir / "video1" / "OP01_00001.jpg", b"old1")
+    write_frame(image_dir / "video1" / "OP01_00002.jpg", b"old2")
+    store_dir = str(tmp_path / "store")
+    pack_frames(str(image_dir), store_dir, shard_size=4)
+    reader = open_frame_store(store_dir)
+    assert bytes(reader.get("video1", "OP01_00001.jpg")) == b"old1"
+    old_shards = set(reader.shards)
+
+    write_frame(image_dir / "video1" / "OP01_00001.jpg", b"new-frame-1")
+    (image_dir / "video1" / "OP01_00002.jpg").unlink()
+    pack_frames(str(image_dir), store_dir, shard_size=1 << 20)
+
+    # The mapped shard of the old generation still holds the old bytes.
+    assert bytes(reader.get("video1", "OP01_00001.jpg")) == b"old1"
+    reader.close()
+    store = open_frame_store(store_dir)
+    assert not old_shards & set(store.shards)
+    assert bytes(store.get("video1", "OP01_00001.jpg")) == b"new-frame-1"
+    assert sorted(name for name in os.listdir(store_dir) if name != "index.json") == store.shards
+    store.close()
@@ -0,0 +1,39 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+pytest.importorskip('pandas')
+
+import generate_video_clip
+from generate_video_clip import cut_clips, cut_group
+
+FFMPEG = shutil.which('ffmpeg')
+
+
+@pytest.fixture
+def source_video(tmp_path):
+    if FFMPEG is None:
+        pytest.skip("ffmpeg is not installed")
+    video_path = str(tmp_path / "source.mp4")
+    subprocess.run([FFMPEG, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i',
+                    'testsrc=duration=4:size=64x48:rate=30', '-c:v', 'mpeg4', '-g', '15', video_path], check=True)
+    return video_path
+
+
+def test_cut_group_writes_every_clip(tmp_path, source_video):
+    video_clips = [(0, 30, str(tmp_path / "clips" / "a.mp4")), (45, 90, str(tmp_path / "clips" / "b.mp4"))]
+    assert cut_group(source_video, video_clips) == []
+    for _, _, clip_path in video_clips:
+        assert os.path.getsize(clip_path) > 0
+        assert not os.path.exists(f"{clip_path}.part")
+
+
+def test_clips_without_output_are_reported(tmp_path, monkeypatch):
+    # ffmpeg exiting 0 without writing the outputs.
+    monkeypatch.setattr(generate_video_clip.subprocess, 'run', lambda cmd, check: None)
+    clip_path = str(tmp_path / "clips" / "a.mp4")
+    assert cut_group("source.mp4", [(0, 30, clip_path)]) == [clip_path]
+    assert cut_clips({("source.mp4", 0, 30): clip_path}, workers=1) == (0, 1)
+    assert not os.path.exists(clip_path)
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+from inference import api_answer
+from response_cache import ResponseCache
+
+
+class FakeClient:
+    """OpenAI-style client returning a fixed message content."""
+
+    base_url = "http://fake"
+
+    def __init__(self, content):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.content = content
+
+    def create(self, model, messages):
+        self.calls += 1
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_none_content_is_returned_empty_and_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    client = FakeClient(None)
+    content = [{"type": "text", "text": "Which option?"}]
+    assert api_answer(client, "model", content, cache) == ""
+    answer, usage = api_answer(client, "model", content, cache, with_usage=True)
+    assert answer == "" and usage['cached'] is False
+    assert client.calls == 2
+    assert api_answer(client, "model", content) == ""
+
+    client.content = "B"
+    assert api_answer(client, "model", content, cache) == "B"
+    assert api_answer(client, "model", content, cache) == "B"
+    assert client.calls == 4
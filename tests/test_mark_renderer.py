@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip('cv2')
+np = pytest.importorskip('numpy')
+
+from mark_renderer import MarkRenderer, draw_gaze_mark, gaze_mark_position
+
+
+@pytest.mark.parametrize('gaze_info, expected', [
+    ({'gaze_x': 0.5, 'gaze_y': 0.25, 'confidence': 1.0}, (0.5, 0.25)),
+    ({'gaze_x': '0.5', 'gaze_y': '0.25'}, (0.5, 0.25)),
+    ({'gaze_x': 0.5, 'gaze_y': 0.25, 'confidence': 0.6}, None),
+    ({'gaze_x': -1, 'gaze_y': 0.25, 'confidence': 1.0}, None),
+    ({'gaze_x': 0.5, 'gaze_y': -1, 'confidence': 1.0}, None),
+    ({'gaze_x': 0.5}, None),
+    (None, None),
+])
+def test_gaze_mark_position(gaze_info, expected):
+    assert gaze_mark_position(gaze_info) == expected
+
+
+def test_negative_gaze_draws_nothing():
+    image = np.zeros((40, 40, 3), dtype=np.uint8)
+    draw_gaze_mark(image, -1.0, 0.5, radius=5)
+    assert not image.any()
+    draw_gaze_mark(image, 0.5, 0.5, radius=5)
+    assert image.any()
+
+
+def test_render_group_skips_low_confidence_gaze(tmp_path):
+    import cv2
+    image_path = str(tmp_path / "1.jpg")
+    cv2.imwrite(image_path, np.zeros((40, 40, 3), dtype=np.uint8))
+    renderer = MarkRenderer(radius=5, thickness=-1)
+    marked, unmarked = renderer.render_group([image_path, image_path], [
+        {'gaze_x': 0.5, 'gaze_y': 0.5, 'confidence': 1.0},
+        {'gaze_x': 0.5, 'gaze_y': 0.5, 'confidence': 0.2},
+    ])
+    assert np.asarray(marked).any()
+    assert not np.asarray(unmarked).any()
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+pytest.importorskip('pandas')
+
+from qa_dataset import QADataset, read_clip_json, read_qa_csv
+from result_writer import row_key
+
+QA_CSV = ('video_id,group_id,Question,Answer Options,Correct Answer\n'
+          'v1,"1.jpg\n2.jpg",What?,A. x,A\n'
+          'v2,"cover.jpg\n3.jpg",Where?,A. y,A\n'
+          'v3,"10.jpg",When?,A. z,A\n')
+
+
+def test_malformed_group_id_rows_are_skipped(tmp_path):
+    qa_csv = tmp_path / "spatial_ego4d.csv"
+    qa_csv.write_text(QA_CSV, encoding='utf-8')
+    table = read_qa_csv(str(qa_csv))
+    assert list(table['video_id']) == ['v1', 'v3']
+    assert table.attrs['malformed_rows'] == 1
+    assert list(table['frame_indices'][0]) == [1, 2]
+    assert table['key'][0] == row_key('v1', '1.jpg\n2.jpg', 'What?')
+
+
+def test_malformed_egtea_frame_names_are_skipped(tmp_path):
+    qa_csv = tmp_path / "causal_egtea.csv"
+    qa_csv.write_text('video_id,group_id,Question,Answer Options,Correct Answer\n'
+                      'v1,OP01_00012.jpg,What?,A. x,A\nv2,00013.jpg,What?,A. x,A\n', encoding='utf-8')
+    table = read_qa_csv(str(qa_csv))
+    assert list(table['frame_indices'][0]) == [12]
+    assert table.attrs['malformed_rows'] == 1
+
+
+def test_malformed_clip_frames_are_skipped(tmp_path):
+    qa_json = tmp_path / "temporal_ego4d.json"
+    qa_json.write_text(json.dumps({'v1': [
+        {'clip_name': 'c1.mp4', 'question': 'q1', 'answer_options': ['A. x'], 'correct_answer': 'A',
+         'frames': ['4.jpg', '5.jpg']},
+        {'clip_name': 'c2.mp4', 'question': 'q2', 'answer_options': ['A. x'], 'correct_answer': 'A',
+         'frames': ['first.jpg']},
+    ]}), encoding='utf-8')
+    table = read_clip_json(str(qa_json))
+    assert list(table['clip_name']) == ['c1.mp4']
+    assert table.attrs['malformed_rows'] == 1
+
+
+def test_for_file_reads_the_csv_without_a_table(tmp_path):
+    (tmp_path / "spatial_ego4d.csv").write_text(QA_CSV, encoding='utf-8')
+    qa = QADataset.for_file('ego4d', 'spatial', qa_dir=str(tmp_path), table_path=str(tmp_path / "missing.parquet"))
+    rows = list(qa.iter_rows())
+    assert [row['video_id'] for row in rows] == ['v1', 'v3']
+    assert rows[0]['frames'] == ['1.jpg', '2.jpg']
+    assert rows[0]['category'] == 'spatial' and rows[0]['dataset'] == 'ego4d'
+
+
+def test_sharded_run_over_malformed_rows_merges(tmp_path):
+    from result_writer import ResultWriter, merge_shards, qa_row_keys
+    qa_csv = tmp_path / "spatial_ego4d.csv"
+    qa_csv.write_text(QA_CSV, encoding='utf-8')
+    output_csv = str(tmp_path / "result.csv")
+    qa = QADataset.from_source(str(qa_csv))
+    for shard in range(2):
+        writer = ResultWriter(output_csv, ['video_id', 'Model_Answer'], shard=(shard, 2))
+        for index, row in enumerate(qa.iter_rows()):
+            if not writer.is_done(row['key']):
+                writer.write(row['key'], {'video_id': row['video_id'], 'Model_Answer': 'A'}, index)
+        writer.finalize()
+    expected_keys = qa_row_keys(str(qa_csv))
+    assert len(expected_keys) == 2
+    rows, problems = merge_shards(output_csv, 2, expected_keys=expected_keys)
+    assert problems == []
+    assert [row['video_id'] for row in rows] == ['v1', 'v3']
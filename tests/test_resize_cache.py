@@ -0,0 +1,20 @@
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from resize_cache import resize_video, resized_frame_paths
+
+
+def test_nested_group_is_resized(tmp_path):
+    src_dir = tmp_path / "ego4d" / "video1"
+    (src_dir / "uid1").mkdir(parents=True)
+    for name in ("uid1/30.jpg", "uid1/60.jpg"):
+        Image.new('RGB', (1280, 720)).save(src_dir / name)
+    cache_dir = tmp_path / "resized"
+
+    assert resize_video(str(src_dir), str(cache_dir / "video1"), max_pixels=64 * 28 * 28) == (2, 0)
+    assert resize_video(str(src_dir), str(cache_dir / "video1"), max_pixels=64 * 28 * 28) == (0, 2)
+    paths = resized_frame_paths(["uid1/30.jpg", "uid1/60.jpg\n"], str(cache_dir), "video1")
+    assert paths is not None
+    with Image.open(paths[0]) as image:
+        assert image.width * image.height <= 64 * 28 * 28
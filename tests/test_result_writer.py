@@ -0,0 +1,131 @@
+import csv
+import json
+
+import pytest
+
+from result_writer import (ResultWriter, merge_shards, qa_json_row_keys, qa_row_keys, read_progress, row_key,
+                           shard_of, shard_path)
+
+FIELDS = ['video_id', 'Question', 'Model_Answer']
+
+
+def make_keys(count):
+    return [row_key(f"video{index}", f"{index}.jpg", f"question {index}") for index in range(count)]
+
+
+def run_shards(output_csv, keys, num_shards, skip=()):
+    for shard in range(num_shards):
+        writer = ResultWriter(output_csv, FIELDS, shard=(shard, num_shards))
+        for index, key in enumerate(keys):
+            if writer.is_done(key):
+                continue
+            if key in skip:
+                writer.skip_row(key, index, "no gaze")
+            else:
+                writer.write(key, {'video_id': f"video{index}", 'Question': "q", 'Model_Answer': "A"}, index)
+        writer.finalize()
+
+
+def append_record(output_csv, shard, key, index):
+    with open(f"{shard_path(output_csv, shard)}.progress.jsonl", 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'key': key, 'index': index, 'row': {'video_id': "extra"}, 'done': True}) + "\n")
+
+
+def test_shards_partition_the_rows(tmp_path):
+    keys = make_keys(200)
+    for num_shards in (1, 3, 8):
+        writers = [ResultWriter(str(tmp_path / f"result{num_shards}.csv"), FIELDS, shard=(shard, num_shards))
+                   for shard in range(num_shards)]
+        owners = [[shard for shard, writer in enumerate(writers) if not writer.is_done(key)] for key in keys]
+        for writer in writers:
+            writer.finalize()
+        assert all(len(owner) == 1 for owner in owners)
+        assert [owner[0] for owner in owners] == [shard_of(key, num_shards) for key in keys]
+
+
+def test_merge_restores_qa_order(tmp_path):
+    output_csv = str(tmp_path / "result.csv")
+    keys = make_keys(30)
+    run_shards(output_csv, keys, 4)
+    rows, problems = merge_shards(output_csv, 4, expected_keys=keys)
+    assert problems == []
+    assert [row['row_key'] for row in rows] == keys
+    with open(output_csv, newline='', encoding='utf-8') as f:
+        assert [row['row_key'] for row in csv.DictReader(f)] == keys
+
+
+def test_merge_accepts_skipped_rows(tmp_path):
+    output_csv = str(tmp_path / "result.csv")
+    keys = make_keys(30)
+    run_shards(output_csv, keys, 3, skip=set(keys[:5]))
+    rows, problems = merge_shards(output_csv, 3, expected_keys=keys)
+    assert problems == []
+    assert [row['row_key'] for row in rows] == keys[5:]
+    skipped = [record for shard in range(3)
+               for record in read_progress(f"{shard_path(output_csv, (shard, 3))}.progress.jsonl").values()
+               if record['skipped']]
+    assert len(skipped) == 5
+
+
+def test_merge_reports_missing_rows(tmp_path):
+    output_csv = str(tmp_path / "result.csv")
+    keys = make_keys(30)
+    run_shards(output_csv, keys[:-2], 3)
+    _, problems = merge_shards(output_csv, 3, expected_keys=keys)
+    assert problems == ["2 of 30 expected rows missing"]
+    assert not (tmp_path / "result.csv").exists()
+
+
+def test_merge_reports_missing_shard(tmp_path):
+    output_csv = str(tmp_path / "result.csv")
+    run_shards(output_csv, make_keys(10), 2)
+    _, problems = merge_shards(output_csv, 3)
+    assert any("missing" in problem for problem in problems)
+
+
+def test_merge_reports_duplicate_and_misplaced_rows(tmp_path):
+    output_csv = str(tmp_path / "result.csv")
+    keys = make_keys(30)
+    run_shards(output_csv, keys, 2)
+    key = next(key for key in keys if shard_of(key, 2) == 0)
+    append_record(output_csv, (1, 2), key, 0)
+    _, problems = merge_shards(output_csv, 2, expected_keys=keys)
+    assert "shard 1/2: 1 rows belong to another shard" in problems
+    assert "shard 1/2: 1 rows already in another shard" in problems
+
+
+def test_qa_keys_match_the_scripts(tmp_path):
+    qa_csv = tmp_path / "spatial_ego4d.csv"
+    qa_csv.write_text('video_id,group_id,Question\nv1,"1.jpg\n2.jpg",What?\n', encoding='utf-8')
+    assert qa_row_keys(str(qa_csv)) == [row_key("v1", "1.jpg\n2.jpg", "What?")]
+
+    qa_json = tmp_path / "clips.json"
+    qa_json.write_text(json.dumps({"v1": [{"clip_name": "c1.mp4", "question": "Why?"}]}), encoding='utf-8')
+    assert qa_json_row_keys(str(qa_json)) == [row_key("v1", "c1.mp4", "Why?")]
+
+    clip_csv = tmp_path / "clips.csv"
+    clip_csv.write_text("video_id,clip_name,question\nv1,c1.mp4,Why?\n", encoding='utf-8')
+    with pytest.raises(ValueError):
+        qa_row_keys(str(clip_csv))
+
+
+def test_rows_with_missing_inputs_are_retried(tmp_path):
+    output_csv = str(tmp_path / "result.csv")
+    keys = make_keys(4)
+    writer = ResultWriter(output_csv, FIELDS, shard=(0, 1))
+    for index, key in enumerate(keys):
+        if index == 1:
+            writer.skip_row(key, index, "no clip", retry=True)
+        else:
+            writer.write(key, {'video_id': f"video{index}", 'Question': "q", 'Model_Answer': "A"}, index)
+    writer.finalize()
+    _, problems = merge_shards(output_csv, 1, expected_keys=keys)
+    assert problems == ["shard 0/1: 1 rows not done"]
+
+    writer = ResultWriter(output_csv, FIELDS, shard=(0, 1))
+    assert [key for key in keys if not writer.is_done(key)] == [keys[1]]
+    writer.write(keys[1], {'video_id': "video1", 'Question': "q", 'Model_Answer': "B"}, 1)
+    writer.finalize()
+    rows, problems = merge_shards(output_csv, 1, expected_keys=keys)
+    assert problems == []
+    assert [row['row_key'] for row in rows] == keys
@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip('cv2')
+pytest.importorskip('matplotlib')
+
+from salience_prefetch import SaliencePrefetcher
+
+
+class CountingPrefetcher(SaliencePrefetcher):
+    """Prefetcher with fake renders that records how many are in flight."""
+
+    def __init__(self, lookahead):
+        super().__init__(lookahead=lookahead, workers=0)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _submit(self, image_path, gaze_info_list):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return image_path
+
+    def _result(self, pending):
+        self.in_flight -= 1
+        return f"map of {pending}"
+
+
+@pytest.mark.parametrize('lookahead', [1, 2, 8])
+def test_at_most_lookahead_renders_in_flight(lookahead):
+    prefetcher = CountingPrefetcher(lookahead)
+    items = list(range(20))
+    rendered = list(prefetcher.iter_rendered(items, lambda item: (item, None)))
+    assert rendered == [(item, f"map of {item}") for item in items]
+    assert prefetcher.max_in_flight == lookahead
+    assert prefetcher.in_flight == 0
+
+
+def test_items_are_consumed_lazily():
+    prefetcher = CountingPrefetcher(3)
+    consumed = []
+
+    def items():
+        for item in range(10):
+            consumed.append(item)
+            yield item
+
+    rendered = prefetcher.iter_rendered(items(), lambda item: (item, None))
+    assert next(rendered) == (0, "map of 0")
+    assert consumed == [0, 1, 2]
@@ -0,0 +1,48 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("scipy")
+
+from caculate import API_MODEL, parse_result_name
+from significance import compare_grid, pair_results
+
+
+def result_table(correct, **columns):
+    return pd.DataFrame({'correct': correct, **columns})
+
+
+def test_repeated_template_questions_are_all_paired():
+    # The same question asked on two frame groups of one video.
+    a = result_table([True, False, True], video_id=['v1', 'v1', 'v2'], question=['Q', 'Q', 'Q'],
+                     answer_options=['A', 'A', 'A'], row_key=['k1', 'k2', 'k3'])
+    b = result_table([False, True, True], video_id=['v2', 'v1', 'v1'], question=['Q', 'Q', 'Q'],
+                     answer_options=['A', 'A', 'A'], row_key=['k3', 'k2', 'k1'])
+    correct_a, correct_b = pair_results(a, b)
+    assert len(correct_a) == 3
+    pairs = sorted(zip(correct_a.tolist(), correct_b.tolist()))
+    assert pairs == sorted([(True, True), (False, True), (True, False)])
+
+
+def test_files_without_row_key_pair_repeats_in_order():
+    a = result_table([True, False], video_id=['v1', 'v1'], question=['Q', 'Q'], answer_options=['A', 'A'])
+    b = result_table([False, False], video_id=['v1', 'v1'], question=['Q', 'Q'], answer_options=['A', 'A'])
+    correct_a, correct_b = pair_results(a, b)
+    assert correct_a.tolist() == [True, False]
+    assert correct_b.tolist() == [False, False]
+
+
+def test_api_strategies_share_a_model_cell():
+    saliencemap = parse_result_name('/results/qwenvl_api/temporal_egoexo.csv')
+    foveated = parse_result_name('/results/qwenvl_api/temporal_egoexo-fov336_c64.csv')
+    gazees = parse_result_name('/results/prompt_gazees/temporal_egoexo.csv')
+    assert saliencemap['model'] == foveated['model'] == gazees['model'] == API_MODEL
+    assert (saliencemap['strategy'], foveated['strategy'], gazees['strategy']) == \
+        ('qwenvl_api', 'qwenvl_api-fov336_c64', 'prompt_gazees')
+
+    frames = []
+    for meta, correct in ((saliencemap, [True, True]), (gazees, [False, True])):
+        frames.append(result_table(correct, row_key=['k1', 'k2'], **{k: [v, v] for k, v in meta.items()}))
+    grid = compare_grid(pd.concat(frames, ignore_index=True), n_resamples=100)
+    assert len(grid) == 1
+    assert grid.iloc[0]['n'] == 2
+    assert {grid.iloc[0]['strategy_a'], grid.iloc[0]['strategy_b']} == {'qwenvl_api', 'prompt_gazees'}
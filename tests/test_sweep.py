@@ -0,0 +1,84 @@
+import sweep
+from sweep import SweepScheduler, SweepState, plan_jobs
+
+
+def make_jobs(groups):
+    jobs = []
+    for model, rows in groups.items():
+        for index, count in enumerate(rows):
+            jobs.append({'id': f"{model}/{index}", 'model': model, 'strategy': 'wo',
+                         'dataset': 'ego4d', 'category': 'spatial', 'rows': count})
+    return jobs
+
+
+def simulate(scheduler, workers):
+    """Run the scheduler to completion, finishing jobs round-robin; return (jobs per worker, loads per worker)."""
+    loaded = {worker: None for worker in range(workers)}
+    done = {worker: [] for worker in range(workers)}
+    loads = {worker: 0 for worker in range(workers)}
+    active = list(range(workers))
+    while active:
+        for worker in list(active):
+            job = scheduler.next_job(worker, loaded[worker])
+            if job is None:
+                active.remove(worker)
+                continue
+            if job['model'] != loaded[worker]:
+                loads[worker] += 1
+                loaded[worker] = job['model']
+            done[worker].append(job)
+    return done, loads
+
+
+def test_single_worker_loads_each_model_once():
+    jobs = make_jobs({'a': [10, 5, 1], 'b': [8, 8], 'c': [3]})
+    done, loads = simulate(SweepScheduler(jobs), 1)
+    models = [job['model'] for job in done[0]]
+    assert sorted(job['id'] for job in done[0]) == sorted(job['id'] for job in jobs)
+    assert loads[0] == 3
+    # Jobs of a model are contiguous once the model is loaded.
+    assert [model for index, model in enumerate(models) if index == 0 or models[index - 1] != model] == ['a', 'b', 'c']
+
+
+def test_workers_take_distinct_models():
+    jobs = make_jobs({'a': [10, 10], 'b': [10, 10], 'c': [10, 10]})
+    done, loads = simulate(SweepScheduler(jobs), 3)
+    for worker in range(3):
+        assert len({job['model'] for job in done[worker]}) == 1
+        assert loads[worker] == 1
+    assert sum(loads.values()) == 3
+
+
+def test_large_group_is_split_only_when_it_outweighs_the_rest():
+    jobs = make_jobs({'big': [100] * 6, 'small': [1]})
+    done, loads = simulate(SweepScheduler(jobs), 2)
+    big = [worker for worker in done if any(job['model'] == 'big' for job in done[worker])]
+    assert len(big) == 2
+    assert sum(loads.values()) <= 3
+    assert sum(len(jobs) for jobs in done.values()) == 7
+
+
+def test_empty_queue_releases_worker():
+    scheduler = SweepScheduler(make_jobs({'a': [1]}))
+    assert scheduler.next_job(0)['model'] == 'a'
+    assert scheduler.next_job(0, 'a') is None
+    assert scheduler.loaded == {}
+    assert scheduler.pending_rows() == 0
+
+
+def test_plan_jobs_groups_by_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(sweep, 'QA_DIR', str(tmp_path))
+    (tmp_path / 'spatial_ego4d.csv').write_text("video_id,Question\n" + "v,q\n" * 5)
+    jobs = plan_jobs(['m1', 'm2'], ['wo', 'gaze'], datasets=['ego4d', 'egtea'], categories=['spatial'])
+    assert len(jobs) == 8
+    models = [job['model'] for job in jobs]
+    assert models == sorted(models, key=models.index)
+    assert [job['rows'] for job in jobs[:4]] == [5, 5, 0, 0]
+
+
+def test_state_round_trip(tmp_path):
+    path = str(tmp_path / 'state.json')
+    job = make_jobs({'a': [1]})[0]
+    state = SweepState(path)
+    state.update(job, status='done')
+    assert SweepState(path).is_done(job['id'])
@@ -0,0 +1,31 @@
+from token_pruning import gaze_keep_indices
+
+
+def test_slot_without_gaze_keeps_every_token():
+    kept, dropped = gaze_keep_indices(2, 4, 4, [None, None, (0.0, 0.0), (0.0, 0.0)], 0.25)
+    assert kept == [0, 1, 2, 3, 4]
+    assert dropped == [[5, 6, 7]]
+
+
+def test_last_frame_is_repeated_to_fill_the_last_slot():
+    # Two frames for two slots: slot 1 only holds the padded copy of frame 1.
+    kept, dropped = gaze_keep_indices(2, 4, 4, [None, (1.0, 1.0)], 0.25)
+    assert kept == [3, 7]
+    assert dropped == [[0, 1, 2], [4, 5, 6]]
+
+
+def test_keep_count_rounds_up_and_keeps_at_least_one():
+    kept, _ = gaze_keep_indices(1, 4, 4, [(0.0, 0.0), (0.0, 0.0)], 0.3)
+    assert len(kept) == 2
+    kept, _ = gaze_keep_indices(1, 4, 4, [(0.0, 0.0), (0.0, 0.0)], 0.01)
+    assert len(kept) == 1
+    kept, dropped = gaze_keep_indices(1, 4, 4, [(0.0, 0.0), (0.0, 0.0)], 1.0)
+    assert kept == [0, 1, 2, 3] and dropped == []
+
+
+def test_gaze_maps_onto_the_merged_token_grid():
+    # 4 x 8 patches merge into 2 rows x 4 columns of tokens.
+    kept, _ = gaze_keep_indices(1, 4, 8, [(0.9, 0.1), (0.9, 0.1)], 0.1)
+    assert kept == [3]
+    kept, _ = gaze_keep_indices(1, 4, 8, [(0.1, 0.9), (0.1, 0.9)], 0.1)
+    assert kept == [4]
@@ -0,0 +1,24 @@
+import importlib.util
+import shutil
+import sys
+
+import tracing_hooks
+
+
+def test_hooks_share_the_test_tool_tracer():
+    import tracing
+    assert tracing_hooks.span is tracing.span
+    assert tracing_hooks.traced is tracing.traced
+
+
+def test_standalone_copy_runs_untraced(tmp_path, monkeypatch):
+    monkeypatch.delitem(sys.modules, 'tracing')
+    path = shutil.copy(tracing_hooks.__file__, tmp_path / "tracing_hooks.py")
+    spec = importlib.util.spec_from_file_location('standalone_tracing_hooks', path)
+    hooks = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(hooks)
+
+    assert 'tracing' not in sys.modules
+    with hooks.span("stage"):
+        pass
+    assert hooks.traced("stage")(len)([1, 2]) == 2
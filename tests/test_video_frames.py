@@ -0,0 +1,26 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('PIL')
+
+import video_frames
+from video_frames import FrameSampler
+
+
+def test_frames_that_fail_to_decode_are_not_counted(tmp_path, monkeypatch):
+    calls = []
+
+    def decode_frames(video_path, frame_indices):
+        calls.append(list(frame_indices))
+        # Frame 90 lies past the end of the video.
+        return {index: np.zeros((56, 56, 3), dtype=np.uint8) for index in frame_indices if index < 90}
+
+    monkeypatch.setattr(video_frames, 'decode_frames', decode_frames)
+    sampler = FrameSampler(cache_dir=str(tmp_path))
+    clip_dir = str(tmp_path / "clip")
+    assert len(sampler.sample_frames("clip.mp4", [0, 30, 60, 90], clip_dir=clip_dir)) == 3
+    assert (sampler.decoded, sampler.cached) == (3, 0)
+
+    assert len(sampler.sample_frames("clip.mp4", [0, 30, 90], clip_dir=clip_dir)) == 2
+    assert calls[-1] == [90]
+    assert (sampler.decoded, sampler.cached) == (3, 2)